@@ -58,7 +58,9 @@ class AsyncClient(base_client.BaseClient):
     :param json: An alternative JSON module to use for encoding and decoding
                  packets. Custom json modules must have ``dumps`` and ``loads``
                  functions that are compatible with the standard library
-                 versions. This is a process-wide setting, all instantiated
+                 versions. The strings ``'orjson'`` and ``'msgspec'`` select
+                 built-in codecs based on these packages, which must be
+                 installed. This is a process-wide setting, all instantiated
                  servers and clients must use the same JSON module.
     :param request_timeout: A timeout in seconds for requests. The default is
                             5 seconds.
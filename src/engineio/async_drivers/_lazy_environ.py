@@ -0,0 +1,182 @@
+import sys
+
+
+class LazyEnviron(dict):
+    """The WSGI environment of a request, built on demand from the native
+    request object of a web framework.
+
+    To handle most requests the server only needs a few items of the
+    environment, so the request headers are not converted to environment
+    items until they are accessed, and then only the requested ones. The
+    complete environment is built the first time it is iterated, copied or
+    compared, which for most applications only happens for requests that
+    connect a client.
+
+    This class is a ``dict`` subclass, so that applications can use the
+    environment as the dictionary they expect. Functions implemented in C
+    that read the storage of a dictionary directly, such as
+    ``json.dumps()``, only see the items that were accessed before.
+
+    Subclasses pass the items that are cheap to obtain to the constructor,
+    and implement :meth:`_get_headers`.
+
+    :param environ: The initial items of the environment.
+    """
+    #: The items of the environment that are the same for all requests.
+    static_environ = {
+        'wsgi.errors': sys.stderr,
+        'wsgi.version': (1, 0),
+        'wsgi.async': True,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        'SCRIPT_NAME': '',
+        'REMOTE_ADDR': '127.0.0.1',
+        'REMOTE_PORT': '0',
+        'SERVER_PORT': '0',
+    }
+
+    def __init__(self, environ):
+        super().__init__(environ)
+        self.headers = None
+        self.complete = False
+
+    def __missing__(self, key):
+        if self.complete:
+            raise KeyError(key)
+        if key in self.static_environ:
+            value = self.static_environ[key]
+        elif key == 'wsgi.url_scheme':
+            value = self.get('HTTP_X_FORWARDED_PROTO', 'http')
+        else:
+            value = self._get_header(key)
+        super().__setitem__(key, value)
+        return value
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def setdefault(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return super().setdefault(key, default)
+
+    def pop(self, key, *args):
+        self._build()
+        return super().pop(key, *args)
+
+    def popitem(self):
+        self._build()
+        return super().popitem()
+
+    def __delitem__(self, key):
+        self._build()
+        super().__delitem__(key)
+
+    def clear(self):
+        super().clear()
+        self.complete = True
+
+    def __iter__(self):
+        self._build()
+        return super().__iter__()
+
+    def __len__(self):
+        self._build()
+        return super().__len__()
+
+    def __eq__(self, other):
+        self._build()
+        if isinstance(other, LazyEnviron):
+            other._build()
+        return super().__eq__(other)
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __repr__(self):
+        self._build()
+        return super().__repr__()
+
+    def keys(self):
+        self._build()
+        return super().keys()
+
+    def values(self):
+        self._build()
+        return super().values()
+
+    def items(self):
+        self._build()
+        return super().items()
+
+    def copy(self):
+        """Return the complete environment as a plain ``dict``."""
+        self._build()
+        return dict(super().items())
+
+    def _get_headers(self):  # pragma: no cover
+        """Return the request headers as ``(name, value)`` pairs."""
+        raise NotImplementedError()
+
+    def _header_key(self, name):
+        """Return the environment name of a request header, without the
+        ``HTTP_`` prefix."""
+        return name.upper().replace('-', '_')
+
+    def _decode_header(self, value):
+        """Return the value of a request header as a string, or raise
+        ``UnicodeDecodeError`` if the header must be skipped."""
+        return value
+
+    def _get_header(self, key):
+        if key in ['CONTENT_TYPE', 'CONTENT_LENGTH']:
+            name = key
+        elif key.startswith('HTTP_') and key not in ['HTTP_CONTENT_TYPE',
+                                                     'HTTP_CONTENT_LENGTH']:
+            name = key[5:]
+        else:
+            raise KeyError(key)
+        if self.headers is None:
+            # index the raw headers by their environment name
+            self.headers = {}
+            for hdr_name, hdr_value in self._get_headers():
+                self.headers.setdefault(self._header_key(hdr_name),
+                                        []).append(hdr_value)
+        values = []
+        for hdr_value in self.headers.get(name, []):
+            try:
+                values.append(self._decode_header(hdr_value))
+            except UnicodeDecodeError:
+                # skip header if it cannot be decoded
+                continue
+        if not values:
+            raise KeyError(key)
+        if key.startswith('HTTP_'):
+            # repeated headers are combined into a single value
+            return ','.join(values)
+        return values[-1]
+
+    def _build(self):
+        if self.complete:
+            return
+        for key in self.static_environ:
+            self.get(key)
+        self.get('wsgi.url_scheme')
+        self.get('CONTENT_TYPE')
+        self.get('CONTENT_LENGTH')
+        for name in list(self.headers or []):
+            self.get('HTTP_' + name)
+        self.complete = True
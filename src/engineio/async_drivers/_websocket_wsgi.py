@@ -1,7 +1,79 @@
+import dataclasses
+
 import simple_websocket
+from wsproto.events import AcceptConnection, Message, TextMessage
+from wsproto.extensions import PerMessageDeflate
+from wsproto.frame_protocol import Opcode
+from wsproto.utilities import LocalProtocolError
+
+#: The ``websocket_compression`` options that are applied by this driver.
+compression_options = ['server_max_window_bits', 'client_max_window_bits',
+                       'server_no_context_takeover',
+                       'client_no_context_takeover', 'threshold']
+
+
+class ThresholdPerMessageDeflate(PerMessageDeflate):
+    """permessage-deflate extension that does not compress small messages."""
+    def __init__(self, threshold=0, **kwargs):
+        super().__init__(**kwargs)
+        self.threshold = threshold
+
+    def frame_outbound(self, proto, opcode, rsv, data, fin):
+        if fin and opcode is not Opcode.CONTINUATION and \
+                len(data) < self.threshold:
+            # the message is sent in a single frame without compression, so
+            # the compressor state is not affected
+            return rsv, data
+        return super().frame_outbound(proto, opcode, rsv, data, fin)
+
+
+class _ExtensionsConnection:
+    """Wrapper for a wsproto connection that replaces the extensions
+    that simple-websocket offers during the handshake."""
+    def __init__(self, connection, extensions):
+        self.connection = connection
+        self.extensions = extensions
+
+    def send(self, event):
+        if isinstance(event, AcceptConnection):
+            event = dataclasses.replace(event, extensions=self.extensions)
+        return self.connection.send(event)
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
 
+class WebSocketServer(simple_websocket.Server):
+    """simple-websocket server with configurable permessage-deflate
+    compression."""
+    def __init__(self, environ, extensions=None, **kwargs):
+        self.extensions = extensions
+        super().__init__(environ, **kwargs)
 
-class SimpleWebSocketWSGI:  # pragma: no cover
+    def handshake(self):
+        if self.extensions is None:
+            return super().handshake()
+        connection = self.ws
+        self.ws = _ExtensionsConnection(connection, self.extensions)
+        try:
+            super().handshake()
+        finally:
+            self.ws = connection
+
+
+def get_extensions(websocket_compression):
+    """Return the wsproto extensions for a ``websocket_compression``
+    option, or ``None`` to use the simple-websocket defaults."""
+    if websocket_compression is True:
+        return None
+    if not websocket_compression:
+        return []
+    options = {key: value for key, value in websocket_compression.items()
+               if key in compression_options}
+    return [ThresholdPerMessageDeflate(**options)]
+
+
+class SimpleWebSocketWSGI:
     """
     This wrapper class provides a threading WebSocket interface that is
     compatible with eventlet's implementation.
@@ -9,9 +81,11 @@ class SimpleWebSocketWSGI:  # pragma: no cover
     def __init__(self, handler, server, **kwargs):
         self.app = handler
         self.server_args = kwargs
+        self.extensions = get_extensions(server.websocket_compression)
 
     def __call__(self, environ, start_response):
-        self.ws = simple_websocket.Server(environ, **self.server_args)
+        self.ws = WebSocketServer(environ, extensions=self.extensions,
+                                  **self.server_args)
         ret = self.app(self)
         if self.ws.mode == 'gunicorn':
             raise StopIteration()
@@ -22,11 +96,33 @@ class SimpleWebSocketWSGI:  # pragma: no cover
             self.ws.close()
 
     def send(self, message):
+        if not isinstance(message, (str, bytes)):
+            # simple-websocket only recognizes bytes as binary data
+            message = bytes(message)
         try:
             return self.ws.send(message)
         except simple_websocket.ConnectionClosed:
             raise OSError()
 
+    def send_many(self, messages):
+        # simple-websocket cannot write several messages at once, so the
+        # messages are framed with its wsproto connection and written with a
+        # single system call. Errors are reported as in send()
+        if not self.ws.connected:
+            raise OSError()
+        frames = []
+        try:
+            for message in messages:
+                if isinstance(message, str):
+                    event = TextMessage(data=message)
+                else:
+                    event = Message(data=bytes(message))
+                frames.append(self.ws.ws.send(event))
+        except LocalProtocolError:
+            # the connection was closed while the messages were framed
+            raise OSError()
+        self.ws.sock.sendall(b''.join(frames))
+
     def wait(self):
         try:
             return self.ws.receive()
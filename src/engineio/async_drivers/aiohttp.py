@@ -1,8 +1,10 @@
 import inspect
-import sys
 
 from aiohttp.web import Response, WebSocketResponse
 
+from engineio.async_drivers._lazy_environ import LazyEnviron
+from engineio.request_body import AsyncRequestBody
+
 
 def create_route(app, engineio_server, engineio_endpoint):
     """This function sets up the engine.io endpoint as a route for the
@@ -17,61 +19,67 @@ def create_route(app, engineio_server, engineio_endpoint):
                          engineio_server.handle_request)
 
 
+class AiohttpEnviron(LazyEnviron):
+    """The WSGI environment of an aiohttp request, built on demand from the
+    request object."""
+    static_environ = dict(LazyEnviron.static_environ,
+                          SERVER_SOFTWARE='aiohttp',
+                          SERVER_NAME='aiohttp')
+
+    def __init__(self, request):
+        super().__init__({
+            'wsgi.input': RequestBody(request.content),
+            'REQUEST_METHOD': request.method,
+            'QUERY_STRING': request.query_string or '',
+            'RAW_URI': request.path_qs,
+            'PATH_INFO': request.path,
+            'SERVER_PROTOCOL':
+                f'HTTP/{request.version[0]}.{request.version[1]}',
+            'aiohttp.request': request,
+        })
+        self.request = request
+
+    def _get_headers(self):
+        return self.request.headers.items()
+
+
+class RequestBody(AsyncRequestBody):
+    """The body of an aiohttp request, which is received in chunks as it is
+    read.
+
+    :param content: The ``StreamReader`` of the request.
+    """
+    def __init__(self, content):
+        super().__init__()
+        self.content = content
+
+    async def _receive(self):
+        return await self.content.readany() or None
+
+
 def translate_request(request):
     """This function takes the arguments passed to the request handler and
     uses them to generate a WSGI compatible environ dictionary.
     """
-    environ = {
-        'wsgi.input': request.content,
-        'wsgi.errors': sys.stderr,
-        'wsgi.version': (1, 0),
-        'wsgi.async': True,
-        'wsgi.multithread': False,
-        'wsgi.multiprocess': False,
-        'wsgi.run_once': False,
-        'SERVER_SOFTWARE': 'aiohttp',
-        'REQUEST_METHOD': request.method,
-        'QUERY_STRING': request.query_string or '',
-        'RAW_URI': request.path_qs,
-        'SERVER_PROTOCOL': f'HTTP/{request.version[0]}.{request.version[1]}',
-        'REMOTE_ADDR': '127.0.0.1',
-        'REMOTE_PORT': '0',
-        'SERVER_NAME': 'aiohttp',
-        'SERVER_PORT': '0',
-        'aiohttp.request': request
-    }
-
-    for hdr_name, hdr_value in request.headers.items():
-        hdr_name = hdr_name.upper()
-        if hdr_name == 'CONTENT-TYPE':
-            environ['CONTENT_TYPE'] = hdr_value
-            continue
-        elif hdr_name == 'CONTENT-LENGTH':
-            environ['CONTENT_LENGTH'] = hdr_value
-            continue
-
-        key = 'HTTP_%s' % hdr_name.replace('-', '_')
-        if key in environ:
-            hdr_value = f'{environ[key]},{hdr_value}'
-
-        environ[key] = hdr_value
-
-    environ['wsgi.url_scheme'] = environ.get('HTTP_X_FORWARDED_PROTO', 'http')
-
-    environ['PATH_INFO'] = request.path
-    environ['SCRIPT_NAME'] = ''
-
-    return environ
+    return AiohttpEnviron(request)
 
 
 def make_response(status, headers, payload, environ):
     """This function generates an appropriate response object for this async
     mode.
     """
+    if not isinstance(payload, bytes):
+        # streamed response, which aiohttp sends with chunked encoding
+        payload = _stream(payload)
     return Response(body=payload, status=int(status.split()[0]),
                     headers=headers)
 
 
+async def _stream(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
 class WebSocket:  # pragma: no cover
     """
     This wrapper class provides a aiohttp WebSocket interface that is
@@ -85,7 +93,8 @@ class WebSocket:  # pragma: no cover
     async def __call__(self, environ):
         request = environ['aiohttp.request']
         self._sock = WebSocketResponse(
-            max_msg_size=self.server.max_http_buffer_size)
+            max_msg_size=self.server.max_http_buffer_size,
+            compress=bool(self.server.websocket_compression))
         await self._sock.prepare(request)
 
         self.environ = environ
@@ -96,10 +105,12 @@ class WebSocket:  # pragma: no cover
         await self._sock.close()
 
     async def send(self, message):
-        if isinstance(message, bytes):
-            f = self._sock.send_bytes
-        else:
+        if isinstance(message, str):
             f = self._sock.send_str
+        else:
+            # aiohttp accepts any bytes-like object, so buffers such as
+            # memoryviews are sent without making a copy
+            f = self._sock.send_bytes
         if inspect.iscoroutinefunction(f):
             await f(message)
         else:
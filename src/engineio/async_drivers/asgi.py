@@ -1,7 +1,9 @@
 import inspect
 import os
-import sys
 
+from engineio import response_headers
+from engineio.async_drivers._lazy_environ import LazyEnviron
+from engineio.request_body import AsyncRequestBody
 from engineio.static_files import get_static_file
 
 
@@ -134,91 +136,77 @@ class ASGIApp:
         return path
 
 
-async def translate_request(scope, receive, send):
-    class AwaitablePayload:  # pragma: no cover
-        def __init__(self, event):
-            self.event = event
-            self.payload = None
-
-        async def read(self, length=None):
-            if self.payload is None and event['type'] == 'http.request':
-                # read payload from http request
-                self.payload = self.event.get('body') or b''
-                while self.event.get('more_body'):
-                    self.event = await receive()
-                    if self.event['type'] == 'http.request':
-                        self.payload += self.event.get('body') or b''
-            if length is None:
-                r = self.payload
-                self.payload = b''
+class ASGIEnviron(LazyEnviron):
+    """The WSGI environment of an ASGI request, built on demand from the
+    ASGI scope."""
+    static_environ = dict(LazyEnviron.static_environ,
+                          SERVER_SOFTWARE='asgi',
+                          SERVER_PROTOCOL='HTTP/1.1',
+                          SERVER_NAME='asgi')
+
+    def __init__(self, scope, receive, send, event):
+        raw_uri = scope['path']
+        query_string = ''
+        if scope.get('query_string'):
+            try:
+                query_string = scope['query_string'].decode('utf-8')
+            except UnicodeDecodeError:
+                pass
             else:
-                r = self.payload[:length]
-                self.payload = self.payload[length:]
-            return r
+                raw_uri += '?' + query_string
+        super().__init__({
+            'wsgi.input': RequestBody(event, receive),
+            'REQUEST_METHOD': scope.get('method', 'GET'),
+            'PATH_INFO': scope['path'],
+            'QUERY_STRING': query_string,
+            'RAW_URI': raw_uri,
+            'asgi.receive': receive,
+            'asgi.send': send,
+            'asgi.scope': scope,
+        })
+        self.scope = scope
 
-    event = await receive()
-    if event['type'] not in ['http.request', 'websocket.connect']:
-        return {}
+    def _get_headers(self):
+        return self.scope.get('headers', [])
 
-    raw_uri = scope['path']
-    query_string = ''
-    if 'query_string' in scope and scope['query_string']:
-        try:
-            query_string = scope['query_string'].decode('utf-8')
-        except UnicodeDecodeError:
-            pass
-        else:
-            raw_uri += '?' + query_string
-    environ = {
-        'wsgi.input': AwaitablePayload(event),
-        'wsgi.errors': sys.stderr,
-        'wsgi.version': (1, 0),
-        'wsgi.async': True,
-        'wsgi.multithread': False,
-        'wsgi.multiprocess': False,
-        'wsgi.run_once': False,
-        'SERVER_SOFTWARE': 'asgi',
-        'REQUEST_METHOD': scope.get('method', 'GET'),
-        'PATH_INFO': scope['path'],
-        'QUERY_STRING': query_string,
-        'RAW_URI': raw_uri,
-        'SCRIPT_NAME': '',
-        'SERVER_PROTOCOL': 'HTTP/1.1',
-        'REMOTE_ADDR': '127.0.0.1',
-        'REMOTE_PORT': '0',
-        'SERVER_NAME': 'asgi',
-        'SERVER_PORT': '0',
-        'asgi.receive': receive,
-        'asgi.send': send,
-        'asgi.scope': scope,
-    }
-
-    for hdr_name, hdr_value in scope['headers']:
-        try:
-            hdr_name = hdr_name.upper().decode('utf-8')
-            hdr_value = hdr_value.decode('utf-8')
-        except UnicodeDecodeError:
-            # skip header if it cannot be decoded
-            continue
-        if hdr_name == 'CONTENT-TYPE':
-            environ['CONTENT_TYPE'] = hdr_value
-            continue
-        elif hdr_name == 'CONTENT-LENGTH':
-            environ['CONTENT_LENGTH'] = hdr_value
-            continue
+    def _header_key(self, name):
+        return name.upper().replace(b'-', b'_').decode('latin-1')
 
-        key = 'HTTP_%s' % hdr_name.replace('-', '_')
-        if key in environ:
-            hdr_value = f'{environ[key]},{hdr_value}'
+    def _decode_header(self, value):
+        return value.decode('utf-8')
 
-        environ[key] = hdr_value
 
-    environ['wsgi.url_scheme'] = environ.get('HTTP_X_FORWARDED_PROTO', 'http')
-    return environ
+class RequestBody(AsyncRequestBody):
+    """The body of an ASGI HTTP request, which is received in chunks as it
+    is read."""
+    def __init__(self, event, receive):
+        super().__init__()
+        self.event = event
+        self.receive = receive
+        self.more_body = False
+
+    async def _receive(self):
+        if self.event is None:
+            if not self.more_body:
+                return None
+            self.event = await self.receive()
+        event, self.event = self.event, None
+        if event['type'] != 'http.request':
+            self.more_body = False
+            return None
+        self.more_body = event.get('more_body', False)
+        return event.get('body') or b''
+
+
+async def translate_request(scope, receive, send):
+    event = await receive()
+    if event['type'] not in ['http.request', 'websocket.connect']:
+        return {}
+    return ASGIEnviron(scope, receive, send, event)
 
 
 async def make_response(status, headers, payload, environ):
-    headers = [(h[0].encode('utf-8'), h[1].encode('utf-8')) for h in headers]
+    headers = response_headers.encode(headers)
     if environ['asgi.scope']['type'] == 'websocket':
         if status.startswith('200 '):
             await environ['asgi.send']({'type': 'websocket.accept',
@@ -236,6 +224,12 @@ async def make_response(status, headers, payload, environ):
     await environ['asgi.send']({'type': 'http.response.start',
                                 'status': int(status.split(' ')[0]),
                                 'headers': headers})
+    if not isinstance(payload, bytes):
+        # streamed response
+        for chunk in payload:
+            await environ['asgi.send']({'type': 'http.response.body',
+                                        'body': chunk, 'more_body': True})
+        payload = b''
     await environ['asgi.send']({'type': 'http.response.body',
                                 'body': payload})
 
@@ -267,10 +261,12 @@ class WebSocket:  # pragma: no cover
     async def send(self, message):
         msg_bytes = None
         msg_text = None
-        if isinstance(message, bytes):
-            msg_bytes = message
-        else:
+        if isinstance(message, str):
             msg_text = message
+        else:
+            # the ASGI specification requires binary messages to be bytes
+            msg_bytes = message if isinstance(message, bytes) \
+                else bytes(message)
         await self.asgi_send({'type': 'websocket.send',
                               'bytes': msg_bytes,
                               'text': msg_text})
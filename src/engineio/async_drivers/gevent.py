@@ -5,9 +5,11 @@ try:
     # use gevent-websocket if installed
     import geventwebsocket  # noqa
     SimpleWebSocketWSGI = None
+    compression_options = []
 except ImportError:  # pragma: no cover
     # fallback to simple_websocket when gevent-websocket is not installed
-    from engineio.async_drivers._websocket_wsgi import SimpleWebSocketWSGI
+    from engineio.async_drivers._websocket_wsgi import SimpleWebSocketWSGI, \
+        compression_options
 
 
 class Thread(gevent.Greenlet):  # pragma: no cover
@@ -79,5 +81,6 @@ _async = {
     'queue_empty': queue.Empty,
     'event': Event,
     'websocket': WebSocketWSGI,
+    'websocket_compression_options': compression_options,
     'sleep': gevent.sleep,
 }
@@ -73,10 +73,13 @@ class uWSGIWebSocket:  # pragma: no cover
     def _send(self, msg):
         """Transmits message either in binary or UTF-8 text mode,
         depending on its type."""
-        if isinstance(msg, bytes):
-            method = uwsgi.websocket_send_binary
-        else:
+        if isinstance(msg, str):
             method = uwsgi.websocket_send
+        else:
+            method = uwsgi.websocket_send_binary
+            if not isinstance(msg, bytes):
+                # uWSGI only accepts binary messages given as bytes
+                msg = bytes(msg)
         if self._req_ctx is not None:
             method(msg, request_context=self._req_ctx)
         else:
@@ -1,6 +1,8 @@
-import sys
 from urllib.parse import urlsplit
 
+from engineio.async_drivers._lazy_environ import LazyEnviron
+from engineio.request_body import BufferedRequestBody
+
 try:  # pragma: no cover
     from sanic.response import HTTPResponse
     try:
@@ -28,73 +30,45 @@ def create_route(app, engineio_server, engineio_endpoint):  # pragma: no cover
         pass
 
 
+class SanicEnviron(LazyEnviron):  # pragma: no cover
+    """The WSGI environment of a sanic request, built on demand from the
+    request object."""
+    static_environ = dict(LazyEnviron.static_environ,
+                          SERVER_SOFTWARE='sanic',
+                          SERVER_NAME='sanic')
+
+    def __init__(self, request):
+        uri_parts = urlsplit(request.url)
+        super().__init__({
+            'wsgi.input': BufferedRequestBody(request.body),
+            'REQUEST_METHOD': request.method,
+            'QUERY_STRING': uri_parts.query or '',
+            'RAW_URI': request.url,
+            'PATH_INFO': uri_parts.path,
+            'SERVER_PROTOCOL': 'HTTP/' + request.version,
+            'sanic.request': request,
+        })
+        self.request = request
+
+    def _get_headers(self):
+        return self.request.headers.items()
+
+
 def translate_request(request):  # pragma: no cover
     """This function takes the arguments passed to the request handler and
     uses them to generate a WSGI compatible environ dictionary.
     """
-    class AwaitablePayload:
-        def __init__(self, payload):
-            self.payload = payload or b''
-
-        async def read(self, length=None):
-            if length is None:
-                r = self.payload
-                self.payload = b''
-            else:
-                r = self.payload[:length]
-                self.payload = self.payload[length:]
-            return r
-
-    uri_parts = urlsplit(request.url)
-    environ = {
-        'wsgi.input': AwaitablePayload(request.body),
-        'wsgi.errors': sys.stderr,
-        'wsgi.version': (1, 0),
-        'wsgi.async': True,
-        'wsgi.multithread': False,
-        'wsgi.multiprocess': False,
-        'wsgi.run_once': False,
-        'SERVER_SOFTWARE': 'sanic',
-        'REQUEST_METHOD': request.method,
-        'QUERY_STRING': uri_parts.query or '',
-        'RAW_URI': request.url,
-        'SERVER_PROTOCOL': 'HTTP/' + request.version,
-        'REMOTE_ADDR': '127.0.0.1',
-        'REMOTE_PORT': '0',
-        'SERVER_NAME': 'sanic',
-        'SERVER_PORT': '0',
-        'sanic.request': request
-    }
-
-    for hdr_name, hdr_value in request.headers.items():
-        hdr_name = hdr_name.upper()
-        if hdr_name == 'CONTENT-TYPE':
-            environ['CONTENT_TYPE'] = hdr_value
-            continue
-        elif hdr_name == 'CONTENT-LENGTH':
-            environ['CONTENT_LENGTH'] = hdr_value
-            continue
-
-        key = 'HTTP_%s' % hdr_name.replace('-', '_')
-        if key in environ:
-            hdr_value = f'{environ[key]},{hdr_value}'
-
-        environ[key] = hdr_value
-
-    environ['wsgi.url_scheme'] = environ.get('HTTP_X_FORWARDED_PROTO', 'http')
-
-    path_info = uri_parts.path
-
-    environ['PATH_INFO'] = path_info
-    environ['SCRIPT_NAME'] = ''
-
-    return environ
+    return SanicEnviron(request)
 
 
 def make_response(status, headers, payload, environ):  # pragma: no cover
     """This function generates an appropriate response object for this async
     mode.
     """
+    if not isinstance(payload, bytes):
+        # sanic responses need the complete body, so streamed long-polling
+        # responses are assembled in memory with this driver
+        payload = b''.join(payload)
     headers_dict = {}
     content_type = None
     for h in headers:
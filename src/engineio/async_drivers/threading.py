@@ -1,7 +1,8 @@
 import queue
 import threading
 import time
-from engineio.async_drivers._websocket_wsgi import SimpleWebSocketWSGI
+from engineio.async_drivers._websocket_wsgi import SimpleWebSocketWSGI, \
+    compression_options
 
 
 class DaemonThread(threading.Thread):  # pragma: no cover
@@ -15,5 +16,6 @@ _async = {
     'queue_empty': queue.Empty,
     'event': threading.Event,
     'websocket': SimpleWebSocketWSGI,
+    'websocket_compression_options': compression_options,
     'sleep': time.sleep,
 }
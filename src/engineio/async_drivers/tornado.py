@@ -1,8 +1,9 @@
 import asyncio
 import inspect
-import sys
 from urllib.parse import urlsplit
 from .. import exceptions
+from ..request_body import BufferedRequestBody
+from ._lazy_environ import LazyEnviron
 
 import tornado.web
 import tornado.websocket
@@ -55,78 +56,57 @@ def get_tornado_handler(engineio_server):
             return super().check_origin(origin)
 
         def get_compression_options(self):
-            # enable compression
-            return {}
+            websocket_compression = engineio_server.websocket_compression
+            if not websocket_compression:
+                return None
+            options = {}
+            if isinstance(websocket_compression, dict):
+                if 'level' in websocket_compression:
+                    options['compression_level'] = \
+                        websocket_compression['level']
+                if 'mem_level' in websocket_compression:
+                    options['mem_level'] = websocket_compression['mem_level']
+            return options
 
     return Handler
 
 
+class TornadoEnviron(LazyEnviron):
+    """The WSGI environment of a tornado request, built on demand from the
+    request handler."""
+    static_environ = dict(LazyEnviron.static_environ,
+                          SERVER_SOFTWARE='tornado',
+                          SERVER_NAME='tornado')
+
+    def __init__(self, handler):
+        request = handler.request
+        full_uri = request.path
+        if request.query:  # pragma: no cover
+            full_uri += '?' + request.query
+        super().__init__({
+            'wsgi.input': BufferedRequestBody(request.body),
+            'REQUEST_METHOD': request.method,
+            'QUERY_STRING': request.query or '',
+            'RAW_URI': full_uri,
+            'PATH_INFO': urlsplit(request.path).path,
+            'SERVER_PROTOCOL': 'HTTP/%s' % request.version,
+            'tornado.handler': handler,
+        })
+        self.request = request
+
+    def _get_headers(self):
+        # tornado already combines repeated headers into a single value
+        return self.request.headers.items()
+
+
 def translate_request(handler):
     """This function takes the arguments passed to the request handler and
     uses them to generate a WSGI compatible environ dictionary.
     """
-    class AwaitablePayload:
-        def __init__(self, payload):
-            self.payload = payload or b''
-
-        async def read(self, length=None):
-            if length is None:
-                r = self.payload
-                self.payload = b''
-            else:
-                r = self.payload[:length]
-                self.payload = self.payload[length:]
-            return r
-
-    payload = handler.request.body
-
-    uri_parts = urlsplit(handler.request.path)
-    full_uri = handler.request.path
-    if handler.request.query:  # pragma: no cover
-        full_uri += '?' + handler.request.query
-    environ = {
-        'wsgi.input': AwaitablePayload(payload),
-        'wsgi.errors': sys.stderr,
-        'wsgi.version': (1, 0),
-        'wsgi.async': True,
-        'wsgi.multithread': False,
-        'wsgi.multiprocess': False,
-        'wsgi.run_once': False,
-        'SERVER_SOFTWARE': 'aiohttp',
-        'REQUEST_METHOD': handler.request.method,
-        'QUERY_STRING': handler.request.query or '',
-        'RAW_URI': full_uri,
-        'SERVER_PROTOCOL': 'HTTP/%s' % handler.request.version,
-        'REMOTE_ADDR': '127.0.0.1',
-        'REMOTE_PORT': '0',
-        'SERVER_NAME': 'aiohttp',
-        'SERVER_PORT': '0',
-        'tornado.handler': handler
-    }
-
-    for hdr_name, hdr_value in handler.request.headers.items():
-        hdr_name = hdr_name.upper()
-        if hdr_name == 'CONTENT-TYPE':
-            environ['CONTENT_TYPE'] = hdr_value
-            continue
-        elif hdr_name == 'CONTENT-LENGTH':
-            environ['CONTENT_LENGTH'] = hdr_value
-            continue
-
-        key = 'HTTP_%s' % hdr_name.replace('-', '_')
-        environ[key] = hdr_value
-
-    environ['wsgi.url_scheme'] = environ.get('HTTP_X_FORWARDED_PROTO', 'http')
-
-    path_info = uri_parts.path
-
-    environ['PATH_INFO'] = path_info
-    environ['SCRIPT_NAME'] = ''
-
-    return environ
-
-
-def make_response(status, headers, payload, environ):
+    return TornadoEnviron(handler)
+
+
+async def make_response(status, headers, payload, environ):
     """This function generates an appropriate response object for this async
     mode.
     """
@@ -139,7 +119,14 @@ def make_response(status, headers, payload, environ):
         return
     for header, value in headers:
         tornado_handler.set_header(header, value)
-    tornado_handler.write(payload)
+    if isinstance(payload, bytes):
+        tornado_handler.write(payload)
+    else:
+        # streamed response, each chunk is sent to the client before the
+        # next one is written
+        for chunk in payload:
+            tornado_handler.write(chunk)
+            await tornado_handler.flush()
     tornado_handler.finish()
 
 
@@ -161,9 +148,12 @@ class WebSocket:  # pragma: no cover
         self.tornado_handler.close()
 
     async def send(self, message):
+        binary = not isinstance(message, str)
+        if binary and not isinstance(message, bytes):
+            # tornado only accepts binary messages given as bytes
+            message = bytes(message)
         try:
-            self.tornado_handler.write_message(
-                message, binary=isinstance(message, bytes))
+            self.tornado_handler.write_message(message, binary=binary)
         except tornado.websocket.WebSocketClosedError:
             raise exceptions.EngineIOError()
 
@@ -180,4 +170,5 @@ _async = {
     'translate_request': translate_request,
     'make_response': make_response,
     'websocket': WebSocket,
+    'websocket_compression_options': ['level', 'mem_level'],
 }
@@ -1,11 +1,12 @@
 import asyncio
 import inspect
-import urllib
+import time
 
 from . import base_server
 from . import exceptions
 from . import packet
 from . import async_socket
+from . import tracing
 
 # this set is used to keep references to background tasks to prevent them from
 # being garbage collected mid-execution. Solution taken from
@@ -43,7 +44,13 @@ class AsyncServer(base_server.BaseServer):
                                  WebSocket connections.
     :param allow_upgrades: Whether to allow transport upgrades or not.
     :param http_compression: Whether to compress packages when using the
-                             polling transport.
+                             polling transport. To choose the encodings, pass
+                             a list with their names, or a dictionary that
+                             maps encoding names to compression options, such
+                             as ``{'gzip': {'level': 6}, 'br': {'quality':
+                             4}}``. The ``'br'`` and ``'zstd'`` encodings
+                             require the ``brotli`` and ``zstandard``
+                             packages respectively.
     :param compression_threshold: Only compress messages when their byte size
                                   is greater than this value.
     :param cookie: If set to a string, it is the name of the HTTP cookie the
@@ -67,7 +74,9 @@ class AsyncServer(base_server.BaseServer):
     :param json: An alternative JSON module to use for encoding and decoding
                  packets. Custom JSON modules must have ``dumps`` and ``loads``
                  functions that are compatible with the standard library
-                 versions. This is a process-wide setting, all instantiated
+                 versions. The strings ``'orjson'`` and ``'msgspec'`` select
+                 built-in codecs based on these packages, which must be
+                 installed. This is a process-wide setting, all instantiated
                  servers and clients must use the same JSON module.
     :param async_handlers: If set to ``True``, run message event handlers in
                            non-blocking threads. To run handlers synchronously,
@@ -79,6 +88,51 @@ class AsyncServer(base_server.BaseServer):
     :param transports: The list of allowed transports. Valid transports
                        are ``'polling'`` and ``'websocket'``. Defaults to
                        ``['polling', 'websocket']``.
+    :param websocket_max_batch_bytes: This option is accepted for
+                                      compatibility with :class:`Server`,
+                                      but the asyncio WebSocket drivers do
+                                      not implement batched writes, so each
+                                      packet is written separately.
+    :param websocket_compression: Whether to negotiate the permessage-deflate
+                                  compression extension with WebSocket
+                                  clients. The default is ``True``, which
+                                  uses the defaults of the WebSocket driver.
+                                  Set to ``False`` to disable compression, or
+                                  to a dictionary with compression options.
+                                  See the documentation for the options that
+                                  each WebSocket driver supports.
+    :param metrics: Whether to collect metrics about the activity of the
+                    server. Set to ``True`` to enable metrics with the default
+                    settings, or pass a :class:`engineio.metrics.Metrics`
+                    instance. The default is ``False``. The metrics are
+                    available in the ``metrics`` attribute of the server.
+    :param packet_logging: A dictionary with options for the logging of the
+                           packets exchanged with clients, which happens at
+                           the ``INFO`` level. The ``'sample_rate'`` option
+                           sets the fraction of packets that are logged, and
+                           ``'max_data_length'`` truncates long packet data.
+                           The ``'flight_recorder'`` option sets a number of
+                           recent packets that are kept in memory for each
+                           client, and logged as warnings when a connection
+                           ends abnormally. See the documentation for
+                           details.
+    :param worker_socket_dir: A directory where the worker processes of the
+                              server create Unix sockets to forward requests
+                              to each other. When set, session ids include
+                              the id of the worker that owns the session, and
+                              long-polling requests that arrive at a
+                              different worker are forwarded to the owner.
+                              The default is ``None``, which disables
+                              forwarding. See the documentation for details.
+    :param worker_id: The id of this worker process, from 0 to 255, when
+                      ``worker_socket_dir`` is set. The default is to use the
+                      first id that is not in use by another worker.
+    :param cors_cache_size: The number of origins for which the decision of a
+                            callable ``cors_allowed_origins`` is cached. The
+                            default is 0, which calls the function on every
+                            request. A cache should only be used when the
+                            decision does not depend on the request
+                            environment.
     :param kwargs: Reserved for future extensions, any additional parameters
                    given as keyword arguments will be silently ignored.
     """
@@ -121,6 +175,38 @@ class AsyncServer(base_server.BaseServer):
             return
         await socket.send(pkt)
 
+    async def send_many(self, sids, data):
+        """Send a message to a group of clients.
+
+        :param sids: An iterable with the session ids of the recipient
+                     clients.
+        :param data: The data to send to the clients. Data can be of type
+                     ``str``, ``bytes``, ``list`` or ``dict``. If a ``list``
+                     or ``dict``, the data will be serialized as JSON.
+
+        A single packet is shared by all the recipients, so the data is
+        encoded only once for each transport, regardless of the number of
+        clients that receive it.
+
+        Note: this method is a coroutine.
+        """
+        pkt = packet.Packet(packet.MESSAGE, data=data)
+        for sid in sids:
+            await self.send_packet(sid, pkt)
+
+    async def broadcast(self, data, skip_sid=None):
+        """Send a message to all the connected clients.
+
+        :param data: The data to send to the clients. Data can be of type
+                     ``str``, ``bytes``, ``list`` or ``dict``. If a ``list``
+                     or ``dict``, the data will be serialized as JSON.
+        :param skip_sid: The session id of a client that should not receive
+                         the message, or a list of them.
+
+        Note: this method is a coroutine.
+        """
+        await self.send_many(self._broadcast_sids(skip_sid), data)
+
     async def get_session(self, sid):
         """Return the user session for a client.
 
@@ -195,15 +281,14 @@ class AsyncServer(base_server.BaseServer):
                 pass
             else:
                 await socket.close(reason=self.reason.SERVER_DISCONNECT)
-                if sid in self.sockets:  # pragma: no cover
-                    del self.sockets[sid]
+                self.sockets.pop(sid, None)
         else:
             await asyncio.wait([
                 asyncio.create_task(client.close(
                     reason=self.reason.SERVER_DISCONNECT))
                 for client in self.sockets.values()
             ])
-            self.sockets = {}
+            self.sockets.clear()
 
     async def handle_request(self, *args, **kwargs):
         """Handle an HTTP request from the client.
@@ -218,62 +303,36 @@ class AsyncServer(base_server.BaseServer):
             environ = await translate_request(*args, **kwargs)
         else:
             environ = translate_request(*args, **kwargs)
-
-        if self.cors_allowed_origins != []:
-            # Validate the origin header if present
-            # This is important for WebSocket more than for HTTP, since
-            # browsers only apply CORS controls to HTTP.
-            origin = environ.get('HTTP_ORIGIN')
-            if origin:
-                allowed_origins = self._cors_allowed_origins(environ)
-                if allowed_origins is not None and origin not in \
-                        allowed_origins:
-                    self._log_error_once(
-                        origin + ' is not an accepted origin.', 'bad-origin')
-                    return await self._make_response(
-                        self._bad_request(
-                            origin + ' is not an accepted origin.'),
-                        environ)
-
+        return await self._handle_request(environ)
+
+    async def _handle_request(self, environ):
+        # requests forwarded by other workers also enter the server here
+        if tracing.hooks:
+            query = self._parse_query(environ.get('QUERY_STRING', ''))
+            with tracing.span('server.handle_request',
+                              method=environ['REQUEST_METHOD'],
+                              sid=query.get('sid'),
+                              transport=query.get('transport', 'polling')):
+                return await self._route_request(environ)
+        return await self._route_request(environ)
+
+    async def _route_request(self, environ):
+        start = time.perf_counter()
+        sid, transport, jsonp_index, r = self._parse_request(environ)
+        if r is not None:
+            return await self._make_response(r, environ)
         method = environ['REQUEST_METHOD']
-        query = urllib.parse.parse_qs(environ.get('QUERY_STRING', ''))
-
-        sid = query['sid'][0] if 'sid' in query else None
-        jsonp = False
-        jsonp_index = None
-
-        # make sure the client uses an allowed transport
-        transport = query.get('transport', ['polling'])[0]
-        if transport not in self.transports:
-            self._log_error_once('Invalid transport', 'bad-transport')
-            return await self._make_response(
-                self._bad_request('Invalid transport'), environ)
-
-        # make sure the client speaks a compatible Engine.IO version
-        sid = query['sid'][0] if 'sid' in query else None
-        if sid is None and query.get('EIO') != ['4']:
-            self._log_error_once(
-                'The client is using an unsupported version of the Socket.IO '
-                'or Engine.IO protocols', 'bad-version'
-            )
-            return await self._make_response(self._bad_request(
-                'The client is using an unsupported version of the Socket.IO '
-                'or Engine.IO protocols'
-            ), environ)
-
-        if 'j' in query:
-            jsonp = True
-            try:
-                jsonp_index = int(query['j'][0])
-            except (ValueError, KeyError, IndexError):
-                # Invalid JSONP index number
-                pass
 
-        if jsonp and jsonp_index is None:
-            self._log_error_once('Invalid JSONP index number',
-                                 'bad-jsonp-index')
-            r = self._bad_request('Invalid JSONP index number')
-        elif method == 'GET':
+        if sid is not None and self.worker_router is not None and \
+                sid not in self.sockets and 'HTTP_UPGRADE' not in environ:
+            # the session may belong to another worker process
+            owner = self.worker_router.remote_owner(sid)
+            if owner is not None:
+                r = await self.worker_router.forward(owner, environ)
+                if r is not None:
+                    return await self._make_response(r, environ)
+
+        if method == 'GET':
             upgrade_header = environ.get('HTTP_UPGRADE').lower() \
                 if 'HTTP_UPGRADE' in environ else None
             if sid is None:
@@ -288,44 +347,34 @@ class AsyncServer(base_server.BaseServer):
                                          'bad-upgrade')
                     r = self._bad_request('Invalid websocket upgrade')
             else:
-                if sid not in self.sockets:
-                    self._log_error_once(f'Invalid session {sid}', 'bad-sid')
-                    r = self._bad_request(f'Invalid session {sid}')
+                # established session, which is looked up only once
+                socket = self.sockets.get(sid)
+                if socket is None or socket.closed:
+                    r = self._invalid_session(sid, socket)
+                elif transport != upgrade_header and transport != (
+                        'websocket' if socket.upgraded else 'polling'):
+                    self._log_error_once(
+                        f'Invalid transport for session {sid}',
+                        'bad-transport')
+                    r = self._bad_request('Invalid transport')
                 else:
                     try:
-                        socket = self._get_socket(sid)
-                    except KeyError as e:  # pragma: no cover
-                        self._log_error_once(f'{e} {sid}', 'bad-sid')
-                        r = self._bad_request(f'{e} {sid}')
-                    else:
-                        if self.transport(sid) != transport and \
-                                transport != upgrade_header:
-                            self._log_error_once(
-                                f'Invalid transport for session {sid}',
-                                'bad-transport')
-                            r = self._bad_request('Invalid transport')
+                        packets = await socket.handle_get_request(environ)
+                        if isinstance(packets, list):
+                            r = self._ok(packets, jsonp_index=jsonp_index)
                         else:
-                            try:
-                                packets = await socket.handle_get_request(
-                                    environ)
-                                if isinstance(packets, list):
-                                    r = self._ok(packets,
-                                                 jsonp_index=jsonp_index)
-                                else:
-                                    r = packets
-                            except exceptions.EngineIOError:
-                                if sid in self.sockets:  # pragma: no cover
-                                    await self.disconnect(sid)
-                                r = self._bad_request()
-                            if sid in self.sockets and \
-                                    self.sockets[sid].closed:
-                                del self.sockets[sid]
+                            r = packets
+                    except exceptions.EngineIOError:
+                        if sid in self.sockets:  # pragma: no cover
+                            await self.disconnect(sid)
+                        r = self._bad_request()
+                    if socket.closed:
+                        self.sockets.remove(sid, socket)
         elif method == 'POST':
-            if sid is None or sid not in self.sockets:
-                self._log_error_once(f'Invalid session {sid}', 'bad-sid')
-                r = self._bad_request(f'Invalid session {sid}')
+            socket = self.sockets.get(sid) if sid is not None else None
+            if socket is None or socket.closed:
+                r = self._invalid_session(sid, socket)
             else:
-                socket = self._get_socket(sid)
                 try:
                     await socket.handle_post_request(environ)
                     r = self._ok(jsonp_index=jsonp_index)
@@ -345,16 +394,10 @@ class AsyncServer(base_server.BaseServer):
             r = self._method_not_found()
         if not isinstance(r, dict):
             return r
-        if self.http_compression and \
-                len(r['response']) >= self.compression_threshold:
-            encodings = [e.split(';')[0].strip() for e in
-                         environ.get('HTTP_ACCEPT_ENCODING', '').split(',')]
-            for encoding in encodings:
-                if encoding in self.compression_methods:
-                    r['response'] = \
-                        getattr(self, '_' + encoding)(r['response'])
-                    r['headers'] += [('Content-Encoding', encoding)]
-                    break
+        self._prepare_response_body(r, environ)
+        if self.metrics is not None:
+            self.metrics.observe('request_duration_seconds',
+                                 time.perf_counter() - start, method)
         return await self._make_response(r, environ)
 
     async def shutdown(self):
@@ -368,6 +411,9 @@ class AsyncServer(base_server.BaseServer):
             self.service_task_event.set()
             await self.service_task_handle
             self.service_task_handle = None
+        await self.ping_scheduler.stop()
+        if self.worker_router is not None:
+            await self.worker_router.stop()
 
     def start_background_task(self, target, *args, **kwargs):
         """Start a background task using the appropriate async model.
@@ -427,6 +473,10 @@ class AsyncServer(base_server.BaseServer):
         return asyncio.Event(*args, **kwargs)
 
     async def _make_response(self, response_dict, environ):
+        if 'engineio.forwarded' in environ:
+            # the response to a request forwarded by another worker is sent
+            # back to that worker, which adds the CORS headers
+            return response_dict
         cors_headers = self._cors_headers(environ)
         make_response = self._async['make_response']
         if inspect.iscoroutinefunction(make_response):
@@ -443,15 +493,15 @@ class AsyncServer(base_server.BaseServer):
 
     async def _handle_connect(self, environ, transport, jsonp_index=None):
         """Handle a client connection request."""
-        if self.start_service_task:
+        if self._claim_service_task():
             # start the service task to monitor connected clients
-            self.start_service_task = False
             self.service_task_handle = self.start_background_task(
                 self._service_task)
 
         sid = self.generate_id()
         s = async_socket.AsyncSocket(self, sid)
         self.sockets[sid] = s
+        self.packet_log.opened(sid)
 
         pkt = packet.Packet(packet.OPEN, {
             'sid': sid,
@@ -467,16 +517,19 @@ class AsyncServer(base_server.BaseServer):
                                         run_async=False)
         if ret is not None and ret is not True:
             del self.sockets[sid]
+            self.packet_log.discard(sid)
             self.logger.warning('Application rejected connection')
             return self._unauthorized(ret or None)
 
         s.schedule_ping()
+        if self.metrics is not None:
+            self.metrics.inc('connections', transport)
 
         if transport == 'websocket':
             ret = await s.handle_get_request(environ)
-            if s.closed and sid in self.sockets:
+            if s.closed:
                 # websocket connection ended, so we are done
-                del self.sockets[sid]
+                self.sockets.remove(sid, s)
             return ret
         else:
             s.connected = True
@@ -527,6 +580,13 @@ class AsyncServer(base_server.BaseServer):
                             # connection
                             return False
 
+                if self.metrics is not None:
+                    run_async_handler = self.metrics.timed_async(
+                        run_async_handler, 'handler_duration_seconds', event)
+                if tracing.hooks:
+                    run_async_handler = tracing.traced_async(
+                        run_async_handler, 'server.trigger_event', event=event,
+                        sid=args[0] if args else None)
                 if run_async:
                     ret = self.start_background_task(run_async_handler)
                     task_reference_holder.add(ret)
@@ -553,6 +613,13 @@ class AsyncServer(base_server.BaseServer):
                             # connection
                             return False
 
+                if self.metrics is not None:
+                    run_sync_handler = self.metrics.timed_async(
+                        run_sync_handler, 'handler_duration_seconds', event)
+                if tracing.hooks:
+                    run_sync_handler = tracing.traced_async(
+                        run_sync_handler, 'server.trigger_event', event=event,
+                        sid=args[0] if args else None)
                 if run_async:
                     ret = self.start_background_task(run_sync_handler)
                     task_reference_holder.add(ret)
@@ -566,36 +633,17 @@ class AsyncServer(base_server.BaseServer):
         loop = asyncio.get_running_loop()
         self.service_task_event = self.create_event()
         while not self.service_task_event.is_set():
-            if len(self.sockets) == 0:
-                # nothing to do
+            try:
+                # only the clients with a check that is due are visited
+                timed_out, timeout = self._due_client_checks()
+                for s in timed_out:
+                    await s._ping_timeout()
                 try:
                     await asyncio.wait_for(self.service_task_event.wait(),
-                                           timeout=self.ping_timeout)
-                    break
+                                           timeout=timeout)
+                    raise KeyboardInterrupt()
                 except asyncio.TimeoutError:
                     continue
-
-            # go through the entire client list in a ping interval cycle
-            sleep_interval = self.ping_timeout / len(self.sockets)
-
-            try:
-                # iterate over the current clients
-                for s in self.sockets.copy().values():
-                    if s.closed:
-                        try:
-                            del self.sockets[s.sid]
-                        except KeyError:
-                            # the socket could have also been removed by
-                            # the _get_socket() method from another thread
-                            pass
-                    elif not s.closing:
-                        await s.check_ping_timeout()
-                    try:
-                        await asyncio.wait_for(self.service_task_event.wait(),
-                                               timeout=sleep_interval)
-                        raise KeyboardInterrupt()
-                    except asyncio.TimeoutError:
-                        continue
             except (
                 SystemExit,
                 KeyboardInterrupt,
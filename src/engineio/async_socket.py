@@ -5,39 +5,44 @@ import time
 from . import base_socket
 from . import exceptions
 from . import packet
+from . import packet_queue
 from . import payload
+from . import request_body
+from . import tracing
 
 
 class AsyncSocket(base_socket.BaseSocket):
+    __slots__ = ()
+
+    def _create_queue(self):
+        return packet_queue.AsyncPacketQueue()
+
     async def poll(self):
         """Wait for packets to send to the client."""
+        if tracing.hooks:
+            with tracing.span('socket.poll', sid=self.sid,
+                              transport='websocket' if self.upgraded
+                              else 'polling'):
+                return await self._poll()
+        return await self._poll()
+
+    async def _poll(self):
         try:
-            packets = [await asyncio.wait_for(
-                self.queue.get(),
-                self.server.ping_interval + self.server.ping_timeout)]
-            self.queue.task_done()
-        except (asyncio.TimeoutError, asyncio.CancelledError):
+            packets = await self.queue.drain(
+                timeout=self.server.ping_interval + self.server.ping_timeout)
+        except asyncio.CancelledError:
             raise exceptions.QueueEmpty()
-        if packets == [None]:
-            return []
-        while True:
-            try:
-                pkt = self.queue.get_nowait()
-                self.queue.task_done()
-                if pkt is None:
-                    self.queue.put_nowait(None)
-                    break
-                packets.append(pkt)
-            except asyncio.QueueEmpty:
-                break
-        return packets
+        if not packets:
+            raise exceptions.QueueEmpty()
+        return self._split_at_sentinel(packets)
 
     async def receive(self, pkt):
         """Receive packet from the client."""
-        self.server.logger.info('%s: Received packet %s data %s',
-                                self.sid, packet.packet_names[pkt.packet_type],
-                                pkt.data if not isinstance(pkt.data, bytes)
-                                else '<binary>')
+        self.server.packet_log.received(self.sid, pkt)
+        if self.server.metrics is not None:
+            self.server.metrics.inc(
+                'packets_received',
+                'websocket' if self.upgraded else 'polling')
         if pkt.packet_type == packet.PONG:
             self.schedule_ping()
         elif pkt.packet_type == packet.MESSAGE:
@@ -58,26 +63,26 @@ class AsyncSocket(base_socket.BaseSocket):
             raise exceptions.SocketIsClosedError()
         if self.last_ping and \
                 time.time() - self.last_ping > self.server.ping_timeout:
-            self.server.logger.info('%s: Client is gone, closing socket',
-                                    self.sid)
-            # Passing abort=False here will cause close() to write a
-            # CLOSE packet. This has the effect of updating half-open sockets
-            # to their correct state of disconnected
-            await self.close(wait=False, abort=False,
-                             reason=self.server.reason.PING_TIMEOUT)
+            await self._ping_timeout()
             return False
         return True
 
+    async def _ping_timeout(self):
+        self.server.logger.info('%s: Client is gone, closing socket',
+                                self.sid)
+        # Passing abort=False here will cause close() to write a
+        # CLOSE packet. This has the effect of updating half-open sockets
+        # to their correct state of disconnected
+        await self.close(wait=False, abort=False,
+                         reason=self.server.reason.PING_TIMEOUT)
+
     async def send(self, pkt):
         """Send a packet to the client."""
         if not await self.check_ping_timeout():
             return
         else:
             await self.queue.put(pkt)
-        self.server.logger.info('%s: Sending packet %s data %s',
-                                self.sid, packet.packet_names[pkt.packet_type],
-                                pkt.data if not isinstance(pkt.data, bytes)
-                                else '<binary>')
+        self.server.packet_log.sent(self.sid, pkt)
 
     async def handle_get_request(self, environ):
         """Handle a long-polling GET request from the client."""
@@ -93,6 +98,7 @@ class AsyncSocket(base_socket.BaseSocket):
             # we are upgrading to WebSocket, do not return any more packets
             # through the polling endpoint
             return [packet.Packet(packet.NOOP)]
+        start = time.perf_counter()
         try:
             packets = await self.poll()
         except exceptions.QueueEmpty:
@@ -100,30 +106,63 @@ class AsyncSocket(base_socket.BaseSocket):
             await self.close(wait=False,
                              reason=self.server.reason.TRANSPORT_ERROR)
             raise exc[1].with_traceback(exc[2])
+        if self.server.metrics is not None:
+            self.server.metrics.observe('poll_wait_seconds',
+                                        time.perf_counter() - start)
         return packets
 
     async def handle_post_request(self, environ):
         """Handle a long-polling POST request from the client."""
-        length = int(environ.get('CONTENT_LENGTH', '0'))
-        if length > self.server.max_http_buffer_size:
-            raise exceptions.ContentTooLongError()
+        max_size = self.server.max_http_buffer_size
+        body = environ['wsgi.input']
+        decoder = payload.PayloadDecoder()
+        if 'CONTENT_LENGTH' in environ or \
+                not isinstance(body, request_body.AsyncRequestBody):
+            length = int(environ.get('CONTENT_LENGTH', '0'))
+            if length > max_size:
+                raise exceptions.ContentTooLongError()
+            if self.server.metrics is not None:
+                self.server.metrics.inc('bytes_received', 'polling', length)
+            while length > 0:
+                chunk = await body.read(min(length, decoder.chunk_size))
+                if not chunk:
+                    break
+                length -= len(chunk)
+                for pkt in decoder.feed(chunk):
+                    await self.receive(pkt)
         else:
-            body = (await environ['wsgi.input'].read(length)).decode('utf-8')
-            p = payload.Payload(encoded_payload=body)
-            for pkt in p.packets:
-                await self.receive(pkt)
+            # the length of the body is unknown, so the packets are processed
+            # as they arrive and the body is rejected as soon as it exceeds
+            # the maximum size
+            size = 0
+            while True:
+                chunk = await body.read(decoder.chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise exceptions.ContentTooLongError()
+                for pkt in decoder.feed(chunk):
+                    await self.receive(pkt)
+            if self.server.metrics is not None:
+                self.server.metrics.inc('bytes_received', 'polling', size)
+        for pkt in decoder.close():
+            await self.receive(pkt)
 
     async def close(self, wait=True, abort=False, reason=None):
         """Close the socket connection."""
         if not self.closed and not self.closing:
             self.closing = True
-            await self.server._trigger_event(
-                'disconnect', self.sid,
-                reason or self.server.reason.SERVER_DISCONNECT,
-                run_async=False)
+            reason = reason or self.server.reason.SERVER_DISCONNECT
+            if self.server.metrics is not None:
+                self.server.metrics.inc('disconnects', reason)
+            await self.server._trigger_event('disconnect', self.sid, reason,
+                                             run_async=False)
             if not abort:
                 await self.send(packet.Packet(packet.CLOSE))
             self.closed = True
+            self.server.packet_log.closed(self.sid, reason)
+            self.server._schedule_client_check(self)
             if wait:
                 await self.queue.join()
 
@@ -131,13 +170,13 @@ class AsyncSocket(base_socket.BaseSocket):
         # only schedule a new ping if the previous ping wait cycle completed
         if self.last_ping:
             self.last_ping = None
-            self.server.start_background_task(self._send_ping)
+            self.server.ping_scheduler.schedule(self)
 
     async def _send_ping(self):
-        await asyncio.sleep(self.server.ping_interval)
         if not self.closing and not self.closed:
             self.last_ping = time.time()
             await self.send(packet.Packet(packet.PING))
+            self.server._schedule_client_check(self)
 
     async def _upgrade_websocket(self, environ):
         """Upgrade the connection from polling to websocket."""
@@ -152,10 +191,14 @@ class AsyncSocket(base_socket.BaseSocket):
 
     async def _websocket_handler(self, ws):
         """Engine.IO handler for websocket transport."""
+        metrics = self.server.metrics
+
         async def websocket_wait():
             data = await ws.wait()
             if data and len(data) > self.server.max_http_buffer_size:
                 raise ValueError('packet is too large')
+            if data and metrics is not None:
+                metrics.inc('bytes_received', 'websocket', len(data))
             return data
 
         if self.connected:
@@ -192,10 +235,19 @@ class AsyncSocket(base_socket.BaseSocket):
                 return
             self.upgraded = True
             self.upgrading = False
+            if metrics is not None:
+                metrics.inc('upgrades')
         else:
             self.connected = True
             self.upgraded = True
 
+        async def write(packets):
+            for pkt in packets:
+                encoded_packet = pkt.encode()
+                await ws.send(encoded_packet)
+                if metrics is not None:
+                    self._count_websocket_batch([encoded_packet])
+
         # start separate writer thread
         async def writer():
             while True:
@@ -208,8 +260,12 @@ class AsyncSocket(base_socket.BaseSocket):
                     # empty packet list returned -> connection closed
                     break
                 try:
-                    for pkt in packets:
-                        await ws.send(pkt.encode())
+                    if tracing.hooks:
+                        with tracing.span('socket.websocket_write',
+                                          sid=self.sid, packets=len(packets)):
+                            await write(packets)
+                    else:
+                        await write(packets)
                 except:
                     break
             await ws.close()
@@ -3,6 +3,7 @@ import signal
 import threading
 import time
 import urllib
+from . import json_codecs
 from . import packet
 
 default_logger = logging.getLogger('engineio.client')
@@ -69,7 +70,7 @@ class BaseClient:
         self.timestamp_requests = timestamp_requests
 
         if json is not None:
-            packet.Packet.json = json
+            packet.Packet.json = json_codecs.get_codec(json)
         if not isinstance(logger, bool):
             self.logger = logger
         else:
@@ -1,19 +1,40 @@
 import base64
-import gzip
+import collections
 import importlib
-import io
+import itertools
 import logging
 import secrets
-import zlib
-
+import threading
+import time
+import urllib
+
+from . import compression
+from . import cors
+from . import json_codecs
+from . import metrics as eio_metrics
 from . import packet
+from . import packet_log
 from . import payload
+from . import ping_scheduler
+from . import response_headers
+from . import session_registry
+from . import tracing
+from . import worker_router
+
+#: The query string arguments used by the server.
+query_arguments = {'sid', 'transport', 'EIO', 'j'}
 
 default_logger = logging.getLogger('engineio.server')
 
 
 class BaseServer:
     compression_methods = ['gzip', 'deflate']
+    websocket_compression_options = [
+        'level', 'mem_level', 'server_max_window_bits',
+        'client_max_window_bits', 'server_no_context_takeover',
+        'client_no_context_takeover', 'threshold']
+    packet_logging_options = ['sample_rate', 'max_data_length',
+                              'flight_recorder']
     event_names = ['connect', 'disconnect', 'message']
     valid_transports = ['polling', 'websocket']
     _default_monitor_clients = True
@@ -38,7 +59,9 @@ class BaseServer:
                  cookie=None, cors_allowed_origins=None,
                  cors_credentials=True, logger=False, json=None,
                  async_handlers=True, monitor_clients=None, transports=None,
-                 **kwargs):
+                 websocket_max_batch_bytes=None, websocket_compression=True,
+                 metrics=False, packet_logging=None, worker_socket_dir=None,
+                 worker_id=None, cors_cache_size=0, **kwargs):
         self.ping_timeout = ping_timeout
         if isinstance(ping_interval, tuple):
             self.ping_interval = ping_interval[0]
@@ -49,20 +72,57 @@ class BaseServer:
         self.max_http_buffer_size = max_http_buffer_size
         self.allow_upgrades = allow_upgrades
         self.http_compression = http_compression
+        self.compression = None
+        if http_compression:
+            self.compression = compression.HTTPCompression(
+                http_compression
+                if isinstance(http_compression, (dict, list))
+                else self.compression_methods)
         self.compression_threshold = compression_threshold
         self.cookie = cookie
+        self.cors_cache_size = cors_cache_size
         self.cors_allowed_origins = cors_allowed_origins
         self.cors_credentials = cors_credentials
         self.async_handlers = async_handlers
-        self.sockets = {}
+        self.websocket_max_batch_bytes = websocket_max_batch_bytes
+        if isinstance(websocket_compression, dict):
+            for option in websocket_compression:
+                if option not in self.websocket_compression_options:
+                    raise ValueError('Invalid WebSocket compression option '
+                                     + option)
+        self.websocket_compression = websocket_compression
+        self.sockets = session_registry.SessionRegistry()
+        # protects the server state that is modified by request handlers,
+        # so that the server does not depend on the GIL
+        self._lock = threading.Lock()
         self.handlers = {}
+        self.metrics = None
+        if metrics:
+            if not isinstance(metrics, eio_metrics.Metrics):
+                metrics = eio_metrics.Metrics()
+            self.metrics = metrics
+            self._register_metrics()
         self.log_message_keys = set()
         self.start_service_task = monitor_clients \
             if monitor_clients is not None else self._default_monitor_clients
         self.service_task_handle = None
         self.service_task_event = None
+        self.client_checks = collections.deque() \
+            if self.start_service_task else None
+        if self.is_asyncio_based():
+            self.ping_scheduler = ping_scheduler.AsyncPingScheduler(self)
+        else:
+            self.ping_scheduler = ping_scheduler.PingScheduler(self)
+        self.worker_router = None
+        if worker_socket_dir is not None:
+            if self.is_asyncio_based():
+                self.worker_router = worker_router.AsyncWorkerRouter(
+                    self, worker_socket_dir, worker_id)
+            else:
+                self.worker_router = worker_router.WorkerRouter(
+                    self, worker_socket_dir, worker_id)
         if json is not None:
-            packet.Packet.json = json
+            packet.Packet.json = json_codecs.get_codec(json)
         if not isinstance(logger, bool):
             self.logger = logger
         else:
@@ -73,6 +133,14 @@ class BaseServer:
                 else:
                     self.logger.setLevel(logging.ERROR)
                 self.logger.addHandler(logging.StreamHandler())
+        for option in packet_logging or {}:
+            if option not in self.packet_logging_options:
+                raise ValueError('Invalid packet logging option ' + option)
+        self.packet_log = packet_log.PacketLog(
+            self.logger, dump_reasons=[self.reason.PING_TIMEOUT,
+                                       self.reason.TRANSPORT_ERROR,
+                                       self.reason.TRANSPORT_CLOSE],
+            **(packet_logging or {}))
         modes = self.async_modes()
         if async_mode is not None:
             modes = [async_mode] if async_mode in modes else []
@@ -109,6 +177,15 @@ class BaseServer:
             if not transports:
                 raise ValueError('No valid transports provided')
         self.transports = transports or self.valid_transports
+        if isinstance(websocket_compression, dict):
+            supported = self._async.get('websocket_compression_options', [])
+            ignored = [option for option in websocket_compression
+                       if option not in supported]
+            if ignored:
+                self.logger.warning(
+                    'The WebSocket driver of the %s async mode ignores the '
+                    'WebSocket compression options: %s', self.async_mode,
+                    ', '.join(ignored))
         self.logger.info('Server initialized for %s.', self.async_mode)
 
     def is_asyncio_based(self):
@@ -159,6 +236,18 @@ class BaseServer:
             return set_handler
         set_handler(handler)
 
+    @property
+    def cors_allowed_origins(self):
+        return self._cors_allowed_origins
+
+    @cors_allowed_origins.setter
+    def cors_allowed_origins(self, value):
+        # the allowed origins are compiled into a policy object, which is
+        # rebuilt if the application changes them
+        self._cors_allowed_origins = value
+        self.origin_policy = cors.OriginPolicy(
+            value, cache_size=self.cors_cache_size)
+
     def transport(self, sid):
         """Return the name of the transport used by the client.
 
@@ -198,11 +287,89 @@ class BaseServer:
 
     def generate_id(self):
         """Generate a unique session id."""
+        prefix = b''
+        if self.worker_router is not None:
+            # the id of the worker that owns the session is the first byte
+            prefix = bytes([self.worker_router.start()])
+        with self._lock:
+            sequence_number = self.sequence_number
+            self.sequence_number = (sequence_number + 1) & 0xffffff
         id = base64.b64encode(
-            secrets.token_bytes(12) + self.sequence_number.to_bytes(3, 'big'))
-        self.sequence_number = (self.sequence_number + 1) & 0xffffff
+            prefix + secrets.token_bytes(12 - len(prefix))
+            + sequence_number.to_bytes(3, 'big'))
         return id.decode('utf-8').replace('/', '_').replace('+', '-')
 
+    def _register_metrics(self):
+        """Initialize the counters and gauges of the server metrics."""
+        for name, value in vars(self.reason).items():
+            if not name.startswith('_'):
+                # disconnection reasons are reported even when they are zero
+                self.metrics.inc('disconnects', value, 0)
+        self.metrics.gauge('clients', lambda: len(self.sockets),
+                           'Connected clients.')
+        self.metrics.gauge(
+            'queued_packets',
+            lambda: sum(s.queue.qsize() for s in self.sockets.values()),
+            'Packets waiting to be sent to clients.')
+
+    def _broadcast_sids(self, skip_sid=None):
+        """Return the list of session ids that receive a broadcast."""
+        if skip_sid is None:
+            skip_sid = []
+        elif not isinstance(skip_sid, list):
+            skip_sid = [skip_sid]
+        return [sid for sid in self.sockets if sid not in skip_sid]
+
+    def _schedule_client_check(self, socket):
+        """Schedule a check of a client by the service task.
+
+        The check happens after the ping timeout. If by then the client has
+        not responded to the ping that was outstanding when the check was
+        scheduled it is disconnected, and if the socket is closed it is
+        removed from the session list.
+        """
+        if self.client_checks is not None:
+            # the ping timeout is the same for all clients, so appending new
+            # checks at the end keeps the queue sorted by due time
+            self.client_checks.append(
+                (time.monotonic() + self.ping_timeout, socket,
+                 socket.last_ping))
+
+    def _claim_service_task(self):
+        """Return ``True`` if the service task needs to be started by the
+        caller.
+
+        Only the first caller gets ``True``, even when several threads try to
+        start the task at the same time.
+        """
+        if not self.start_service_task:
+            return False
+        with self._lock:
+            start = self.start_service_task
+            self.start_service_task = False
+        return start
+
+    def _due_client_checks(self):
+        """Return the clients that timed out since the last call, and the
+        time to wait until the next check is due."""
+        now = time.monotonic()
+        timed_out = []
+        while self.client_checks and self.client_checks[0][0] <= now:
+            _, s, last_ping = self.client_checks.popleft()
+            if s.closed:
+                self.sockets.remove(s.sid, s)
+            elif not s.closing and last_ping is not None and \
+                    s.last_ping == last_ping:
+                # the ping sent when this check was scheduled was not answered
+                timed_out.append(s)
+        if self.client_checks:
+            timeout = self.client_checks[0][0] - now
+        else:
+            # new checks are always due at least a ping timeout into the
+            # future, so sleeping this long does not delay any of them
+            timeout = self.ping_timeout
+        return timed_out, timeout
+
     def _generate_sid_cookie(self, sid, attributes):
         """Generate the sid cookie."""
         cookie = attributes.get('name', 'io') + '=' + sid
@@ -238,38 +405,184 @@ class BaseServer:
         except KeyError:
             raise KeyError('Session not found')
         if s.closed:
-            del self.sockets[sid]
+            self.sockets.remove(sid, s)
             raise KeyError('Session is disconnected')
         return s
 
+    @staticmethod
+    def _parse_query(query_string):
+        """Return the Engine.IO arguments in a query string.
+
+        This is a faster replacement for ``urllib.parse.parse_qs()`` that only
+        decodes the arguments used by the server, keeping their first value,
+        and only unquotes the arguments that need it.
+        """
+        query = {}
+        for field in query_string.split('&'):
+            name, _, value = field.partition('=')
+            if not value:
+                continue
+            if '%' in field or '+' in field:
+                name = urllib.parse.unquote_plus(name)
+                value = urllib.parse.unquote_plus(value)
+            if name in query_arguments and name not in query:
+                query[name] = value
+        return query
+
+    def _parse_request(self, environ):
+        """Validate the origin and the query string of a request.
+
+        The return value is a tuple with the session id, the transport name,
+        the JSONP index and an error response. The error response is ``None``
+        when the request is valid.
+        """
+        if not self.origin_policy.disabled:
+            # Validate the origin header if present
+            # This is important for WebSocket more than for HTTP, since
+            # browsers only apply CORS controls to HTTP.
+            origin = environ.get('HTTP_ORIGIN')
+            if origin:
+                if not self.origin_policy.is_allowed(origin, environ):
+                    self._log_error_once(
+                        origin + ' is not an accepted origin.', 'bad-origin')
+                    return None, None, None, self._bad_request(
+                        'Not an accepted origin.')
+
+        query = self._parse_query(environ.get('QUERY_STRING', ''))
+
+        # make sure the client uses an allowed transport
+        transport = query.get('transport', 'polling')
+        if transport not in self.transports:
+            self._log_error_once('Invalid transport', 'bad-transport')
+            return None, None, None, self._bad_request('Invalid transport')
+
+        # make sure the client speaks a compatible Engine.IO version
+        sid = query.get('sid')
+        if sid is None and query.get('EIO') != '4':
+            self._log_error_once(
+                'The client is using an unsupported version of the Socket.IO '
+                'or Engine.IO protocols', 'bad-version')
+            return None, None, None, self._bad_request(
+                'The client is using an unsupported version of the Socket.IO '
+                'or Engine.IO protocols')
+
+        jsonp_index = None
+        if 'j' in query:
+            try:
+                jsonp_index = int(query['j'])
+            except ValueError:
+                self._log_error_once('Invalid JSONP index number',
+                                     'bad-jsonp-index')
+                return None, None, None, self._bad_request(
+                    'Invalid JSONP index number')
+        return sid, transport, jsonp_index, None
+
+    def _invalid_session(self, sid, socket):
+        """Generate the response for a request with an unknown or closed
+        session."""
+        if socket is not None:
+            self.sockets.remove(sid, socket)
+        self._log_error_once(f'Invalid session {sid}', 'bad-sid')
+        return self._bad_request(f'Invalid session {sid}')
+
     def _ok(self, packets=None, headers=None, jsonp_index=None):
         """Generate a successful HTTP response."""
         if packets is not None:
+            if self.metrics is not None:
+                self.metrics.inc('packets_sent', 'polling', len(packets))
             if headers is None:
                 headers = []
-            headers += [('Content-Type', 'text/plain; charset=UTF-8')]
+            headers += [response_headers.TEXT_UTF8]
+            chunks = payload.Payload(packets=packets).encode_chunks(
+                jsonp_index=jsonp_index)
+            if tracing.hooks:
+                with tracing.span('payload.encode', packets=len(packets)):
+                    response, more = next(chunks, b''), next(chunks, None)
+            else:
+                response, more = next(chunks, b''), next(chunks, None)
+            if more is not None:
+                # the payload is larger than a chunk, so it is streamed to
+                # the client while the remaining packets are encoded
+                response = itertools.chain((response, more), chunks)
             return {'status': '200 OK',
                     'headers': headers,
-                    'response': payload.Payload(packets=packets).encode(
-                        jsonp_index=jsonp_index).encode('utf-8')}
+                    'response': response}
         else:
             return {'status': '200 OK',
-                    'headers': [('Content-Type', 'text/plain')],
+                    'headers': [response_headers.TEXT],
                     'response': b'OK'}
 
+    def _prepare_response_body(self, r, environ):
+        """Compress the body of a response, if appropriate, and add its size
+        to the metrics.
+
+        The body is bytes, or an iterable of byte chunks for a response that
+        is streamed. Responses are compressed when they are at least
+        ``compression_threshold`` bytes long, whether they are streamed or
+        not. Streamed responses are processed as they are consumed.
+        """
+        response = r['response']
+        accept_encoding = environ.get('HTTP_ACCEPT_ENCODING', '')
+        if self.compression is not None and \
+                not isinstance(response, bytes):
+            response = self._stream_or_join(response)
+        if isinstance(response, bytes):
+            if self.compression is not None and \
+                    len(response) >= self.compression_threshold:
+                encoding, response = self.compression.compress(
+                    accept_encoding, response)
+                if encoding is not None:
+                    r['headers'] += [
+                        response_headers.CONTENT_ENCODING[encoding]]
+            if self.metrics is not None:
+                self.metrics.inc('bytes_sent', 'polling', len(response))
+        else:
+            if self.compression is not None:
+                encoding, response = self.compression.compress_stream(
+                    accept_encoding, response)
+                if encoding is not None:
+                    r['headers'] += [
+                        response_headers.CONTENT_ENCODING[encoding]]
+            if self.metrics is not None:
+                response = self._count_bytes_sent(response)
+        r['response'] = response
+
+    def _stream_or_join(self, chunks):
+        """Return a streamed response as bytes if it is shorter than the
+        compression threshold, so that it is not compressed.
+
+        Only the chunks needed to reach the threshold are consumed. If the
+        response is longer, an iterable with all the chunks is returned.
+        """
+        chunks = iter(chunks)
+        head = []
+        size = 0
+        while size < self.compression_threshold:
+            chunk = next(chunks, None)
+            if chunk is None:
+                return b''.join(head)
+            head.append(chunk)
+            size += len(chunk)
+        return itertools.chain(head, chunks)
+
+    def _count_bytes_sent(self, chunks):
+        for chunk in chunks:
+            self.metrics.inc('bytes_sent', 'polling', len(chunk))
+            yield chunk
+
     def _bad_request(self, message=None):
         """Generate a bad request HTTP error response."""
         if message is None:
             message = 'Bad Request'
         message = packet.Packet.json.dumps(message)
         return {'status': '400 BAD REQUEST',
-                'headers': [('Content-Type', 'text/plain')],
+                'headers': [response_headers.TEXT],
                 'response': message.encode('utf-8')}
 
     def _method_not_found(self):
         """Generate a method not found HTTP error response."""
         return {'status': '405 METHOD NOT FOUND',
-                'headers': [('Content-Type', 'text/plain')],
+                'headers': [response_headers.TEXT],
                 'response': b'Method Not Found'}
 
     def _unauthorized(self, message=None):
@@ -278,81 +591,35 @@ class BaseServer:
             message = 'Unauthorized'
         message = packet.Packet.json.dumps(message)
         return {'status': '401 UNAUTHORIZED',
-                'headers': [('Content-Type', 'application/json')],
+                'headers': [response_headers.JSON],
                 'response': message.encode('utf-8')}
 
-    def _cors_allowed_origins(self, environ):
-        if self.cors_allowed_origins is None:
-            allowed_origins = []
-            if 'wsgi.url_scheme' in environ and 'HTTP_HOST' in environ:
-                allowed_origins.append('{scheme}://{host}'.format(
-                    scheme=environ['wsgi.url_scheme'],
-                    host=environ['HTTP_HOST']))
-                if 'HTTP_X_FORWARDED_PROTO' in environ or \
-                        'HTTP_X_FORWARDED_HOST' in environ:
-                    scheme = environ.get(
-                        'HTTP_X_FORWARDED_PROTO',
-                        environ['wsgi.url_scheme']).split(',')[0].strip()
-                    allowed_origins.append('{scheme}://{host}'.format(
-                        scheme=scheme, host=environ.get(
-                            'HTTP_X_FORWARDED_HOST',
-                            environ['HTTP_HOST']).split(
-                                ',')[0].strip()))
-        elif self.cors_allowed_origins == '*':
-            allowed_origins = None
-        elif isinstance(self.cors_allowed_origins, str):
-            allowed_origins = [self.cors_allowed_origins]
-        elif callable(self.cors_allowed_origins):
-            origin = environ.get('HTTP_ORIGIN')
-            try:
-                is_allowed = self.cors_allowed_origins(origin, environ)
-            except TypeError:
-                is_allowed = self.cors_allowed_origins(origin)
-            allowed_origins = [origin] if is_allowed else []
-        else:
-            if '*' in self.cors_allowed_origins:
-                allowed_origins = None
-            else:
-                allowed_origins = self.cors_allowed_origins
-        return allowed_origins
-
     def _cors_headers(self, environ):
         """Return the cross-origin-resource-sharing headers."""
-        if self.cors_allowed_origins == []:
+        if self.origin_policy.disabled:
             # special case, CORS handling is completely disabled
             return []
         headers = []
-        allowed_origins = self._cors_allowed_origins(environ)
-        if 'HTTP_ORIGIN' in environ and \
-                (allowed_origins is None or environ['HTTP_ORIGIN'] in
-                 allowed_origins):
-            headers = [('Access-Control-Allow-Origin', environ['HTTP_ORIGIN'])]
+        origin = environ.get('HTTP_ORIGIN')
+        if origin and self.origin_policy.is_allowed(origin, environ):
+            headers.append(('Access-Control-Allow-Origin', origin))
         if environ['REQUEST_METHOD'] == 'OPTIONS':
-            headers += [('Access-Control-Allow-Methods', 'OPTIONS, GET, POST')]
+            headers.append(response_headers.ALLOW_METHODS)
         if 'HTTP_ACCESS_CONTROL_REQUEST_HEADERS' in environ:
-            headers += [('Access-Control-Allow-Headers',
-                        environ['HTTP_ACCESS_CONTROL_REQUEST_HEADERS'])]
+            headers.append(('Access-Control-Allow-Headers',
+                            environ['HTTP_ACCESS_CONTROL_REQUEST_HEADERS']))
         if self.cors_credentials:
-            headers += [('Access-Control-Allow-Credentials', 'true')]
+            headers.append(response_headers.ALLOW_CREDENTIALS)
         return headers
 
-    def _gzip(self, response):
-        """Apply gzip compression to a response."""
-        bytesio = io.BytesIO()
-        with gzip.GzipFile(fileobj=bytesio, mode='w') as gz:
-            gz.write(response)
-        return bytesio.getvalue()
-
-    def _deflate(self, response):
-        """Apply deflate compression to a response."""
-        return zlib.compress(response)
-
     def _log_error_once(self, message, message_key):
         """Log message with logging.ERROR level the first time, then log
         with given level."""
-        if message_key not in self.log_message_keys:
+        with self._lock:
+            first = message_key not in self.log_message_keys
+            self.log_message_keys.add(message_key)
+        if first:
             self.logger.error(message + ' (further occurrences of this error '
                               'will be logged with level INFO)')
-            self.log_message_keys.add(message_key)
         else:
             self.logger.info(message)
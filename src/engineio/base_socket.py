@@ -2,16 +2,78 @@ import time
 
 
 class BaseSocket:
+    # the attributes of a socket are stored in slots, to reduce the memory
+    # used by each connected client. A __dict__ is still available, and it is
+    # only allocated when other attributes are assigned to a socket
+    __slots__ = ('server', 'sid', 'queue', 'last_ping', 'connected',
+                 'upgrading', 'upgraded', 'closing', 'closed', '_session',
+                 '__dict__')
     upgrade_protocols = ['websocket']
 
     def __init__(self, server, sid):
         self.server = server
         self.sid = sid
-        self.queue = self.server.create_queue()
+        self.queue = self._create_queue()
         self.last_ping = time.time()
         self.connected = False
         self.upgrading = False
         self.upgraded = False
         self.closing = False
         self.closed = False
-        self.session = {}
+        self._session = None
+
+    @property
+    def session(self):
+        """The user session of the client.
+
+        The session dictionary is created the first time it is used, so
+        clients that do not use sessions do not allocate it.
+        """
+        if self._session is None:
+            self._session = {}
+        return self._session
+
+    @session.setter
+    def session(self, session):
+        self._session = session
+
+    def _create_queue(self):  # pragma: no cover
+        raise NotImplementedError()
+
+    def _websocket_batches(self, packets):
+        """Group packets in encoded batches that can be written together."""
+        max_bytes = self.server.websocket_max_batch_bytes
+        batch = []
+        batch_size = 0
+        for pkt in packets:
+            encoded_packet = pkt.encode()
+            if batch and batch_size + len(encoded_packet) > max_bytes:
+                yield batch
+                batch = []
+                batch_size = 0
+            batch.append(encoded_packet)
+            batch_size += len(encoded_packet)
+        if batch:
+            yield batch
+
+    def _count_websocket_batch(self, batch):
+        """Add a batch of encoded packets written to a WebSocket to the
+        server metrics."""
+        metrics = self.server.metrics
+        metrics.inc('packets_sent', 'websocket', len(batch))
+        metrics.inc('bytes_sent', 'websocket', sum(
+            len(encoded_packet) for encoded_packet in batch))
+
+    def _split_at_sentinel(self, packets):
+        """Return the packets that precede the ``None`` close sentinel.
+
+        If the sentinel is found after other packets, it is put back in the
+        queue, so that the next poll reports the closed connection.
+        """
+        try:
+            index = packets.index(None)
+        except ValueError:
+            return packets
+        if index > 0:
+            self.queue.put_nowait(None)
+        return packets[:index]
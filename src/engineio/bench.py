@@ -0,0 +1,442 @@
+"""In-process load generator for Engine.IO servers.
+
+This module drives a :class:`engineio.Server` or :class:`engineio.AsyncServer`
+with a large number of virtual clients, by invoking the ``handle_request()``
+method of the server directly with synthetic WSGI environments or ASGI
+scopes. No network connections are involved, so the results measure the cost
+of the server itself.
+
+Each virtual client connects with the long-polling transport, exchanges a
+number of messages that the server echoes back, answers a ping and finally
+upgrades to WebSocket, sends more messages and disconnects.
+
+The load generator can be used from the command line::
+
+    python -m engineio.bench --clients 10000 --rounds 5
+
+The clients of a threading server can be divided among several threads, to
+measure how the server scales on multiple cores. This requires a
+free-threaded build of Python, since otherwise the threads share a single
+core. Passing more than one thread count runs the load test once for each::
+
+    python -m engineio.bench --threads 1 2 4 8
+
+Or from Python::
+
+    from engineio import bench
+
+    results = bench.run(clients=10000, rounds=5)
+"""
+import argparse
+import asyncio
+import gc
+import io
+import json
+import math
+import sys
+import threading
+import time
+import tracemalloc
+
+from . import packet
+
+
+def percentile(values, p):
+    """Return the ``p``-th percentile of a list of values."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+class _VirtualWebSocket:
+    """WebSocket stand-in for the WSGI server, which delivers the messages
+    stored in the ``environ`` by the load generator."""
+    def __init__(self, handler, server):
+        self.handler = handler
+        self.received = 0
+
+    def __call__(self, environ, start_response):
+        self.messages = iter(environ['engineio.bench.messages'])
+        return self.handler(self)
+
+    def wait(self):
+        return next(self.messages, None)
+
+    def send(self, message):
+        self.received += 1
+
+    def close(self):
+        pass
+
+
+class LoadGenerator:
+    """Load generator for a :class:`engineio.Server`.
+
+    :param clients: The number of virtual clients.
+    :param rounds: The number of messages each client sends and receives on
+                   each transport.
+    :param message_size: The size of the messages, in characters.
+    :param upgrade: If ``True``, the clients upgrade to WebSocket before
+                    disconnecting.
+    :param server_options: A dictionary with additional arguments to pass to
+                           the server.
+    :param threads: The number of threads that run the clients.
+    """
+    def __init__(self, clients=1000, rounds=10, message_size=32,
+                 upgrade=True, server_options=None, threads=1):
+        self.clients = clients
+        self.threads = threads
+        self.rounds = rounds
+        self.message = '4' + 'x' * message_size
+        self.upgrade = upgrade
+        self.server_options = {
+            'async_handlers': False,
+            'monitor_clients': False,
+            # the load generator triggers the pings, so that they do not
+            # depend on the duration of the run
+            'ping_interval': 3600,
+        }
+        self.server_options.update(server_options or {})
+        self.latencies = {}
+        self.messages = 0
+
+    def create_server(self):
+        from . import server
+
+        eio = server.Server(async_mode='threading', **self.server_options)
+        eio._async = dict(eio._async, websocket=_VirtualWebSocket)
+
+        @eio.on('message')
+        def message(sid, data):
+            eio.send(sid, data)
+
+        return eio
+
+    def run(self):
+        """Run the load test and return the results."""
+        memory_per_socket = self.measure_memory()
+        eio = self.create_server()
+        start = time.perf_counter()
+        if self.threads == 1:
+            self.messages = self.run_clients(eio, self.clients)
+        else:
+            messages = []
+            threads = [
+                threading.Thread(target=lambda n: messages.append(
+                    self.run_clients(eio, n)), args=(n,))
+                for n in self.split_clients()]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.messages = sum(messages)
+        elapsed = time.perf_counter() - start
+        eio.shutdown()
+        return self.results(elapsed, memory_per_socket)
+
+    def split_clients(self):
+        """Return the number of clients that each thread runs."""
+        clients, extra = divmod(self.clients, self.threads)
+        return [clients + (1 if i < extra else 0)
+                for i in range(self.threads)]
+
+    def run_clients(self, eio, clients):
+        """Run the given number of clients and return the number of
+        messages they exchanged with the server."""
+        messages = 0
+        sids = [self.connect(eio) for _ in range(clients)]
+        for _ in range(self.rounds):
+            for sid in sids:
+                self.request(eio, 'message', 'POST', sid, self.message)
+                self.request(eio, 'poll', 'GET', sid)
+                messages += 2
+        for sid in sids:
+            # send the ping that the server would send after the ping
+            # interval, and answer it
+            eio.sockets[sid]._send_ping()
+            self.request(eio, 'ping', 'GET', sid)
+            self.request(eio, 'pong', 'POST', sid, '3')
+        ws_messages = ['2probe', '5'] + [self.message] * self.rounds
+        for sid in sids:
+            if self.upgrade:
+                self.request(eio, 'websocket', 'GET', sid,
+                             transport='websocket', messages=ws_messages)
+                messages += 2 * self.rounds
+            else:
+                self.request(eio, 'disconnect', 'POST', sid, '1')
+        return messages
+
+    def measure_memory(self):
+        """Return the memory allocated by the server for each client."""
+        eio = self.create_server()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            sids = [self.connect(eio, record=False)
+                    for _ in range(self.clients)]
+            after = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        for sid in sids:
+            self.request(eio, None, 'POST', sid, '1')
+        eio.shutdown()
+        return (after - before) / self.clients
+
+    def connect(self, eio, record=True):
+        body = self.request(eio, 'connect' if record else None, 'GET')
+        return packet.Packet(encoded_packet=body.decode('utf-8')).data['sid']
+
+    def request(self, eio, phase, method, sid=None, body=None,
+                transport='polling', messages=None):
+        """Send a request to the server and return the response body."""
+        query_string = 'EIO=4&transport=' + transport
+        if sid:
+            query_string += '&sid=' + sid
+        environ = {'REQUEST_METHOD': method, 'QUERY_STRING': query_string}
+        if body is not None:
+            body = body.encode('utf-8')
+            environ['CONTENT_LENGTH'] = str(len(body))
+            environ['wsgi.input'] = io.BytesIO(body)
+        if messages is not None:
+            environ['HTTP_CONNECTION'] = 'Upgrade'
+            environ['HTTP_UPGRADE'] = 'websocket'
+            environ['engineio.bench.messages'] = messages
+        start = time.perf_counter()
+        response = eio.handle_request(environ, lambda status, headers: None)
+        self.record(phase, time.perf_counter() - start)
+        return b''.join(response or [])
+
+    def record(self, phase, latency):
+        if phase is not None:
+            # setdefault and append are atomic, so clients running in
+            # different threads can record their latencies concurrently
+            self.latencies.setdefault(phase, []).append(latency)
+
+    def results(self, elapsed, memory_per_socket):
+        requests = sum(len(values) for values in self.latencies.values())
+        return {
+            'clients': self.clients,
+            'rounds': self.rounds,
+            'threads': self.threads,
+            'gil_enabled': getattr(sys, '_is_gil_enabled', lambda: True)(),
+            'elapsed': elapsed,
+            'requests': requests,
+            'requests_per_second': requests / elapsed,
+            'messages': self.messages,
+            'messages_per_second': self.messages / elapsed,
+            'memory_per_socket': memory_per_socket,
+            'phases': {
+                phase: {
+                    'requests': len(values),
+                    'p50': percentile(values, 50),
+                    'p99': percentile(values, 99),
+                    'max': max(values),
+                } for phase, values in self.latencies.items()
+            },
+        }
+
+
+class AsyncLoadGenerator(LoadGenerator):
+    """Load generator for a :class:`engineio.AsyncServer`.
+
+    This class takes the same arguments as :class:`LoadGenerator`. The
+    server uses the ``asgi`` async mode.
+    """
+    def create_server(self):
+        from . import async_server
+
+        eio = async_server.AsyncServer(async_mode='asgi',
+                                       **self.server_options)
+
+        @eio.on('message')
+        async def message(sid, data):
+            await eio.send(sid, data)
+
+        return eio
+
+    async def run(self):
+        """Run the load test and return the results.
+
+        Note: this method is a coroutine.
+        """
+        memory_per_socket = await self.measure_memory()
+        eio = self.create_server()
+        start = time.perf_counter()
+        sids = [await self.connect(eio) for _ in range(self.clients)]
+        for _ in range(self.rounds):
+            for sid in sids:
+                await self.request(eio, 'message', 'POST', sid, self.message)
+                await self.request(eio, 'poll', 'GET', sid)
+                self.messages += 2
+        for sid in sids:
+            await eio.sockets[sid]._send_ping()
+            await self.request(eio, 'ping', 'GET', sid)
+            await self.request(eio, 'pong', 'POST', sid, '3')
+        messages = ['2probe', '5'] + [self.message] * self.rounds
+        for sid in sids:
+            if self.upgrade:
+                await self.request(eio, 'websocket', 'GET', sid,
+                                   transport='websocket', messages=messages)
+                self.messages += 2 * self.rounds
+            else:
+                await self.request(eio, 'disconnect', 'POST', sid, '1')
+        elapsed = time.perf_counter() - start
+        await eio.shutdown()
+        return self.results(elapsed, memory_per_socket)
+
+    async def measure_memory(self):
+        """Return the memory allocated by the server for each client.
+
+        Note: this method is a coroutine.
+        """
+        eio = self.create_server()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            sids = [await self.connect(eio, record=False)
+                    for _ in range(self.clients)]
+            after = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        for sid in sids:
+            await self.request(eio, None, 'POST', sid, '1')
+        await eio.shutdown()
+        return (after - before) / self.clients
+
+    async def connect(self, eio, record=True):
+        body = await self.request(eio, 'connect' if record else None, 'GET')
+        return packet.Packet(encoded_packet=body.decode('utf-8')).data['sid']
+
+    async def request(self, eio, phase, method, sid=None, body=None,
+                      transport='polling', messages=None):
+        """Send a request to the server and return the response body.
+
+        Note: this method is a coroutine.
+        """
+        query_string = 'EIO=4&transport=' + transport
+        if sid:
+            query_string += '&sid=' + sid
+        scope = {'type': 'http', 'method': method, 'path': '/engine.io/',
+                 'query_string': query_string.encode('utf-8'), 'headers': []}
+        if messages is not None:
+            scope['type'] = 'websocket'
+            scope['headers'] = [(b'connection', b'Upgrade'),
+                                (b'upgrade', b'websocket')]
+            events = [{'type': 'websocket.connect'}] + [
+                {'type': 'websocket.receive', 'text': message}
+                for message in messages] + [{'type': 'websocket.disconnect'}]
+        else:
+            body = body.encode('utf-8') if body is not None else b''
+            scope['headers'] = [(b'content-length',
+                                 str(len(body)).encode('utf-8'))]
+            events = [{'type': 'http.request', 'body': body}]
+        events = iter(events)
+        response = []
+
+        async def receive():
+            return next(events, {'type': 'http.disconnect'})
+
+        async def send(message):
+            if message['type'] == 'http.response.body':
+                response.append(message['body'])
+
+        start = time.perf_counter()
+        await eio.handle_request(scope, receive, send)
+        self.record(phase, time.perf_counter() - start)
+        return b''.join(response)
+
+
+def run(clients=1000, rounds=10, message_size=32, upgrade=True,
+        use_asyncio=False, server_options=None, threads=1):
+    """Run a load test and return the results.
+
+    :param clients: The number of virtual clients.
+    :param rounds: The number of messages each client sends and receives on
+                   each transport.
+    :param message_size: The size of the messages, in characters.
+    :param upgrade: If ``True``, the clients upgrade to WebSocket before
+                    disconnecting.
+    :param use_asyncio: If ``True``, test an :class:`engineio.AsyncServer`.
+                        The default is to test an :class:`engineio.Server`.
+    :param server_options: A dictionary with additional arguments to pass to
+                           the server.
+    :param threads: The number of threads that run the clients. Only the
+                    threading server can use more than one thread.
+
+    The results are returned as a dictionary. Latencies are given in seconds
+    and memory in bytes.
+    """
+    kwargs = {'clients': clients, 'rounds': rounds,
+              'message_size': message_size, 'upgrade': upgrade,
+              'server_options': server_options}
+    if use_asyncio:
+        if threads != 1:
+            raise ValueError('The asyncio server runs in a single thread')
+        return asyncio.run(AsyncLoadGenerator(**kwargs).run())
+    return LoadGenerator(threads=threads, **kwargs).run()
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m engineio.bench',
+        description='In-process load generator for Engine.IO servers.')
+    parser.add_argument('--clients', type=int, default=1000,
+                        help='number of virtual clients (default: 1000)')
+    parser.add_argument('--rounds', type=int, default=10,
+                        help='messages sent by each client on each transport '
+                             '(default: 10)')
+    parser.add_argument('--message-size', type=int, default=32,
+                        help='message size in characters (default: 32)')
+    parser.add_argument('--no-upgrade', action='store_true',
+                        help='do not upgrade the clients to WebSocket')
+    parser.add_argument('--asyncio', action='store_true',
+                        help='test the asyncio server')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1],
+                        help='number of threads that run the clients, with '
+                             'multiple values running a scaling test '
+                             '(default: 1)')
+    parser.add_argument('--json', action='store_true',
+                        help='print the results in JSON format')
+    args = parser.parse_args(args)
+    all_results = [
+        run(clients=args.clients, rounds=args.rounds,
+            message_size=args.message_size, upgrade=not args.no_upgrade,
+            use_asyncio=args.asyncio, threads=threads)
+        for threads in args.threads]
+    if args.json:
+        print(json.dumps(all_results[0] if len(all_results) == 1
+                         else all_results, indent=2))
+        return
+    if len(all_results) > 1:
+        print_scaling(all_results)
+        return
+    results = all_results[0]
+    print(f'{results["clients"]} clients, {results["requests"]} requests, '
+          f'{results["messages"]} messages in {results["elapsed"]:.2f}s')
+    print(f'{results["requests_per_second"]:.0f} requests/s, '
+          f'{results["messages_per_second"]:.0f} messages/s, '
+          f'{results["memory_per_socket"]:.0f} bytes per client')
+    print(f'{"phase":<12}{"requests":>10}{"p50 (ms)":>12}{"p99 (ms)":>12}'
+          f'{"max (ms)":>12}')
+    for phase, stats in results['phases'].items():
+        print(f'{phase:<12}{stats["requests"]:>10}{stats["p50"] * 1000:>12.3f}'
+              f'{stats["p99"] * 1000:>12.3f}{stats["max"] * 1000:>12.3f}')
+
+
+def print_scaling(all_results):
+    """Print the throughput of load tests run with different numbers of
+    threads."""
+    gil = 'enabled' if all_results[0]['gil_enabled'] else 'disabled'
+    print(f'{all_results[0]["clients"]} clients, GIL {gil}')
+    print(f'{"threads":<10}{"messages/s":>14}{"speedup":>10}')
+    base = all_results[0]['messages_per_second']
+    for results in all_results:
+        rate = results['messages_per_second']
+        print(f'{results["threads"]:<10}{rate:>14.0f}{rate / base:>10.2f}')
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
@@ -0,0 +1,208 @@
+"""HTTP compression for long-polling responses.
+
+Each supported content encoding is implemented by a compressor class that
+has a ``compress`` method, and a ``compress_stream`` method that compresses a
+response given as a sequence of chunks. The streaming compressors flush their
+output after each chunk, so that compressed data is sent to the client as
+soon as it is available. The :class:`HTTPCompression` class selects the
+compressor that matches the ``Accept-Encoding`` header sent by a client, and
+caches its decision for the most recently seen headers, so that they are not
+parsed again for every response.
+"""
+import collections
+import threading
+import zlib
+
+
+class GzipCompressor:
+    """Compressor for the ``gzip`` content encoding.
+
+    :param level: The compression level, from 0 to 9. The default is 9.
+    :param strategy: The zlib compression strategy. The default is
+                     ``zlib.Z_DEFAULT_STRATEGY``.
+    """
+    encoding = 'gzip'
+    wbits = 16 + zlib.MAX_WBITS
+
+    def __init__(self, level=9, strategy=zlib.Z_DEFAULT_STRATEGY):
+        self.level = level
+        self.strategy = strategy
+
+    def compress(self, data):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, self.wbits,
+                                      zlib.DEF_MEM_LEVEL, self.strategy)
+        return compressor.compress(data) + compressor.flush()
+
+    def compress_stream(self, chunks):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, self.wbits,
+                                      zlib.DEF_MEM_LEVEL, self.strategy)
+        for chunk in chunks:
+            yield compressor.compress(chunk) + \
+                compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+
+class DeflateCompressor(GzipCompressor):
+    """Compressor for the ``deflate`` content encoding.
+
+    :param level: The compression level, from 0 to 9. The default is
+                  ``zlib.Z_DEFAULT_COMPRESSION``.
+    :param strategy: The zlib compression strategy. The default is
+                     ``zlib.Z_DEFAULT_STRATEGY``.
+    """
+    encoding = 'deflate'
+    wbits = zlib.MAX_WBITS
+
+    def __init__(self, level=zlib.Z_DEFAULT_COMPRESSION,
+                 strategy=zlib.Z_DEFAULT_STRATEGY):
+        super().__init__(level=level, strategy=strategy)
+
+
+class BrotliCompressor:
+    """Compressor for the ``br`` content encoding.
+
+    This compressor requires the ``brotli`` package.
+
+    :param quality: The compression quality, from 0 to 11. The default is 4,
+                    which is a good compromise for dynamic content.
+    """
+    encoding = 'br'
+
+    def __init__(self, quality=4):
+        import brotli
+        self._brotli = brotli
+        self.quality = quality
+
+    def compress(self, data):
+        return self._brotli.compress(data, quality=self.quality)
+
+    def compress_stream(self, chunks):
+        compressor = self._brotli.Compressor(quality=self.quality)
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+
+
+class ZstdCompressor:
+    """Compressor for the ``zstd`` content encoding.
+
+    This compressor requires the ``zstandard`` package.
+
+    :param level: The compression level. The default is 3.
+    """
+    encoding = 'zstd'
+
+    def __init__(self, level=3):
+        import zstandard
+        self._zstandard = zstandard
+        self.level = level
+
+    def compress(self, data):
+        # zstandard compressors cannot be used by several threads at once, so
+        # a new one is used for each response
+        return self._zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def compress_stream(self, chunks):
+        compressor = self._zstandard.ZstdCompressor(
+            level=self.level).compressobj()
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(
+                self._zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        yield compressor.flush()
+
+
+compressors = {
+    'gzip': GzipCompressor,
+    'deflate': DeflateCompressor,
+    'br': BrotliCompressor,
+    'zstd': ZstdCompressor,
+}
+
+
+class HTTPCompression:
+    """Compress HTTP responses with the encodings accepted by clients.
+
+    :param methods: The content encodings to use. This can be a list of
+                    encoding names, or a dictionary where the keys are the
+                    encoding names and the values are dictionaries with the
+                    options for the compressor, such as the compression
+                    level. Valid encodings are ``'gzip'``, ``'deflate'``,
+                    ``'br'`` and ``'zstd'``.
+    """
+    #: The maximum number of ``Accept-Encoding`` headers that are cached.
+    accept_encoding_cache_size = 64
+
+    def __init__(self, methods):
+        if not isinstance(methods, dict):
+            methods = {method: {} for method in methods}
+        self.compressors = {}
+        for method, options in methods.items():
+            if method not in compressors:
+                raise ValueError('Invalid compression method ' + method)
+            try:
+                self.compressors[method] = compressors[method](**options)
+            except ImportError:
+                raise ValueError(f'Compression method {method} is not '
+                                 'available, a required package is not '
+                                 'installed')
+        self.accept_encoding_cache = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def select(self, accept_encoding):
+        """Return the compressor to use for an ``Accept-Encoding`` header.
+
+        The first encoding in the header that is supported is used. If none
+        of the encodings are supported, ``None`` is returned.
+        """
+        with self.lock:
+            if accept_encoding in self.accept_encoding_cache:
+                self.accept_encoding_cache.move_to_end(accept_encoding)
+                return self.accept_encoding_cache[accept_encoding]
+        compressor = None
+        for encoding in accept_encoding.split(','):
+            encoding = encoding.split(';')[0].strip()
+            if encoding in self.compressors:
+                compressor = self.compressors[encoding]
+                break
+        with self.lock:
+            self.accept_encoding_cache[accept_encoding] = compressor
+            if len(self.accept_encoding_cache) > \
+                    self.accept_encoding_cache_size:
+                self.accept_encoding_cache.popitem(last=False)
+        return compressor
+
+    def compress(self, accept_encoding, response):
+        """Compress a response.
+
+        :param accept_encoding: The ``Accept-Encoding`` header sent by the
+                                client.
+        :param response: The response body, as bytes.
+
+        The return value is a tuple with the content encoding that was used
+        and the compressed response. If the client does not accept any of the
+        configured encodings, the encoding is ``None`` and the response is
+        returned unchanged.
+        """
+        compressor = self.select(accept_encoding)
+        if compressor is None:
+            return None, response
+        return compressor.encoding, compressor.compress(response)
+
+    def compress_stream(self, accept_encoding, chunks):
+        """Compress a response that is given as a sequence of chunks.
+
+        :param accept_encoding: The ``Accept-Encoding`` header sent by the
+                                client.
+        :param chunks: An iterable with the chunks of the response body, as
+                       bytes.
+
+        The return value is a tuple with the content encoding that was used
+        and an iterable with the compressed chunks. The chunks are compressed
+        as they are consumed. If the client does not accept any of the
+        configured encodings, the encoding is ``None`` and the chunks are
+        returned unchanged.
+        """
+        compressor = self.select(accept_encoding)
+        if compressor is None:
+            return None, chunks
+        return compressor.encoding, compressor.compress_stream(chunks)
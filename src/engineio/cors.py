@@ -0,0 +1,88 @@
+import collections
+import threading
+
+
+class OriginPolicy:
+    """The origins that are allowed to connect to a server.
+
+    The ``cors_allowed_origins`` argument of the server is compiled into a
+    policy once, so that the origin of each request is validated with a set
+    lookup, without building lists of allowed origins or formatting URLs.
+
+    :param allowed_origins: The ``cors_allowed_origins`` argument of the
+                            server.
+    :param cache_size: The number of origins for which the result of a
+                       callable ``allowed_origins`` is cached. The default of
+                       0 disables the cache.
+    """
+    def __init__(self, allowed_origins, cache_size=0):
+        self.disabled = allowed_origins == []
+        self.same_origin = allowed_origins is None
+        self.allow_all = False
+        self.origins = frozenset()
+        self.callback = None
+        if isinstance(allowed_origins, str):
+            if allowed_origins == '*':
+                self.allow_all = True
+            else:
+                self.origins = frozenset([allowed_origins])
+        elif callable(allowed_origins):
+            self.callback = allowed_origins
+        elif allowed_origins is not None:
+            if '*' in allowed_origins:
+                self.allow_all = True
+            else:
+                self.origins = frozenset(allowed_origins)
+        self.cache_size = cache_size
+        self.cache = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def is_allowed(self, origin, environ):
+        """Check if an origin is allowed to connect to the server.
+
+        :param origin: The value of the ``Origin`` header of the request.
+        :param environ: The WSGI environment of the request.
+        """
+        if self.allow_all:
+            return True
+        if self.same_origin:
+            return self._is_same_origin(origin, environ)
+        if self.callback is not None:
+            return self._call(origin, environ)
+        return origin in self.origins
+
+    def _is_same_origin(self, origin, environ):
+        if 'wsgi.url_scheme' not in environ or 'HTTP_HOST' not in environ:
+            return False
+        scheme, sep, host = origin.partition('://')
+        if not sep:
+            return False
+        if scheme == environ['wsgi.url_scheme'] and \
+                host == environ['HTTP_HOST']:
+            return True
+        if 'HTTP_X_FORWARDED_PROTO' in environ or \
+                'HTTP_X_FORWARDED_HOST' in environ:
+            return scheme == environ.get(
+                'HTTP_X_FORWARDED_PROTO',
+                environ['wsgi.url_scheme']).split(',')[0].strip() and \
+                host == environ.get(
+                    'HTTP_X_FORWARDED_HOST',
+                    environ['HTTP_HOST']).split(',')[0].strip()
+        return False
+
+    def _call(self, origin, environ):
+        if self.cache_size:
+            with self.lock:
+                if origin in self.cache:
+                    self.cache.move_to_end(origin)
+                    return self.cache[origin]
+        try:
+            is_allowed = bool(self.callback(origin, environ))
+        except TypeError:
+            is_allowed = bool(self.callback(origin))
+        if self.cache_size:
+            with self.lock:
+                self.cache[origin] = is_allowed
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return is_allowed
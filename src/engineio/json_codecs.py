@@ -0,0 +1,86 @@
+"""Fast JSON codecs for Engine.IO packets.
+
+A codec is any object with ``dumps`` and ``loads`` functions that are
+compatible with the standard library versions. Codecs can optionally provide
+a ``dumpb`` function that returns the encoded JSON as a UTF-8 byte sequence,
+which is used to generate HTTP responses without an intermediate string.
+
+The built-in codecs use the standard library for the keyword arguments that
+they do not implement, and for the input that they cannot decode, so that
+the results and errors are the same as with the standard library. Integers
+that do not fit in 64 bits are the exception. orjson decodes them as floats,
+and msgspec decodes them as integers up to its own size limit, instead of
+rejecting integers with more than 100 digits like the standard library
+codec of this package.
+"""
+from engineio import json as _json
+
+# the separators that produce the compact output of the codecs
+_compact = {'separators': (',', ':')}
+
+
+class OrjsonCodec:
+    """JSON codec that uses the ``orjson`` package."""
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+        self._options = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj, **kwargs):
+        if kwargs and kwargs != _compact:
+            return _json.dumps(obj, **kwargs)
+        return self._orjson.dumps(obj, option=self._options).decode('utf-8')
+
+    def dumpb(self, obj):
+        return self._orjson.dumps(obj, option=self._options)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return _json.loads(s, **kwargs)
+        try:
+            return self._orjson.loads(s)
+        except self._orjson.JSONDecodeError:
+            return _json.loads(s)
+
+
+class MsgspecCodec:
+    """JSON codec that uses the ``msgspec`` package."""
+    def __init__(self):
+        import msgspec
+        self._decode_error = msgspec.DecodeError
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+
+    def dumps(self, obj, **kwargs):
+        if kwargs and kwargs != _compact:
+            return _json.dumps(obj, **kwargs)
+        return self._encoder.encode(obj).decode('utf-8')
+
+    def dumpb(self, obj):
+        return self._encoder.encode(obj)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return _json.loads(s, **kwargs)
+        try:
+            return self._decoder.decode(s)
+        except self._decode_error:
+            return _json.loads(s)
+
+
+codecs = {
+    'orjson': OrjsonCodec,
+    'msgspec': MsgspecCodec,
+}
+
+
+def get_codec(json):
+    """Return the JSON codec to use for a ``json`` option.
+
+    :param json: The name of a built-in codec (``'orjson'`` or ``'msgspec'``),
+                 or a custom JSON module or codec object, which is returned
+                 unchanged.
+    """
+    if isinstance(json, str) and json in codecs:
+        return codecs[json]()
+    return json
@@ -0,0 +1,355 @@
+"""Instrumentation for Engine.IO servers.
+
+A :class:`Metrics` instance collects counters, gauges and latency histograms
+for a server. The instrumentation points in the server call the ``inc()`` and
+``observe()`` methods, which only update in-memory values, so the cost is
+small enough to leave metrics enabled in production. The collected values
+can be rendered in the Prometheus text exposition format, or pushed to any
+number of exporters, such as :class:`StatsDExporter` or plain callbacks.
+"""
+import bisect
+import collections
+import functools
+import itertools
+import math
+import socket
+import threading
+import time
+
+#: Default histogram buckets, in seconds.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """A histogram with fixed buckets.
+
+    :param buckets: The upper bounds of the buckets, in increasing order. An
+                    implicit bucket for larger values is always added.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """Add a value to the histogram."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self):
+        """Return a list of ``(upper_bound, count)`` tuples with the number
+        of values that are less than or equal to each bucket bound."""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def merge(self, other):
+        """Add the values of another histogram with the same buckets."""
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.sum += other.sum
+        self.count += other.count
+
+
+class _Shard:
+    """The counters and histograms updated by a subset of the threads."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = collections.defaultdict(int)
+        self.histograms = {}
+
+
+class Metrics:
+    """Counters, gauges and latency histograms for an Engine.IO server.
+
+    :param prefix: The prefix added to the metric names when they are
+                   exported. The default is ``'engineio'``.
+    :param buckets: The upper bounds of the histogram buckets, in seconds.
+    :param exporters: A list of exporters. An exporter is a callable that
+                      receives the metrics object as argument, and is invoked
+                      each time the ``export()`` method is called.
+
+    The values are stored in shards, and each thread updates the shard that
+    it is assigned on its first update, so that threads that run in parallel
+    do not wait for each other. The shards are merged when the metrics are
+    collected.
+    """
+    #: The number of shards in which the values are stored.
+    shard_count = 16
+    #: Descriptions of the counters.
+    counter_descriptions = {
+        'connections': 'Accepted client connections.',
+        'upgrades': 'Connections upgraded to WebSocket.',
+        'disconnects': 'Client disconnections.',
+        'packets_received': 'Packets received from clients.',
+        'packets_sent': 'Packets sent to clients.',
+        'bytes_received': 'Bytes received from clients.',
+        'bytes_sent': 'Bytes sent to clients.',
+    }
+    #: Descriptions of the histograms.
+    histogram_descriptions = {
+        'request_duration_seconds': 'Duration of HTTP requests.',
+        'poll_wait_seconds': 'Time long-polling requests wait for packets.',
+        'handler_duration_seconds': 'Duration of event handlers.',
+    }
+    #: Names of the labels used by the counters and histograms.
+    label_names = {
+        'connections': 'transport',
+        'disconnects': 'reason',
+        'packets_received': 'transport',
+        'packets_sent': 'transport',
+        'bytes_received': 'transport',
+        'bytes_sent': 'transport',
+        'request_duration_seconds': 'method',
+        'handler_duration_seconds': 'event',
+    }
+
+    def __init__(self, prefix='engineio', buckets=DEFAULT_BUCKETS,
+                 exporters=None):
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self.exporters = list(exporters or [])
+        self.gauges = {}
+        self.shards = [_Shard() for _ in range(self.shard_count)]
+        self.next_shard = itertools.count()
+        self.local = threading.local()
+
+    @property
+    def counters(self):
+        """The current values of the counters, indexed by ``(name, label)``
+        tuples."""
+        return self._merge()[0]
+
+    @property
+    def histograms(self):
+        """The current histograms, indexed by ``(name, label)`` tuples."""
+        return self._merge()[1]
+
+    def inc(self, name, label=None, value=1):
+        """Increment a counter.
+
+        :param name: The name of the counter.
+        :param label: The value of the counter's label, if it has one.
+        :param value: The amount to add to the counter.
+        """
+        shard = self._shard()
+        with shard.lock:
+            shard.counters[name, label] += value
+
+    def observe(self, name, value, label=None):
+        """Add a value to a histogram.
+
+        :param name: The name of the histogram.
+        :param value: The value to add, in seconds.
+        :param label: The value of the histogram's label, if it has one.
+        """
+        shard = self._shard()
+        with shard.lock:
+            try:
+                histogram = shard.histograms[name, label]
+            except KeyError:
+                histogram = shard.histograms[name, label] = Histogram(
+                    self.buckets)
+            histogram.observe(value)
+
+    def gauge(self, name, func, description=None):
+        """Register a gauge.
+
+        :param name: The name of the gauge.
+        :param func: A function that returns the current value of the gauge.
+                     It is invoked only when the metrics are exported.
+        :param description: A description of the gauge.
+        """
+        self.gauges[name] = (func, description or name)
+
+    def timed(self, func, name, label=None):
+        """Return a wrapper for ``func`` that adds the duration of each call
+        to a histogram."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.observe(name, time.perf_counter() - start, label)
+
+        return wrapper
+
+    def timed_async(self, func, name, label=None):
+        """Return a wrapper for the coroutine function ``func`` that adds the
+        duration of each call to a histogram."""
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.observe(name, time.perf_counter() - start, label)
+
+        return wrapper
+
+    def collect(self):
+        """Return the current values of all the metrics.
+
+        The return value is a dictionary with ``counters``, ``gauges`` and
+        ``histograms`` keys. Counters and histograms are dictionaries indexed
+        by ``(name, label)`` tuples, and gauges are indexed by name.
+        """
+        gauges = {}
+        for name, (func, _) in self.gauges.items():
+            gauges[name] = func()
+        counters, histograms = self._merge()
+        return {'counters': dict(counters), 'gauges': gauges,
+                'histograms': histograms}
+
+    def export(self):
+        """Send the current values of the metrics to all the exporters.
+
+        Applications that use push-based exporters should call this method
+        periodically, for example from a background task.
+        """
+        for exporter in self.exporters:
+            exporter(self)
+
+    def prometheus(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        values = self.collect()
+        lines = []
+        for name, description in self.counter_descriptions.items():
+            full_name = f'{self.prefix}_{name}_total'
+            lines.append(f'# HELP {full_name} {description}')
+            lines.append(f'# TYPE {full_name} counter')
+            for (counter, label), value in sorted(
+                    values['counters'].items(), key=_sort_key):
+                if counter == name:
+                    lines.append(full_name + self._labels(name, label)
+                                 + f' {value}')
+        for name, value in values['gauges'].items():
+            full_name = f'{self.prefix}_{name}'
+            lines.append(f'# HELP {full_name} {self.gauges[name][1]}')
+            lines.append(f'# TYPE {full_name} gauge')
+            lines.append(f'{full_name} {value}')
+        for name, description in self.histogram_descriptions.items():
+            full_name = f'{self.prefix}_{name}'
+            lines.append(f'# HELP {full_name} {description}')
+            lines.append(f'# TYPE {full_name} histogram')
+            for (histogram_name, label), histogram in sorted(
+                    values['histograms'].items(), key=_sort_key):
+                if histogram_name != name:
+                    continue
+                for bound, count in histogram.cumulative_counts():
+                    le = '+Inf' if bound == math.inf else repr(bound)
+                    lines.append(f'{full_name}_bucket'
+                                 + self._labels(name, label, le=le)
+                                 + f' {count}')
+                labels = self._labels(name, label)
+                lines.append(f'{full_name}_sum{labels} {histogram.sum}')
+                lines.append(f'{full_name}_count{labels} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def _shard(self):
+        try:
+            return self.local.shard
+        except AttributeError:
+            # threads are assigned to the shards in turn
+            shard = self.local.shard = self.shards[
+                next(self.next_shard) % self.shard_count]
+            return shard
+
+    def _merge(self):
+        counters = collections.defaultdict(int)
+        histograms = {}
+        for shard in self.shards:
+            with shard.lock:
+                for key, value in shard.counters.items():
+                    counters[key] += value
+                for key, shard_histogram in shard.histograms.items():
+                    try:
+                        histogram = histograms[key]
+                    except KeyError:
+                        histogram = histograms[key] = Histogram(self.buckets)
+                    histogram.merge(shard_histogram)
+        return counters, histograms
+
+    def _labels(self, name, label, **extra):
+        labels = []
+        if label is not None:
+            labels.append((self.label_names.get(name, 'label'), label))
+        labels += extra.items()
+        if not labels:
+            return ''
+        return '{' + ','.join(f'{key}="{_escape(value)}"'
+                              for key, value in labels) + '}'
+
+
+class StatsDExporter:
+    """Exporter that sends the metrics to a StatsD server.
+
+    :param host: The host of the StatsD server.
+    :param port: The UDP port of the StatsD server.
+    :param prefix: The prefix added to the metric names.
+
+    Counters are sent as increments since the previous export. Gauges, and
+    the count and sum of the histograms, are sent as gauges.
+    """
+    max_packet_size = 1432
+
+    def __init__(self, host='localhost', port=8125, prefix='engineio'):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.last_values = {}
+
+    def __call__(self, metrics):
+        values = metrics.collect()
+        lines = []
+        for (name, label), value in values['counters'].items():
+            key = self._key(name, label)
+            delta = value - self.last_values.get(key, 0)
+            self.last_values[key] = value
+            if delta:
+                lines.append(f'{key}:{delta}|c')
+        for name, value in values['gauges'].items():
+            lines.append(f'{self._key(name)}:{value}|g')
+        for (name, label), histogram in values['histograms'].items():
+            key = self._key(name, label)
+            lines.append(f'{key}.count:{histogram.count}|g')
+            lines.append(f'{key}.sum:{histogram.sum}|g')
+        for packet in self._packets(lines):
+            try:
+                self.sock.sendto(packet.encode('utf-8'), self.address)
+            except OSError:  # pragma: no cover
+                # metrics are best effort, so network errors are ignored
+                pass
+
+    def _key(self, name, label=None):
+        key = f'{self.prefix}.{name}'
+        if label is not None:
+            key += '.' + str(label).replace(' ', '_')
+        return key
+
+    def _packets(self, lines):
+        packet = ''
+        for line in lines:
+            if packet and len(packet) + len(line) + 1 > self.max_packet_size:
+                yield packet
+                packet = ''
+            packet = packet + '\n' + line if packet else line
+        if packet:
+            yield packet
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace(
+        '\n', '\\n')
+
+
+def _sort_key(item):
+    name, label = item[0]
+    return name, str(label) if label is not None else ''
@@ -1,10 +1,11 @@
 import base64
 from engineio import json as _json
+from engineio import tracing
 
 (OPEN, CLOSE, PING, PONG, MESSAGE, UPGRADE, NOOP) = (0, 1, 2, 3, 4, 5, 6)
 packet_names = ['OPEN', 'CLOSE', 'PING', 'PONG', 'MESSAGE', 'UPGRADE', 'NOOP']
 
-binary_types = (bytes, bytearray)
+binary_types = (bytes, bytearray, memoryview)
 
 
 class Packet:
@@ -14,8 +15,19 @@ class Packet:
 
     def __init__(self, packet_type=NOOP, data=None, encoded_packet=None):
         self.packet_type = packet_type
+        if isinstance(data, memoryview):
+            if not data.c_contiguous:
+                # views that are not contiguous cannot be written to the
+                # network or base64 encoded, so they are copied
+                data = bytes(data)
+            elif data.format != 'B':
+                # work with a flat byte view of the buffer, without copying
+                # it
+                data = data.cast('B')
         self.data = data
         self.encode_cache = None
+        self.b64_encode_cache = None
+        self.bytes_encode_cache = None
         if isinstance(data, str):
             self.binary = False
         elif isinstance(data, binary_types):
@@ -32,15 +44,25 @@ class Packet:
 
         Note: as a performance optimization, subsequent calls to this method
         will return a cached encoded packet, even if the data has changed.
+        Binary packets keep separate caches for the raw and base64 encodings,
+        so that a single packet can be delivered to clients on different
+        transports.
         """
+        if tracing.hooks:
+            with tracing.span('packet.encode', packet_type=self.packet_type):
+                return self._encode(b64)
+        return self._encode(b64)
+
+    def _encode(self, b64):
+        if self.binary and b64:
+            if self.b64_encode_cache is None:
+                self.b64_encode_cache = 'b' + base64.b64encode(
+                    self.data).decode('utf-8')
+            return self.b64_encode_cache
         if self.encode_cache:
             return self.encode_cache
         if self.binary:
-            if b64:
-                encoded_packet = 'b' + base64.b64encode(self.data).decode(
-                    'utf-8')
-            else:
-                encoded_packet = self.data
+            encoded_packet = self.data
         else:
             encoded_packet = str(self.packet_type)
             if isinstance(self.data, str):
@@ -53,8 +75,42 @@ class Packet:
         self.encode_cache = encoded_packet
         return encoded_packet
 
+    def encode_bytes(self):
+        """Encode the packet for the polling transport, as UTF-8 bytes.
+
+        Binary data is encoded as base64. When the JSON module has a
+        ``dumpb`` function, it is used to encode list and dict data directly
+        to bytes. The encoded packet is cached, as in :func:`encode`.
+        """
+        if tracing.hooks:
+            with tracing.span('packet.encode_bytes',
+                              packet_type=self.packet_type):
+                return self._encode_bytes()
+        return self._encode_bytes()
+
+    def _encode_bytes(self):
+        if self.bytes_encode_cache is None:
+            if self.binary:
+                self.bytes_encode_cache = b'b' + base64.b64encode(self.data)
+            elif self.encode_cache is None and \
+                    isinstance(self.data, (dict, list)) and \
+                    hasattr(self.json, 'dumpb'):
+                self.bytes_encode_cache = str(self.packet_type).encode(
+                    'utf-8') + self.json.dumpb(self.data)
+            else:
+                self.bytes_encode_cache = self.encode().encode('utf-8')
+        return self.bytes_encode_cache
+
     def decode(self, encoded_packet):
         """Decode a transmitted package."""
+        if tracing.hooks:
+            with tracing.span('packet.decode') as trace:
+                self._decode(encoded_packet)
+                trace.attributes['packet_type'] = self.packet_type
+            return
+        self._decode(encoded_packet)
+
+    def _decode(self, encoded_packet):
         self.binary = isinstance(encoded_packet, binary_types)
         if not self.binary and len(encoded_packet) == 0:
             raise ValueError('Invalid empty packet received')
@@ -64,9 +120,11 @@ class Packet:
             self.packet_type = MESSAGE
             self.data = base64.b64decode(encoded_packet[1:])
         else:
-            if self.binary and not isinstance(encoded_packet, bytes):
-                encoded_packet = bytes(encoded_packet)
             if self.binary:
+                # received binary data is always delivered to the application
+                # as an immutable bytes object
+                if not isinstance(encoded_packet, bytes):
+                    encoded_packet = bytes(encoded_packet)
                 self.packet_type = MESSAGE
                 self.data = encoded_packet
             else:
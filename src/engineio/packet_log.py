@@ -0,0 +1,110 @@
+"""Logging of the packets exchanged with clients.
+
+Packets are logged at the ``INFO`` level. The logger level is checked before
+any formatting work is done, so packet logging has a very small cost when it
+is disabled. The :class:`PacketLog` class can also log a sample of the
+packets, truncate large packet data, and keep the most recent packets of each
+client in memory, to log them only when a connection ends abnormally.
+"""
+import collections
+import logging
+import random
+import time
+
+from . import packet
+
+
+class PacketLog:
+    """Packet logger for an Engine.IO server.
+
+    :param logger: The logger to use.
+    :param sample_rate: The fraction of packets that are logged, from 0 to 1.
+                        The default is 1, which logs all packets.
+    :param max_data_length: If set, packet data that is longer than this
+                            number of characters is truncated in the logs. The
+                            default is ``None``, which logs the complete data.
+    :param flight_recorder: The number of recent packets to keep in memory for
+                            each client. When a connection ends for one of the
+                            reasons in ``dump_reasons``, these packets are
+                            logged at the ``WARNING`` level, regardless of the
+                            logging level and the sample rate. The default is
+                            0, which disables the flight recorder.
+    :param dump_reasons: The disconnection reasons that cause the flight
+                         recorder to log its packets.
+    """
+    def __init__(self, logger, sample_rate=1.0, max_data_length=None,
+                 flight_recorder=0, dump_reasons=None):
+        self.logger = logger
+        self.sample_rate = sample_rate
+        self.max_data_length = max_data_length
+        self.flight_recorder = flight_recorder
+        self.dump_reasons = set(dump_reasons or [])
+        self.recordings = {}
+
+    def opened(self, sid):
+        """Start the flight recorder of a new client.
+
+        Packets are only recorded for clients that were opened and not yet
+        closed or discarded, so that packets logged after a client closed do
+        not leave recordings behind.
+        """
+        if self.flight_recorder:
+            self.recordings[sid] = collections.deque(
+                maxlen=self.flight_recorder)
+
+    def discard(self, sid):
+        """Discard the flight recorder of a client without logging it."""
+        self.recordings.pop(sid, None)
+
+    def sent(self, sid, pkt):
+        """Log a packet sent to a client."""
+        self._log(sid, 'Sending', pkt)
+
+    def received(self, sid, pkt):
+        """Log a packet received from a client."""
+        self._log(sid, 'Received', pkt)
+
+    def closed(self, sid, reason):
+        """Log the packets in the flight recorder of a client that closed its
+        connection, if the reason is one of the dump reasons, and discard
+        them."""
+        recording = self.recordings.pop(sid, None)
+        if not recording or reason not in self.dump_reasons:
+            return
+        self.logger.warning('%s: Connection closed (%s), last %d packets:',
+                            sid, reason, len(recording))
+        for timestamp, direction, pkt in recording:
+            self.logger.warning(
+                '%s: [%s] %s packet %s data %s', sid,
+                time.strftime('%H:%M:%S', time.localtime(timestamp))
+                + f'.{int(timestamp % 1 * 1000):03d}',
+                direction, self.packet_name(pkt), self.format_data(pkt))
+
+    def packet_name(self, pkt):
+        """Return the name of the type of a packet."""
+        if 0 <= pkt.packet_type < len(packet.packet_names):
+            return packet.packet_names[pkt.packet_type]
+        return 'UNKNOWN'
+
+    def format_data(self, pkt):
+        """Return the data of a packet, formatted for logging."""
+        if pkt.binary:
+            return f'<binary {len(pkt.data)} bytes>'
+        data = pkt.data if isinstance(pkt.data, str) else str(pkt.data)
+        if self.max_data_length is not None and \
+                len(data) > self.max_data_length:
+            return data[:self.max_data_length] + \
+                f'...<{len(data)} characters>'
+        return data
+
+    def _log(self, sid, direction, pkt):
+        if self.flight_recorder:
+            recording = self.recordings.get(sid)
+            if recording is not None:
+                recording.append((time.time(), direction, pkt))
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+        self.logger.info('%s: %s packet %s data %s', sid, direction,
+                         self.packet_name(pkt), self.format_data(pkt))
@@ -0,0 +1,206 @@
+import asyncio
+import collections
+import time
+
+from . import exceptions
+
+
+class PacketQueue:
+    """Outgoing packet queue for a socket.
+
+    This is a lightweight replacement for ``queue.Queue``, optimized for the
+    single consumer access pattern of a socket. Packets are stored in a
+    ``collections.deque`` and consumers wait on a single event object, which
+    is created with the given event class so that the queue works with all
+    the async modes. The event is only created when a consumer has to wait
+    for the first time, since events are large compared to the rest of the
+    state of a connection. The :func:`drain` method returns all the queued
+    packets in a single call.
+
+    :param event_class: The event class to use. Must be compatible with
+                        ``threading.Event``.
+    """
+    def __init__(self, event_class):
+        self.packets = collections.deque()
+        self.ready = None
+        self.event_class = event_class
+        self.empty = None
+
+    def qsize(self):
+        return len(self.packets)
+
+    def put(self, pkt):
+        """Add a packet to the queue."""
+        self.packets.append(pkt)
+        if self.ready is not None:
+            self.ready.set()
+
+    def put_nowait(self, pkt):
+        self.put(pkt)
+
+    def drain(self, timeout=None):
+        """Return all the queued packets, waiting for packets to be available
+        if the queue is empty.
+
+        :param timeout: The maximum time to wait, in seconds.
+
+        This method returns an empty list if no packets arrived before the
+        timeout.
+        """
+        deadline = None
+        while not self.packets:
+            if self.ready is None:
+                self.ready = self.event_class()
+            self.ready.clear()
+            # a producer that did not see the event yet has already added its
+            # packet, so checking again here guarantees it is not missed
+            if self.packets:
+                break
+            remaining = None
+            if timeout is not None:
+                if deadline is None:
+                    deadline = time.monotonic() + timeout
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+            self.ready.wait(timeout=remaining)
+        return self._pop_all()
+
+    def get(self, timeout=None):
+        """Return the oldest packet in the queue.
+
+        This method is provided for compatibility with ``queue.Queue``.
+        """
+        packets = self.drain(timeout=timeout)
+        if not packets:
+            raise exceptions.QueueEmpty()
+        if len(packets) > 1:
+            self.packets.extendleft(reversed(packets[1:]))
+            if self.ready is not None:
+                self.ready.set()
+        return packets[0]
+
+    def task_done(self):
+        """Provided for compatibility with ``queue.Queue``. Packets are
+        considered done when they are removed from the queue."""
+        pass
+
+    def join(self):
+        """Wait until all the packets in the queue have been consumed."""
+        while self.packets:
+            if self.empty is None:
+                self.empty = self.event_class()
+            self.empty.clear()
+            if self.packets:
+                self.empty.wait()
+
+    def _pop_all(self):
+        packets = []
+        while True:
+            try:
+                packets.append(self.packets.popleft())
+            except IndexError:
+                break
+        self._notify_if_empty()
+        return packets
+
+    def _notify_if_empty(self):
+        if self.empty is not None and not self.packets:
+            self.empty.set()
+
+
+class AsyncPacketQueue:
+    """Outgoing packet queue for an asyncio socket.
+
+    This is the asyncio version of :class:`PacketQueue`.
+    """
+    def __init__(self):
+        self.packets = collections.deque()
+        self.ready = None
+        self.empty = None
+
+    def qsize(self):
+        return len(self.packets)
+
+    def put_nowait(self, pkt):
+        """Add a packet to the queue."""
+        self.packets.append(pkt)
+        if self.ready is not None:
+            self.ready.set()
+
+    async def put(self, pkt):
+        """Add a packet to the queue.
+
+        Note: this method is a coroutine.
+        """
+        self.put_nowait(pkt)
+
+    async def drain(self, timeout=None):
+        """Return all the queued packets, waiting for packets to be available
+        if the queue is empty.
+
+        :param timeout: The maximum time to wait, in seconds.
+
+        This method returns an empty list if no packets arrived before the
+        timeout.
+
+        Note: this method is a coroutine.
+        """
+        if not self.packets:
+            if self.ready is None:
+                self.ready = asyncio.Event()
+            self.ready.clear()
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        packets = list(self.packets)
+        self.packets.clear()
+        self._notify_if_empty()
+        return packets
+
+    def get_nowait(self):
+        """Return the oldest packet in the queue without waiting.
+
+        This method is provided for compatibility with ``asyncio.Queue``.
+        """
+        try:
+            pkt = self.packets.popleft()
+        except IndexError:
+            raise asyncio.QueueEmpty()
+        self._notify_if_empty()
+        return pkt
+
+    async def get(self):
+        """Return the oldest packet in the queue.
+
+        This method is provided for compatibility with ``asyncio.Queue``.
+
+        Note: this method is a coroutine.
+        """
+        while not self.packets:
+            if self.ready is None:
+                self.ready = asyncio.Event()
+            self.ready.clear()
+            await self.ready.wait()
+        return self.get_nowait()
+
+    def task_done(self):
+        """Provided for compatibility with ``asyncio.Queue``. Packets are
+        considered done when they are removed from the queue."""
+        pass
+
+    async def join(self):
+        """Wait until all the packets in the queue have been consumed.
+
+        Note: this method is a coroutine.
+        """
+        while self.packets:
+            if self.empty is None:
+                self.empty = asyncio.Event()
+            self.empty.clear()
+            await self.empty.wait()
+
+    def _notify_if_empty(self):
+        if self.empty is not None and not self.packets:
+            self.empty.set()
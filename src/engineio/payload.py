@@ -1,24 +1,87 @@
 import urllib
 
 from . import packet
+from . import tracing
 
 
 class Payload:
     """Engine.IO payload."""
     max_decode_packets = 16
+    #: The approximate size of the chunks returned by :func:`encode_chunks`.
+    chunk_size = 65536
 
     def __init__(self, packets=None, encoded_payload=None):
         self.packets = packets or []
         if encoded_payload is not None:
             self.decode(encoded_payload)
 
-    def encode(self, jsonp_index=None):
-        """Encode the payload for transmission."""
-        encoded_payload = ''
-        for pkt in self.packets:
-            if encoded_payload:
-                encoded_payload += '\x1e'
-            encoded_payload += pkt.encode(b64=True)
+    def encode(self, jsonp_index=None, as_bytes=False):
+        """Encode the payload for transmission.
+
+        :param jsonp_index: The JSONP index, for JSONP responses.
+        :param as_bytes: If ``True``, the payload is returned as a UTF-8 byte
+                         sequence instead of as a string.
+        """
+        if tracing.hooks:
+            with tracing.span('payload.encode', packets=len(self.packets)):
+                return self._encode(jsonp_index, as_bytes)
+        return self._encode(jsonp_index, as_bytes)
+
+    def encode_chunks(self, jsonp_index=None):
+        """Encode the payload for transmission, as a sequence of UTF-8 byte
+        chunks.
+
+        :param jsonp_index: The JSONP index, for JSONP responses.
+
+        This is a generator that encodes the packets as the chunks are
+        consumed, so that the beginning of a large payload can be sent before
+        the rest of it is encoded. Chunks contain whole packets, and are
+        about ``chunk_size`` bytes long, unless a packet is larger than that.
+        """
+        if jsonp_index is None:
+            yield from self._encode_chunks()
+            return
+        prefix = b'___eio[' + str(jsonp_index).encode('utf-8') + b']("'
+        previous = None
+        for chunk in self._encode_chunks():
+            chunk = chunk.replace(b'"', b'\\"')
+            if previous is None:
+                chunk = prefix + chunk
+            else:
+                yield previous
+            previous = chunk
+        yield (previous if previous is not None else prefix) + b'");'
+
+    def _encode_chunks(self):
+        parts = []
+        size = 0
+        for i, pkt in enumerate(self.packets):
+            encoded_packet = pkt.encode_bytes()
+            if i > 0:
+                parts.append(b'\x1e')
+                size += 1
+            parts.append(encoded_packet)
+            size += len(encoded_packet)
+            if size >= self.chunk_size:
+                yield b''.join(parts)
+                parts = []
+                size = 0
+        if parts:
+            yield b''.join(parts)
+
+    def _encode(self, jsonp_index, as_bytes):
+        if as_bytes:
+            encoded_payload = b'\x1e'.join(
+                [pkt.encode_bytes() for pkt in self.packets])
+            if jsonp_index is not None:
+                encoded_payload = b'___eio[' + \
+                                  str(jsonp_index).encode('utf-8') + \
+                                  b']("' + \
+                                  encoded_payload.replace(b'"', b'\\"') + \
+                                  b'");'
+            return encoded_payload
+        encoded_payload = '\x1e'.join(
+            [pkt.encode(b64=True) for pkt in self.packets])
         if jsonp_index is not None:
             encoded_payload = '___eio[' + \
                               str(jsonp_index) + \
@@ -29,6 +92,12 @@ class Payload:
 
     def decode(self, encoded_payload):
         """Decode a transmitted payload."""
+        if tracing.hooks:
+            with tracing.span('payload.decode', size=len(encoded_payload)):
+                return self._decode(encoded_payload)
+        return self._decode(encoded_payload)
+
+    def _decode(self, encoded_payload):
         self.packets = []
 
         if len(encoded_payload) == 0:
@@ -44,3 +113,72 @@ class Payload:
             raise ValueError('Too many packets in payload')
         self.packets = [packet.Packet(encoded_packet=encoded_packet)
                         for encoded_packet in encoded_packets]
+
+
+class PayloadDecoder:
+    """Incremental Engine.IO payload decoder.
+
+    This decoder accepts a payload in chunks of bytes, and returns the packets
+    as soon as they are complete, so that they can be processed before the
+    rest of the payload is received.
+
+    :param max_decode_packets: The maximum number of packets accepted in the
+                               payload. The default is the limit set in the
+                               :class:`Payload` class.
+    """
+    #: The suggested size of the chunks given to the decoder.
+    chunk_size = 65536
+
+    def __init__(self, max_decode_packets=None):
+        self.max_decode_packets = max_decode_packets or \
+            Payload.max_decode_packets
+        self.buffer = bytearray()
+        self.packet_count = 0
+        self.jsonp = None
+
+    def feed(self, data):
+        """Add a chunk of the payload and return the packets it completes."""
+        if tracing.hooks:
+            with tracing.span('payload.decode', size=len(data)):
+                return self._feed(data)
+        return self._feed(data)
+
+    def _feed(self, data):
+        self.buffer += data
+        if self.jsonp is None:
+            if len(self.buffer) < 2:
+                return []
+            # JSONP POST payload starts with 'd=' and is URL encoded, so it is
+            # decoded when it is complete
+            self.jsonp = self.buffer.startswith(b'd=')
+        if self.jsonp:
+            return []
+        packets = []
+        start = 0
+        while True:
+            # the separator cannot appear inside a multi-byte UTF-8 sequence,
+            # so the payload can be split before it is decoded
+            end = self.buffer.find(b'\x1e', start)
+            if end == -1:
+                break
+            packets.append(self._decode_packet(self.buffer[start:end]))
+            start = end + 1
+        if start:
+            del self.buffer[:start]
+        return packets
+
+    def close(self):
+        """Signal the end of the payload and return the remaining packets."""
+        buffer = self.buffer
+        self.buffer = bytearray()
+        if self.jsonp:
+            return Payload(encoded_payload=buffer.decode('utf-8')).packets
+        if len(buffer) == 0 and self.packet_count == 0:
+            return []
+        return [self._decode_packet(buffer)]
+
+    def _decode_packet(self, encoded_packet):
+        self.packet_count += 1
+        if self.packet_count > self.max_decode_packets:
+            raise ValueError('Too many packets in payload')
+        return packet.Packet(encoded_packet=encoded_packet.decode('utf-8'))
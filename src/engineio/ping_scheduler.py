@@ -0,0 +1,102 @@
+import asyncio
+import collections
+import threading
+import time
+
+
+class PingScheduler:
+    """Send PING packets to the clients of a server.
+
+    A single background task sends the PING packets for all the clients, so
+    that a task does not need to be started for each ping cycle of each
+    client. Since all the clients of a server use the same ping interval,
+    new entries are always added at the end of the schedule, which is kept
+    in a ``collections.deque`` sorted by due time. The schedule is protected
+    by a lock, so that it can be updated from multiple threads without
+    relying on the GIL.
+
+    :param server: The server that owns the clients.
+    """
+    def __init__(self, server):
+        self.server = server
+        self.schedule_queue = collections.deque()
+        self.event = None
+        self.task = None
+        self.stopped = False
+        self.lock = threading.Lock()
+
+    def schedule(self, socket):
+        """Schedule a PING packet for a client after the ping interval."""
+        with self.lock:
+            was_empty = not self.schedule_queue
+            self.schedule_queue.append(
+                (time.monotonic() + self.server.ping_interval, socket))
+            if self.task is None:
+                self.stopped = False
+                self.event = self.server.create_event()
+                self.task = self.server.start_background_task(self._run)
+            elif was_empty:
+                self.event.set()
+
+    def stop(self):
+        """Stop the background task."""
+        if self.task is not None:
+            self.stopped = True
+            self.event.set()
+            self.task.join()
+            self.task = None
+
+    def _run(self):
+        while not self.stopped:
+            # the event is cleared before the schedule is inspected, so that
+            # clients added from this point on are guaranteed to wake the
+            # task up
+            self.event.clear()
+            now = time.monotonic()
+            while True:
+                with self.lock:
+                    if not self.schedule_queue or \
+                            self.schedule_queue[0][0] > now:
+                        timeout = self.schedule_queue[0][0] - now \
+                            if self.schedule_queue else None
+                        break
+                    socket = self.schedule_queue.popleft()[1]
+                try:
+                    socket._send_ping()
+                except Exception:  # pragma: no cover
+                    self.server.logger.exception('ping scheduler error')
+            self.event.wait(timeout=timeout)
+
+
+class AsyncPingScheduler(PingScheduler):
+    """Send PING packets to the clients of an asyncio server.
+
+    This is the asyncio version of :class:`PingScheduler`.
+    """
+    async def stop(self):
+        """Stop the background task.
+
+        Note: this method is a coroutine.
+        """
+        if self.task is not None:
+            self.stopped = True
+            self.event.set()
+            await self.task
+            self.task = None
+
+    async def _run(self):
+        while not self.stopped:
+            self.event.clear()
+            now = time.monotonic()
+            while self.schedule_queue and self.schedule_queue[0][0] <= now:
+                socket = self.schedule_queue.popleft()[1]
+                try:
+                    await socket._send_ping()
+                except Exception:  # pragma: no cover
+                    self.server.logger.exception('ping scheduler error')
+            timeout = self.schedule_queue[0][0] - now \
+                if self.schedule_queue else None
+            try:
+                await asyncio.wait_for(self.event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,74 @@
+class AsyncRequestBody:
+    """The body of a request received by an asyncio driver.
+
+    The body is received in chunks, which are returned by :meth:`read` as
+    they arrive, without joining them or copying the unread data. The end of
+    the body is detected even when the request does not have a
+    ``Content-Length`` header, which allows the server to stop reading a
+    body as soon as it exceeds the maximum size.
+
+    Subclasses implement :meth:`_receive`.
+    """
+    def __init__(self):
+        self.chunk = b''
+        self.offset = 0
+        self.done = False
+
+    async def read(self, length=None):
+        """Read up to ``length`` bytes of the body, or the remaining body if
+        ``length`` is not given. An empty result indicates the end of the
+        body.
+
+        Note: this method is a coroutine.
+        """
+        if length is None:
+            chunks = []
+            while await self._next_chunk():
+                chunks.append(self.chunk[self.offset:])
+                self.offset = len(self.chunk)
+            return chunks[0] if len(chunks) == 1 else b''.join(chunks)
+        if not await self._next_chunk():
+            return b''
+        if self.offset == 0 and len(self.chunk) <= length:
+            # the whole chunk is returned without copying it
+            r = self.chunk
+        else:
+            r = self.chunk[self.offset:self.offset + length]
+        self.offset += len(r)
+        return r
+
+    async def _receive(self):  # pragma: no cover
+        """Return the next chunk of the body, or ``None`` at the end.
+
+        Note: this method is a coroutine.
+        """
+        raise NotImplementedError()
+
+    async def _next_chunk(self):
+        # receive the next chunk of the body when the current one was
+        # consumed, returning False at the end
+        while self.offset >= len(self.chunk):
+            if self.done:
+                return False
+            chunk = await self._receive()
+            if chunk is None:
+                self.done = True
+                return False
+            self.chunk = chunk
+            self.offset = 0
+        return True
+
+
+class BufferedRequestBody(AsyncRequestBody):
+    """The body of a request, for web frameworks that receive the complete
+    body before invoking the request handler.
+
+    :param body: The request body.
+    """
+    def __init__(self, body):
+        super().__init__()
+        self.body = body or b''
+
+    async def _receive(self):
+        body, self.body = self.body, None
+        return body
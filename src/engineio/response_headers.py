@@ -0,0 +1,26 @@
+"""Headers of the HTTP responses generated by the server.
+
+The headers that do not change between responses are defined once, and their
+encoded form is computed in advance for the asyncio drivers that send headers
+as bytes.
+"""
+from . import compression
+
+TEXT = ('Content-Type', 'text/plain')
+TEXT_UTF8 = ('Content-Type', 'text/plain; charset=UTF-8')
+JSON = ('Content-Type', 'application/json')
+ALLOW_METHODS = ('Access-Control-Allow-Methods', 'OPTIONS, GET, POST')
+ALLOW_CREDENTIALS = ('Access-Control-Allow-Credentials', 'true')
+CONTENT_ENCODING = {encoding: ('Content-Encoding', encoding)
+                    for encoding in compression.compressors}
+
+_encoded = {header: (header[0].encode('utf-8'), header[1].encode('utf-8'))
+            for header in [TEXT, TEXT_UTF8, JSON, ALLOW_METHODS,
+                           ALLOW_CREDENTIALS, *CONTENT_ENCODING.values()]}
+
+
+def encode(headers):
+    """Return a list of headers as ``(name, value)`` tuples of bytes."""
+    return [_encoded.get(header) or (header[0].encode('utf-8'),
+                                     header[1].encode('utf-8'))
+            for header in headers]
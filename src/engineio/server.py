@@ -1,10 +1,11 @@
 import logging
-import urllib
+import time
 
 from . import base_server
 from . import exceptions
 from . import packet
 from . import socket
+from . import tracing
 
 default_logger = logging.getLogger('engineio.server')
 
@@ -39,7 +40,15 @@ class Server(base_server.BaseServer):
     :param allow_upgrades: Whether to allow transport upgrades or not. The
                            default is ``True``.
     :param http_compression: Whether to compress packages when using the
-                             polling transport. The default is ``True``.
+                             polling transport. The default is ``True``,
+                             which enables the ``gzip`` and ``deflate``
+                             encodings. To choose the encodings, pass a list
+                             with their names, or a dictionary that maps
+                             encoding names to compression options, such as
+                             ``{'gzip': {'level': 6}, 'br': {'quality': 4}}``.
+                             The ``'br'`` and ``'zstd'`` encodings require the
+                             ``brotli`` and ``zstandard`` packages
+                             respectively.
     :param compression_threshold: Only compress messages when their byte size
                                   is greater than this value. The default is
                                   1024 bytes.
@@ -66,7 +75,9 @@ class Server(base_server.BaseServer):
     :param json: An alternative JSON module to use for encoding and decoding
                  packets. Custom JSON modules must have ``dumps`` and ``loads``
                  functions that are compatible with the standard library
-                 versions. This is a process-wide setting, all instantiated
+                 versions. The strings ``'orjson'`` and ``'msgspec'`` select
+                 built-in codecs based on these packages, which must be
+                 installed. This is a process-wide setting, all instantiated
                  servers and clients must use the same JSON module.
     :param async_handlers: If set to ``True``, run message event handlers in
                            non-blocking threads. To run handlers synchronously,
@@ -78,6 +89,53 @@ class Server(base_server.BaseServer):
     :param transports: The list of allowed transports. Valid transports
                        are ``'polling'`` and ``'websocket'``. Defaults to
                        ``['polling', 'websocket']``.
+    :param websocket_max_batch_bytes: If set to a number of bytes, packets that
+                                      are queued for a WebSocket client are
+                                      written to the network together, in
+                                      batches of up to this size, when the
+                                      WebSocket driver supports it. The
+                                      default is ``None``, which writes each
+                                      packet separately.
+    :param websocket_compression: Whether to negotiate the permessage-deflate
+                                  compression extension with WebSocket
+                                  clients. The default is ``True``, which
+                                  uses the defaults of the WebSocket driver.
+                                  Set to ``False`` to disable compression, or
+                                  to a dictionary with compression options.
+                                  See the documentation for the options that
+                                  each WebSocket driver supports.
+    :param metrics: Whether to collect metrics about the activity of the
+                    server. Set to ``True`` to enable metrics with the default
+                    settings, or pass a :class:`engineio.metrics.Metrics`
+                    instance. The default is ``False``. The metrics are
+                    available in the ``metrics`` attribute of the server.
+    :param packet_logging: A dictionary with options for the logging of the
+                           packets exchanged with clients, which happens at
+                           the ``INFO`` level. The ``'sample_rate'`` option
+                           sets the fraction of packets that are logged, and
+                           ``'max_data_length'`` truncates long packet data.
+                           The ``'flight_recorder'`` option sets a number of
+                           recent packets that are kept in memory for each
+                           client, and logged as warnings when a connection
+                           ends abnormally. See the documentation for
+                           details.
+    :param worker_socket_dir: A directory where the worker processes of the
+                              server create Unix sockets to forward requests
+                              to each other. When set, session ids include
+                              the id of the worker that owns the session, and
+                              long-polling requests that arrive at a
+                              different worker are forwarded to the owner.
+                              The default is ``None``, which disables
+                              forwarding. See the documentation for details.
+    :param worker_id: The id of this worker process, from 0 to 255, when
+                      ``worker_socket_dir`` is set. The default is to use the
+                      first id that is not in use by another worker.
+    :param cors_cache_size: The number of origins for which the decision of a
+                            callable ``cors_allowed_origins`` is cached. The
+                            default is 0, which calls the function on every
+                            request. A cache should only be used when the
+                            decision does not depend on the request
+                            environment.
     :param kwargs: Reserved for future extensions, any additional parameters
                    given as keyword arguments will be silently ignored.
     """
@@ -105,6 +163,34 @@ class Server(base_server.BaseServer):
             return
         socket.send(pkt)
 
+    def send_many(self, sids, data):
+        """Send a message to a group of clients.
+
+        :param sids: An iterable with the session ids of the recipient
+                     clients.
+        :param data: The data to send to the clients. Data can be of type
+                     ``str``, ``bytes``, ``list`` or ``dict``. If a ``list``
+                     or ``dict``, the data will be serialized as JSON.
+
+        A single packet is shared by all the recipients, so the data is
+        encoded only once for each transport, regardless of the number of
+        clients that receive it.
+        """
+        pkt = packet.Packet(packet.MESSAGE, data=data)
+        for sid in sids:
+            self.send_packet(sid, pkt)
+
+    def broadcast(self, data, skip_sid=None):
+        """Send a message to all the connected clients.
+
+        :param data: The data to send to the clients. Data can be of type
+                     ``str``, ``bytes``, ``list`` or ``dict``. If a ``list``
+                     or ``dict``, the data will be serialized as JSON.
+        :param skip_sid: The session id of a client that should not receive
+                         the message, or a list of them.
+        """
+        self.send_many(self._broadcast_sids(skip_sid), data)
+
     def get_session(self, sid):
         """Return the user session for a client.
 
@@ -178,12 +264,11 @@ class Server(base_server.BaseServer):
                 pass
             else:
                 socket.close(reason=self.reason.SERVER_DISCONNECT)
-                if sid in self.sockets:  # pragma: no cover
-                    del self.sockets[sid]
+                self.sockets.pop(sid, None)
         else:
-            for client in self.sockets.copy().values():
+            for client in self.sockets.values():
                 client.close(reason=self.reason.SERVER_DISCONNECT)
-            self.sockets = {}
+            self.sockets.clear()
 
     def handle_request(self, environ, start_response):
         """Handle an HTTP request from the client.
@@ -199,59 +284,38 @@ class Server(base_server.BaseServer):
         This function returns the HTTP response body to deliver to the client
         as a byte sequence.
         """
-        if self.cors_allowed_origins != []:
-            # Validate the origin header if present
-            # This is important for WebSocket more than for HTTP, since
-            # browsers only apply CORS controls to HTTP.
-            origin = environ.get('HTTP_ORIGIN')
-            if origin:
-                allowed_origins = self._cors_allowed_origins(environ)
-                if allowed_origins is not None and origin not in \
-                        allowed_origins:
-                    self._log_error_once(
-                        origin + ' is not an accepted origin.', 'bad-origin')
-                    r = self._bad_request('Not an accepted origin.')
-                    start_response(r['status'], r['headers'])
-                    return [r['response']]
-
-        method = environ['REQUEST_METHOD']
-        query = urllib.parse.parse_qs(environ.get('QUERY_STRING', ''))
-        jsonp = False
-        jsonp_index = None
-
-        # make sure the client uses an allowed transport
-        transport = query.get('transport', ['polling'])[0]
-        if transport not in self.transports:
-            self._log_error_once('Invalid transport', 'bad-transport')
-            r = self._bad_request('Invalid transport')
-            start_response(r['status'], r['headers'])
-            return [r['response']]
-
-        # make sure the client speaks a compatible Engine.IO version
-        sid = query['sid'][0] if 'sid' in query else None
-        if sid is None and query.get('EIO') != ['4']:
-            self._log_error_once(
-                'The client is using an unsupported version of the Socket.IO '
-                'or Engine.IO protocols', 'bad-version')
-            r = self._bad_request(
-                'The client is using an unsupported version of the Socket.IO '
-                'or Engine.IO protocols')
+        return self._handle_request(environ, start_response)
+
+    def _handle_request(self, environ, start_response):
+        # requests forwarded by other workers also enter the server here
+        if tracing.hooks:
+            query = self._parse_query(environ.get('QUERY_STRING', ''))
+            with tracing.span('server.handle_request',
+                              method=environ['REQUEST_METHOD'],
+                              sid=query.get('sid'),
+                              transport=query.get('transport', 'polling')):
+                return self._route_request(environ, start_response)
+        return self._route_request(environ, start_response)
+
+    def _route_request(self, environ, start_response):
+        start = time.perf_counter()
+        sid, transport, jsonp_index, r = self._parse_request(environ)
+        if r is not None:
             start_response(r['status'], r['headers'])
             return [r['response']]
+        method = environ['REQUEST_METHOD']
 
-        if 'j' in query:
-            jsonp = True
-            try:
-                jsonp_index = int(query['j'][0])
-            except (ValueError, KeyError, IndexError):
-                # Invalid JSONP index number
-                pass
-
-        if jsonp and jsonp_index is None:
-            self._log_error_once('Invalid JSONP index number',
-                                 'bad-jsonp-index')
-            r = self._bad_request('Invalid JSONP index number')
-        elif method == 'GET':
+        if sid is not None and self.worker_router is not None and \
+                sid not in self.sockets and 'HTTP_UPGRADE' not in environ:
+            # the session may belong to another worker process
+            owner = self.worker_router.remote_owner(sid)
+            if owner is not None:
+                response = self.worker_router.forward(owner, environ,
+                                                      start_response)
+                if response is not None:
+                    return response
+
+        if method == 'GET':
             upgrade_header = environ.get('HTTP_UPGRADE').lower() \
                 if 'HTTP_UPGRADE' in environ else None
             if sid is None:
@@ -266,44 +330,35 @@ class Server(base_server.BaseServer):
                                          'bad-upgrade')
                     r = self._bad_request('Invalid websocket upgrade')
             else:
-                if sid not in self.sockets:
-                    self._log_error_once(f'Invalid session {sid}', 'bad-sid')
-                    r = self._bad_request(f'Invalid session {sid}')
+                # established session, which is looked up only once
+                socket = self.sockets.get(sid)
+                if socket is None or socket.closed:
+                    r = self._invalid_session(sid, socket)
+                elif transport != upgrade_header and transport != (
+                        'websocket' if socket.upgraded else 'polling'):
+                    self._log_error_once(
+                        f'Invalid transport for session {sid}',
+                        'bad-transport')
+                    r = self._bad_request('Invalid transport')
                 else:
                     try:
-                        socket = self._get_socket(sid)
-                    except KeyError as e:  # pragma: no cover
-                        self._log_error_once(f'{e} {sid}', 'bad-sid')
-                        r = self._bad_request(f'{e} {sid}')
-                    else:
-                        if self.transport(sid) != transport and \
-                                transport != upgrade_header:
-                            self._log_error_once(
-                                f'Invalid transport for session {sid}',
-                                'bad-transport')
-                            r = self._bad_request('Invalid transport')
+                        packets = socket.handle_get_request(
+                            environ, start_response)
+                        if isinstance(packets, list):
+                            r = self._ok(packets, jsonp_index=jsonp_index)
                         else:
-                            try:
-                                packets = socket.handle_get_request(
-                                    environ, start_response)
-                                if isinstance(packets, list):
-                                    r = self._ok(packets,
-                                                 jsonp_index=jsonp_index)
-                                else:
-                                    r = packets
-                            except exceptions.EngineIOError:
-                                if sid in self.sockets:  # pragma: no cover
-                                    self.disconnect(sid)
-                                r = self._bad_request()
-                            if sid in self.sockets and \
-                                    self.sockets[sid].closed:
-                                del self.sockets[sid]
+                            r = packets
+                    except exceptions.EngineIOError:
+                        if sid in self.sockets:  # pragma: no cover
+                            self.disconnect(sid)
+                        r = self._bad_request()
+                    if socket.closed:
+                        self.sockets.remove(sid, socket)
         elif method == 'POST':
-            if sid is None or sid not in self.sockets:
-                self._log_error_once(f'Invalid session {sid}', 'bad-sid')
-                r = self._bad_request(f'Invalid session {sid}')
+            socket = self.sockets.get(sid) if sid is not None else None
+            if socket is None or socket.closed:
+                r = self._invalid_session(sid, socket)
             else:
-                socket = self._get_socket(sid)
                 try:
                     socket.handle_post_request(environ)
                     r = self._ok(jsonp_index=jsonp_index)
@@ -324,18 +379,15 @@ class Server(base_server.BaseServer):
 
         if not isinstance(r, dict):
             return r
-        if self.http_compression and \
-                len(r['response']) >= self.compression_threshold:
-            encodings = [e.split(';')[0].strip() for e in
-                         environ.get('HTTP_ACCEPT_ENCODING', '').split(',')]
-            for encoding in encodings:
-                if encoding in self.compression_methods:
-                    r['response'] = \
-                        getattr(self, '_' + encoding)(r['response'])
-                    r['headers'] += [('Content-Encoding', encoding)]
-                    break
+        self._prepare_response_body(r, environ)
+        if self.metrics is not None:
+            self.metrics.observe('request_duration_seconds',
+                                 time.perf_counter() - start, method)
         cors_headers = self._cors_headers(environ)
         start_response(r['status'], r['headers'] + cors_headers)
+        if not isinstance(r['response'], bytes):
+            # streamed response
+            return r['response']
         return [r['response']]
 
     def shutdown(self):
@@ -349,6 +401,9 @@ class Server(base_server.BaseServer):
             self.service_task_event.set()
             self.service_task_handle.join()
             self.service_task_handle = None
+        self.ping_scheduler.stop()
+        if self.worker_router is not None:
+            self.worker_router.stop()
 
     def start_background_task(self, target, *args, **kwargs):
         """Start a background task using the appropriate async model.
@@ -382,15 +437,15 @@ class Server(base_server.BaseServer):
     def _handle_connect(self, environ, start_response, transport,
                         jsonp_index=None):
         """Handle a client connection request."""
-        if self.start_service_task:
+        if self._claim_service_task():
             # start the service task to monitor connected clients
-            self.start_service_task = False
             self.service_task_handle = self.start_background_task(
                 self._service_task)
 
         sid = self.generate_id()
         s = socket.Socket(self, sid)
         self.sockets[sid] = s
+        self.packet_log.opened(sid)
 
         pkt = packet.Packet(packet.OPEN, {
             'sid': sid,
@@ -409,16 +464,19 @@ class Server(base_server.BaseServer):
         ret = self._trigger_event('connect', sid, environ, run_async=False)
         if ret is not None and ret is not True:  # pragma: no cover
             del self.sockets[sid]
+            self.packet_log.discard(sid)
             self.logger.warning('Application rejected connection')
             return self._unauthorized(ret or None)
 
         s.schedule_ping()
+        if self.metrics is not None:
+            self.metrics.inc('connections', transport)
 
         if transport == 'websocket':  # pragma: no cover
             ret = s.handle_get_request(environ, start_response)
-            if s.closed and sid in self.sockets:
+            if s.closed:
                 # websocket connection ended, so we are done
-                del self.sockets[sid]
+                self.sockets.remove(sid, s)
             return ret
         else:  # pragma: no cover
             s.connected = True
@@ -465,6 +523,13 @@ class Server(base_server.BaseServer):
                         # connection
                         return False
 
+            if self.metrics is not None:
+                run_handler = self.metrics.timed(
+                    run_handler, 'handler_duration_seconds', event)
+            if tracing.hooks:
+                run_handler = tracing.traced(
+                    run_handler, 'server.trigger_event', event=event,
+                    sid=args[0] if args else None)
             if run_async:
                 return self.start_background_task(run_handler)
             else:
@@ -474,29 +539,13 @@ class Server(base_server.BaseServer):
         """Monitor connected clients and clean up those that time out."""
         self.service_task_event = self.create_event()
         while not self.service_task_event.is_set():
-            if len(self.sockets) == 0:
-                # nothing to do
-                if self.service_task_event.wait(timeout=self.ping_timeout):
-                    break
-                continue
-
-            # go through the entire client list in a ping interval cycle
-            sleep_interval = float(self.ping_timeout) / len(self.sockets)
-
             try:
-                # iterate over the current clients
-                for s in self.sockets.copy().values():
-                    if s.closed:
-                        try:
-                            del self.sockets[s.sid]
-                        except KeyError:
-                            # the socket could have also been removed by
-                            # the _get_socket() method from another thread
-                            pass
-                    elif not s.closing:
-                        s.check_ping_timeout()
-                    if self.service_task_event.wait(timeout=sleep_interval):
-                        raise KeyboardInterrupt()
+                # only the clients with a check that is due are visited
+                timed_out, timeout = self._due_client_checks()
+                for s in timed_out:
+                    s._ping_timeout()
+                if self.service_task_event.wait(timeout=timeout):
+                    raise KeyboardInterrupt()
             except (SystemExit, KeyboardInterrupt):
                 self.logger.info('service task canceled')
                 break
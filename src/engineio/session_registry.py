@@ -0,0 +1,130 @@
+"""Registry of the sessions connected to a server."""
+import collections.abc
+import threading
+
+
+class SessionRegistry(collections.abc.MutableMapping):
+    """Thread-safe mapping of session ids to sockets.
+
+    Sessions are distributed among a number of shards, each with its own
+    dictionary and lock. Lookups do not take any locks, and operations that
+    modify the registry only lock the shard of the session they affect, so
+    threads that work with different sessions rarely contend with each other.
+    The registry does not depend on the GIL for its consistency, so it can be
+    used with the free-threaded builds of Python.
+
+    Iterating over the registry does not copy it as a whole. The shards are
+    copied one at a time as the iteration progresses, so a session that is
+    added or removed during an iteration may or may not be included in it.
+    The number of sessions is kept in a counter, so that it does not have to
+    be computed from the shards.
+
+    The registry implements the complete mapping interface, with views that
+    are safe to iterate while sessions are added and removed, but it is not a
+    ``dict`` subclass. The :meth:`copy` method returns the sessions as a
+    ``dict``.
+
+    :param shards: The number of shards, which must be a power of two. The
+                   default is 16.
+    """
+    def __init__(self, shards=16):
+        if shards < 1 or shards & (shards - 1):
+            raise ValueError('The number of shards must be a power of two')
+        self.mask = shards - 1
+        self.shards = [{} for _ in range(shards)]
+        self.locks = [threading.Lock() for _ in range(shards)]
+        self.count = 0
+        self.count_lock = threading.Lock()
+
+    def _add_count(self, n):
+        with self.count_lock:
+            self.count += n
+
+    def __getitem__(self, sid):
+        return self.shards[hash(sid) & self.mask][sid]
+
+    def __setitem__(self, sid, socket):
+        index = hash(sid) & self.mask
+        with self.locks[index]:
+            shard = self.shards[index]
+            if sid not in shard:
+                self._add_count(1)
+            shard[sid] = socket
+
+    def __delitem__(self, sid):
+        index = hash(sid) & self.mask
+        with self.locks[index]:
+            del self.shards[index][sid]
+            self._add_count(-1)
+
+    def __contains__(self, sid):
+        return sid in self.shards[hash(sid) & self.mask]
+
+    def __iter__(self):
+        for shard in self.shards:
+            yield from list(shard)
+
+    def __len__(self):
+        return self.count
+
+    def get(self, sid, default=None):
+        return self.shards[hash(sid) & self.mask].get(sid, default)
+
+    def pop(self, sid, *args):
+        index = hash(sid) & self.mask
+        with self.locks[index]:
+            shard = self.shards[index]
+            if sid in shard:
+                self._add_count(-1)
+            return shard.pop(sid, *args)
+
+    def setdefault(self, sid, default=None):
+        index = hash(sid) & self.mask
+        with self.locks[index]:
+            shard = self.shards[index]
+            if sid not in shard:
+                self._add_count(1)
+            return shard.setdefault(sid, default)
+
+    def remove(self, sid, socket):
+        """Remove a session, only if it is associated with the given socket.
+
+        Returns ``True`` if the session was removed, or ``False`` if it was
+        not found, or if it belongs to a different socket.
+        """
+        index = hash(sid) & self.mask
+        with self.locks[index]:
+            shard = self.shards[index]
+            if shard.get(sid) is not socket:
+                return False
+            del shard[sid]
+            self._add_count(-1)
+            return True
+
+    def values(self):
+        return _ValuesView(self)
+
+    def items(self):
+        return _ItemsView(self)
+
+    def clear(self):
+        for lock, shard in zip(self.locks, self.shards):
+            with lock:
+                self._add_count(-len(shard))
+                shard.clear()
+
+    def copy(self):
+        """Return the sessions as a ``dict``."""
+        return dict(self.items())
+
+
+class _ValuesView(collections.abc.ValuesView):
+    def __iter__(self):
+        for shard in self._mapping.shards:
+            yield from list(shard.values())
+
+
+class _ItemsView(collections.abc.ItemsView):
+    def __iter__(self):
+        for shard in self._mapping.shards:
+            yield from list(shard.items())
@@ -4,42 +4,41 @@ import time
 from . import base_socket
 from . import exceptions
 from . import packet
+from . import packet_queue
 from . import payload
+from . import tracing
 
 
 class Socket(base_socket.BaseSocket):
     """An Engine.IO socket."""
+    __slots__ = ()
+
+    def _create_queue(self):
+        return packet_queue.PacketQueue(self.server.create_event)
+
     def poll(self):
         """Wait for packets to send to the client."""
-        queue_empty = self.server.get_queue_empty_exception()
-        try:
-            packets = [self.queue.get(
-                timeout=self.server.ping_interval + self.server.ping_timeout)]
-            self.queue.task_done()
-        except queue_empty:
+        if tracing.hooks:
+            with tracing.span('socket.poll', sid=self.sid,
+                              transport='websocket' if self.upgraded
+                              else 'polling'):
+                return self._poll()
+        return self._poll()
+
+    def _poll(self):
+        packets = self.queue.drain(
+            timeout=self.server.ping_interval + self.server.ping_timeout)
+        if not packets:
             raise exceptions.QueueEmpty()
-        if packets == [None]:
-            return []
-        while True:
-            try:
-                pkt = self.queue.get(block=False)
-                self.queue.task_done()
-                if pkt is None:
-                    self.queue.put(None)
-                    break
-                packets.append(pkt)
-            except queue_empty:
-                break
-        return packets
+        return self._split_at_sentinel(packets)
 
     def receive(self, pkt):
         """Receive packet from the client."""
-        packet_name = packet.packet_names[pkt.packet_type] \
-            if pkt.packet_type < len(packet.packet_names) else 'UNKNOWN'
-        self.server.logger.info('%s: Received packet %s data %s',
-                                self.sid, packet_name,
-                                pkt.data if not isinstance(pkt.data, bytes)
-                                else '<binary>')
+        self.server.packet_log.received(self.sid, pkt)
+        if self.server.metrics is not None:
+            self.server.metrics.inc(
+                'packets_received',
+                'websocket' if self.upgraded else 'polling')
         if pkt.packet_type == packet.PONG:
             self.schedule_ping()
         elif pkt.packet_type == packet.MESSAGE:
@@ -59,26 +58,26 @@ class Socket(base_socket.BaseSocket):
             raise exceptions.SocketIsClosedError()
         if self.last_ping and \
                 time.time() - self.last_ping > self.server.ping_timeout:
-            self.server.logger.info('%s: Client is gone, closing socket',
-                                    self.sid)
-            # Passing abort=False here will cause close() to write a
-            # CLOSE packet. This has the effect of updating half-open sockets
-            # to their correct state of disconnected
-            self.close(wait=False, abort=False,
-                       reason=self.server.reason.PING_TIMEOUT)
+            self._ping_timeout()
             return False
         return True
 
+    def _ping_timeout(self):
+        self.server.logger.info('%s: Client is gone, closing socket',
+                                self.sid)
+        # Passing abort=False here will cause close() to write a
+        # CLOSE packet. This has the effect of updating half-open sockets
+        # to their correct state of disconnected
+        self.close(wait=False, abort=False,
+                   reason=self.server.reason.PING_TIMEOUT)
+
     def send(self, pkt):
         """Send a packet to the client."""
         if not self.check_ping_timeout():
             return
         else:
             self.queue.put(pkt)
-        self.server.logger.info('%s: Sending packet %s data %s',
-                                self.sid, packet.packet_names[pkt.packet_type],
-                                pkt.data if not isinstance(pkt.data, bytes)
-                                else '<binary>')
+        self.server.packet_log.sent(self.sid, pkt)
 
     def handle_get_request(self, environ, start_response):
         """Handle a long-polling GET request from the client."""
@@ -95,12 +94,16 @@ class Socket(base_socket.BaseSocket):
             # we are upgrading to WebSocket, do not return any more packets
             # through the polling endpoint
             return [packet.Packet(packet.NOOP)]
+        start = time.perf_counter()
         try:
             packets = self.poll()
         except exceptions.QueueEmpty:
             exc = sys.exc_info()
             self.close(wait=False, reason=self.server.reason.TRANSPORT_ERROR)
             raise exc[1].with_traceback(exc[2])
+        if self.server.metrics is not None:
+            self.server.metrics.observe('poll_wait_seconds',
+                                        time.perf_counter() - start)
         return packets
 
     def handle_post_request(self, environ):
@@ -108,38 +111,63 @@ class Socket(base_socket.BaseSocket):
         length = int(environ.get('CONTENT_LENGTH', '0'))
         if length > self.server.max_http_buffer_size:
             raise exceptions.ContentTooLongError()
-        else:
-            body = environ['wsgi.input'].read(length).decode('utf-8')
-            p = payload.Payload(encoded_payload=body)
-            for pkt in p.packets:
+        if self.server.metrics is not None:
+            self.server.metrics.inc('bytes_received', 'polling', length)
+        decoder = payload.PayloadDecoder()
+        while length > 0:
+            chunk = environ['wsgi.input'].read(
+                min(length, decoder.chunk_size))
+            if not chunk:
+                break
+            length -= len(chunk)
+            for pkt in decoder.feed(chunk):
                 self.receive(pkt)
+        for pkt in decoder.close():
+            self.receive(pkt)
 
     def close(self, wait=True, abort=False, reason=None):
         """Close the socket connection."""
-        if not self.closed and not self.closing:
-            self.closing = True
-            self.server._trigger_event(
-                'disconnect', self.sid,
-                reason or self.server.reason.SERVER_DISCONNECT,
-                run_async=False)
+        if self._begin_close():
+            reason = reason or self.server.reason.SERVER_DISCONNECT
+            if self.server.metrics is not None:
+                self.server.metrics.inc('disconnects', reason)
+            self.server._trigger_event('disconnect', self.sid, reason,
+                                       run_async=False)
             if not abort:
                 self.send(packet.Packet(packet.CLOSE))
             self.closed = True
+            self.server.packet_log.closed(self.sid, reason)
+            self.server._schedule_client_check(self)
             self.queue.put(None)
             if wait:
                 self.queue.join()
 
+    def _begin_close(self):
+        """Mark the socket as closing.
+
+        Returns ``False`` if the socket was already closing or closed, so that
+        when several threads close the socket at the same time only one of
+        them runs the close sequence.
+        """
+        if self.closed or self.closing:
+            return False
+        with self.server._lock:
+            if self.closed or self.closing:
+                return False
+            self.closing = True
+            return True
+
     def schedule_ping(self):
         # only schedule a new ping if the previous ping wait cycle completed
         if self.last_ping:
             self.last_ping = None
-            self.server.start_background_task(self._send_ping)
+            self.server.ping_scheduler.schedule(self)
 
     def _send_ping(self):
-        self.server.sleep(self.server.ping_interval)
         if not self.closing and not self.closed:
             self.last_ping = time.time()
             self.send(packet.Packet(packet.PING))
+            self.server._schedule_client_check(self)
 
     def _upgrade_websocket(self, environ, start_response):
         """Upgrade the connection from polling to websocket."""
@@ -154,10 +182,14 @@ class Socket(base_socket.BaseSocket):
 
     def _websocket_handler(self, ws):
         """Engine.IO handler for websocket transport."""
+        metrics = self.server.metrics
+
         def websocket_wait():
             data = ws.wait()
             if data and len(data) > self.server.max_http_buffer_size:
                 raise ValueError('packet is too large')
+            if data and metrics is not None:
+                metrics.inc('bytes_received', 'websocket', len(data))
             return data
 
         # try to set a socket timeout matching the configured ping interval
@@ -194,10 +226,29 @@ class Socket(base_socket.BaseSocket):
                 return []
             self.upgraded = True
             self.upgrading = False
+            if metrics is not None:
+                metrics.inc('upgrades')
         else:
             self.connected = True
             self.upgraded = True
 
+        send_many = None
+        if self.server.websocket_max_batch_bytes:
+            send_many = getattr(ws, 'send_many', None)
+
+        def write(packets):
+            if send_many:
+                for batch in self._websocket_batches(packets):
+                    send_many(batch)
+                    if metrics is not None:
+                        self._count_websocket_batch(batch)
+            else:
+                for pkt in packets:
+                    encoded_packet = pkt.encode()
+                    ws.send(encoded_packet)
+                    if metrics is not None:
+                        self._count_websocket_batch([encoded_packet])
+
         # start separate writer thread
         def writer():
             while True:
@@ -210,8 +261,12 @@ class Socket(base_socket.BaseSocket):
                     # empty packet list returned -> connection closed
                     break
                 try:
-                    for pkt in packets:
-                        ws.send(pkt.encode())
+                    if tracing.hooks:
+                        with tracing.span('socket.websocket_write',
+                                          sid=self.sid, packets=len(packets)):
+                            write(packets)
+                    else:
+                        write(packets)
                 except:
                     break
             ws.close()
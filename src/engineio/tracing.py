@@ -0,0 +1,128 @@
+"""Tracing hooks.
+
+Tracing hooks receive start and stop events for the main operations of the
+server, such as request handling, packet and payload encoding and decoding,
+long-polling waits, WebSocket writes and event dispatch. They can be used to
+create OpenTelemetry spans, to feed a sampling profiler, or to record timings
+in any other way.
+
+Tracing is disabled by default. The instrumented code checks the ``hooks``
+list before doing any work, so when no hooks are registered the cost of
+tracing is a single list check. Hooks are registered for the whole process,
+because the packet and payload codecs are not associated with a server.
+
+The traced operations, with their attributes, are:
+
+- ``server.handle_request``: ``method``, ``sid`` and ``transport``.
+- ``server.trigger_event``: ``event`` and ``sid``.
+- ``socket.poll``: ``sid`` and ``transport``.
+- ``socket.websocket_write``: ``sid`` and ``packets``.
+- ``packet.encode``, ``packet.encode_bytes`` and ``packet.decode``:
+  ``packet_type``.
+- ``payload.encode`` and ``payload.decode``: ``packets`` for encoding, or
+  ``size`` for decoding.
+
+The ``packet_type`` attribute of ``packet.decode`` is only known when the
+packet is decoded, so it is added to the attributes before ``stop()`` is
+invoked.
+"""
+import functools
+
+#: The registered hooks.
+hooks = []
+
+
+class Hook:
+    """Base class for tracing hooks.
+
+    Subclasses can implement one or both of the ``start()`` and ``stop()``
+    methods. Hooks are invoked synchronously in the task or thread that runs
+    the traced operation, so they should be fast and must not raise
+    exceptions.
+    """
+    def start(self, name, attributes):
+        """Invoked when a traced operation starts.
+
+        :param name: The name of the operation.
+        :param attributes: A dictionary with the attributes of the operation.
+
+        The return value is passed to ``stop()``, and can be used to store
+        state, such as a span object.
+        """
+        return None
+
+    def stop(self, name, attributes, context, error=None):
+        """Invoked when a traced operation ends.
+
+        :param name: The name of the operation.
+        :param attributes: A dictionary with the attributes of the operation.
+        :param context: The value returned by ``start()``.
+        :param error: The exception raised by the operation, or ``None`` if
+                      the operation completed successfully.
+        """
+        pass
+
+
+def add_hook(hook):
+    """Register a tracing hook.
+
+    :param hook: An instance of a :class:`Hook` subclass.
+    """
+    hooks.append(hook)
+
+
+def remove_hook(hook):
+    """Unregister a tracing hook.
+
+    :param hook: A hook that was given to :func:`add_hook`.
+    """
+    hooks.remove(hook)
+
+
+class span:
+    """Context manager that reports a traced operation to the hooks.
+
+    :param name: The name of the operation.
+    :param attributes: The attributes of the operation, as keyword arguments.
+
+    The hooks that are registered when the operation starts are the ones that
+    receive its stop event.
+    """
+    def __init__(self, name, **attributes):
+        self.name = name
+        self.attributes = attributes
+        self.hooks = None
+        self.contexts = None
+
+    def __enter__(self):
+        self.hooks = list(hooks)
+        self.contexts = [hook.start(self.name, self.attributes)
+                         for hook in self.hooks]
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for hook, context in zip(reversed(self.hooks),
+                                 reversed(self.contexts)):
+            hook.stop(self.name, self.attributes, context, exc_value)
+        return False
+
+
+def traced(func, name, **attributes):
+    """Return a wrapper for ``func`` that traces each call."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with span(name, **attributes):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def traced_async(func, name, **attributes):
+    """Return a wrapper for the coroutine function ``func`` that traces each
+    call."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with span(name, **attributes):
+            return await func(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,379 @@
+"""Routing of requests among the worker processes of a server.
+
+When a server runs in multiple worker processes on the same host, the
+long-polling requests of a client can arrive at any of the workers, but only
+the worker that created the session can handle them. The worker router
+encodes the id of the owning worker in the session ids that it generates,
+and forwards the requests that arrive at the wrong worker to the owner, over
+a Unix socket. This allows a server to use all the cores of a host without
+a load balancer with sticky sessions.
+
+Each worker claims the first worker id that is not in use by another worker,
+by taking an exclusive lock on a lock file in the socket directory, and then
+listens on its own Unix socket in the same directory. The lock is released by
+the operating system when the worker process ends, so the id of a worker that
+exits can be reused by a new worker.
+
+WebSocket connections cannot be forwarded. A WebSocket upgrade that arrives
+at the wrong worker fails, and the client continues to use long-polling.
+"""
+import asyncio
+import base64
+import fcntl
+import io
+import json
+import os
+import socket
+import struct
+import threading
+
+from . import request_body
+
+#: The environ keys that are forwarded, in addition to the HTTP headers.
+forwarded_keys = ['REQUEST_METHOD', 'QUERY_STRING', 'PATH_INFO',
+                  'CONTENT_TYPE', 'CONTENT_LENGTH', 'REMOTE_ADDR',
+                  'wsgi.url_scheme']
+
+
+class WorkerRouter:
+    """Request router for a server that runs in multiple worker processes.
+
+    :param server: The server that owns the router.
+    :param socket_dir: The directory where the workers create their Unix
+                       sockets. All the workers of a server must use the same
+                       directory, and the directory must not be shared with
+                       other servers. The directory is created with access
+                       restricted to its owner if it does not exist, and it
+                       must be owned by the user that runs the server.
+    :param worker_id: The id of this worker, from 0 to 255. The default is to
+                      use the first id that is not in use by another worker.
+    """
+    max_workers = 256
+    #: The time in seconds that a forwarded request can take in addition to
+    #: the longest wait of a long-polling request, before it is abandoned.
+    timeout_margin = 5
+
+    def __init__(self, server, socket_dir, worker_id=None):
+        if worker_id is not None and \
+                not 0 <= worker_id < self.max_workers:
+            raise ValueError('The worker id must be between 0 and '
+                             f'{self.max_workers - 1}')
+        self.server = server
+        self.socket_dir = socket_dir
+        self.requested_worker_id = worker_id
+        self.worker_id = None
+        self.sock = None
+        self.lock_fd = None
+        self.task = None
+        self.lock = threading.Lock()
+
+    def socket_path(self, worker_id):
+        """Return the path of the Unix socket of a worker."""
+        return os.path.join(self.socket_dir, f'engineio-{worker_id}.sock')
+
+    def start(self):
+        """Claim a worker id and start accepting forwarded requests.
+
+        This method returns the id of the worker. It is invoked when the
+        server generates its first session id, and it does nothing if the
+        router is already started.
+        """
+        if self.sock is None:
+            with self.lock:
+                if self.sock is None:
+                    self._listen()
+                    self.task = self.server.start_background_task(
+                        self._serve)
+        return self.worker_id
+
+    def stop(self):
+        """Stop accepting forwarded requests and release the worker id."""
+        if self.sock is not None:
+            try:
+                # wake up the accept() call of the listener task
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:  # pragma: no cover
+                pass
+            self.sock.close()
+            self.task.join()
+            self._release()
+
+    def remote_owner(self, sid):
+        """Return the id of the worker that owns a session.
+
+        If the session id was not generated by a worker router, if the
+        session belongs to this worker, or if the worker that the session id
+        refers to is not running, ``None`` is returned.
+        """
+        try:
+            worker_id = base64.b64decode(
+                sid[:4].replace('_', '/').replace('-', '+'))[0]
+        except (ValueError, IndexError):
+            return None
+        if worker_id == self.worker_id or \
+                not os.path.exists(self.socket_path(worker_id)):
+            # invalid session ids are not forwarded to workers that are not
+            # running
+            return None
+        return worker_id
+
+    def forward(self, worker_id, environ, start_response):
+        """Forward a request to the worker that owns its session.
+
+        The return value is the response body, or ``None`` if the owner of
+        the session could not be reached.
+        """
+        info, length = self._request_info(environ)
+        chunks = []
+        remaining = length
+        while remaining > 0:
+            chunk = environ['wsgi.input'].read(remaining)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        body = self._request_body(info, chunks) if length else b''
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self._timeout())
+                sock.connect(self.socket_path(worker_id))
+                sock.sendall(_encode_message(info, body))
+                info, body = _read_message(sock.makefile('rb'))
+        except (OSError, ValueError) as exc:
+            self.server._log_error_once(
+                f'Cannot forward request to worker {worker_id}: {exc!r}',
+                'forward-failed')
+            return None
+        start_response(info['status'], [tuple(h) for h in info['headers']])
+        return [body]
+
+    def _timeout(self):
+        """Return the time in seconds after which a forwarded request is
+        abandoned."""
+        return self.server.ping_interval + self.server.ping_timeout + \
+            self.timeout_margin
+
+    def _request_info(self, environ):
+        """Return the information of a request that is sent to the owner of
+        its session, and the length of the body to forward.
+
+        The body is only forwarded if it is not larger than the maximum
+        allowed by the server, since the owner is going to reject it
+        otherwise.
+        """
+        info = {key: value for key, value in environ.items()
+                if (key in forwarded_keys or key.startswith('HTTP_'))
+                and isinstance(value, str)}
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        if length > self.server.max_http_buffer_size:
+            length = 0
+        return info, length
+
+    def _request_body(self, info, chunks):
+        """Return the body of a request that is sent to the owner of its
+        session.
+
+        The ``Content-Length`` sent to the owner is the length of the body
+        that was actually read, so that the owner does not wait for data
+        that is not forwarded.
+        """
+        body = b''.join(chunks)
+        info['CONTENT_LENGTH'] = str(len(body))
+        return body
+
+    def _listen(self):
+        # forwarded requests are trusted, so only the user that runs the
+        # server can be allowed to connect to the sockets of the workers
+        os.makedirs(self.socket_dir, mode=0o700, exist_ok=True)
+        if os.stat(self.socket_dir).st_uid != os.getuid():
+            raise RuntimeError(f'The socket directory {self.socket_dir} is '
+                               'not owned by the user that runs the server')
+        if self.requested_worker_id is not None:
+            worker_ids = [self.requested_worker_id]
+        else:
+            worker_ids = range(self.max_workers)
+        for worker_id in worker_ids:
+            fd = os.open(os.path.join(self.socket_dir,
+                                      f'engineio-{worker_id}.lock'),
+                         os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                continue
+            break
+        else:
+            raise RuntimeError('No worker ids are available in '
+                               + self.socket_dir)
+        path = self.socket_path(worker_id)
+        try:
+            # remove a socket left behind by a worker that ended
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+        os.chmod(path, 0o600)
+        sock.listen(128)
+        self.lock_fd = fd
+        self.worker_id = worker_id
+        self.sock = sock
+        self.server.logger.info('Worker %d is accepting forwarded requests '
+                                'at %s', worker_id, path)
+
+    def _release(self):
+        try:
+            os.unlink(self.socket_path(self.worker_id))
+        except FileNotFoundError:  # pragma: no cover
+            pass
+        os.close(self.lock_fd)
+        self.sock = None
+        self.lock_fd = None
+        self.task = None
+        self.worker_id = None
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                # the listening socket was closed by stop()
+                break
+            self.server.start_background_task(self._handle_connection, conn)
+
+    def _handle_connection(self, conn):
+        with conn:
+            try:
+                info, body = _read_message(conn.makefile('rb'))
+            except (OSError, ValueError):  # pragma: no cover
+                return
+            environ = dict(info, **{'wsgi.input': io.BytesIO(body),
+                                    'engineio.forwarded': True})
+            response = {}
+
+            def start_response(status, headers):
+                response['status'] = status
+                response['headers'] = headers
+
+            body = b''.join(self.server._handle_request(environ,
+                                                        start_response))
+            try:
+                conn.sendall(_encode_message(response, body))
+            except OSError:  # pragma: no cover
+                pass
+
+
+class AsyncWorkerRouter(WorkerRouter):
+    """Request router for an asyncio server that runs in multiple worker
+    processes.
+
+    This class has the same arguments as :class:`WorkerRouter`.
+    """
+    async def stop(self):
+        """Stop accepting forwarded requests and release the worker id.
+
+        Note: this method is a coroutine.
+        """
+        if self.sock is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.sock.close()
+            self._release()
+
+    async def forward(self, worker_id, environ):
+        """Forward a request to the worker that owns its session.
+
+        The return value is a response dictionary, or ``None`` if the owner
+        of the session could not be reached.
+
+        Note: this method is a coroutine.
+        """
+        info, length = self._request_info(environ)
+        chunks = []
+        remaining = length
+        while remaining > 0:
+            # the request body can be received in several chunks
+            chunk = await environ['wsgi.input'].read(remaining)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        body = self._request_body(info, chunks) if length else b''
+        try:
+            info, body = await asyncio.wait_for(
+                self._exchange(worker_id, info, body), self._timeout())
+        except (OSError, ValueError, asyncio.IncompleteReadError,
+                asyncio.TimeoutError) as exc:
+            self.server._log_error_once(
+                f'Cannot forward request to worker {worker_id}: {exc!r}',
+                'forward-failed')
+            return None
+        return {'status': info['status'],
+                'headers': [tuple(h) for h in info['headers']],
+                'response': body}
+
+    async def _exchange(self, worker_id, info, body):
+        reader, writer = await asyncio.open_unix_connection(
+            self.socket_path(worker_id))
+        try:
+            writer.write(_encode_message(info, body))
+            await writer.drain()
+            return await _read_message_async(reader)
+        finally:
+            writer.close()
+
+    async def _serve(self):
+        unix_server = await asyncio.start_unix_server(
+            self._handle_connection, sock=self.sock)
+        async with unix_server:
+            await unix_server.serve_forever()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            try:
+                info, body = await _read_message_async(reader)
+            except (OSError, ValueError,
+                    asyncio.IncompleteReadError):  # pragma: no cover
+                return
+            environ = dict(info, **{
+                'wsgi.input': request_body.BufferedRequestBody(body),
+                'engineio.forwarded': True})
+            response = await self.server._handle_request(environ)
+            body = response['response']
+            if not isinstance(body, bytes):
+                body = b''.join(body)
+            writer.write(_encode_message(
+                {'status': response['status'],
+                 'headers': response['headers']}, body))
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+def _encode_message(info, body):
+    info = json.dumps(info).encode('utf-8')
+    return struct.pack('!II', len(info), len(body)) + info + body
+
+
+def _decode_header(header):
+    if len(header) < 8:
+        raise ValueError('Incomplete message')
+    return struct.unpack('!II', header)
+
+
+def _read_message(rfile):
+    info_length, body_length = _decode_header(rfile.read(8))
+    info = json.loads(rfile.read(info_length))
+    body = rfile.read(body_length)
+    if len(body) < body_length:
+        raise ValueError('Incomplete message')
+    return info, body
+
+
+async def _read_message_async(reader):
+    info_length, body_length = _decode_header(await reader.readexactly(8))
+    info = json.loads(await reader.readexactly(info_length))
+    return info, await reader.readexactly(body_length)
@@ -48,12 +48,56 @@ class TestAiohttp:
             # 'HTTP_C_C': 'd,e',
             'RAW_URI': '/foo/bar?baz=1',
             'SERVER_PROTOCOL': 'HTTP/1.1',
-            'wsgi.input': b'hello world',
             'aiohttp.request': request,
         }
         for k, v in expected_environ.items():
             assert v == environ[k]
         assert environ['HTTP_C_C'] == 'd,e' or environ['HTTP_C_C'] == 'e,d'
+        assert environ['wsgi.input'].content == b'hello world'
+
+    async def test_request_body(self):
+        content = mock.MagicMock()
+        content.readany = mock.AsyncMock(side_effect=[b'hello ', b'world',
+                                                      b''])
+        body = async_aiohttp.RequestBody(content)
+        assert await body.read(3) == b'hel'
+        assert await body.read(10) == b'lo '
+        assert await body.read() == b'world'
+        assert await body.read() == b''
+        assert content.readany.await_count == 3
+
+    def test_translate_request_lazy_environ(self):
+        message = mock.MagicMock()
+        message.url = yarl.URL('https://example.com/foo?baz=1')
+        message.method = 'GET'
+        message.path = '/foo?baz=1'
+        message.version = (1, 1)
+        message.headers = mock.MagicMock()
+        message.headers.items.return_value = [('Host', 'example.com'),
+                                              ('Upgrade', 'websocket')]
+        request = Request(
+            message,
+            payload=b'',
+            protocol=mock.MagicMock(),
+            payload_writer=mock.MagicMock(),
+            task=mock.MagicMock(),
+            loop=mock.MagicMock(),
+        )
+
+        environ = async_aiohttp.translate_request(request)
+        assert environ['QUERY_STRING'] == 'baz=1'
+        message.headers.items.assert_not_called()
+        assert environ['HTTP_UPGRADE'] == 'websocket'
+        assert 'HTTP_ORIGIN' not in environ
+        message.headers.items.assert_called_once_with()
+        assert environ['wsgi.url_scheme'] == 'http'
+        assert 'HTTP_HOST' not in dict.keys(environ)
+        assert isinstance(environ, dict)
+        assert dict(environ)['HTTP_HOST'] == 'example.com'
+        assert environ.complete
+        assert environ.copy() == environ
+        assert len(environ) == 22
+        message.headers.items.assert_called_once_with()
 
     # @mock.patch('async_aiohttp.aiohttp.web.Response')
     def test_make_response(self):
@@ -63,3 +107,10 @@ class TestAiohttp:
         assert rv.status == 202
         assert rv.headers['foo'] == 'bar'
         assert rv.body == b'payload'
+
+    async def test_make_response_streamed(self):
+        rv = async_aiohttp.make_response(
+            '200 OK', {}, iter([b'foo', b'bar']), {}
+        )
+        assert rv.status == 200
+        assert [chunk async for chunk in rv.body._value] == [b'foo', b'bar']
@@ -1,4 +1,5 @@
 import os
+import sys
 from unittest import mock
 
 from engineio.async_drivers import asgi as async_asgi
@@ -496,6 +497,90 @@ class TestAsgi:
         assert environ['QUERY_STRING'] == ''
         assert environ['RAW_URI'] == '/foo/bar'
 
+    async def test_translate_request_lazy_environ(self):
+        receive = mock.AsyncMock(return_value={'type': 'http.request'})
+        send = mock.AsyncMock()
+        scope = {
+            'type': 'http',
+            'method': 'GET',
+            'headers': [
+                (b'host', b'foo'),
+                (b'c-c', b'd'),
+                (b'c-c', b'e'),
+                (b'content-length', b'0'),
+                (b'x-forwarded-proto', b'https'),
+            ],
+            'path': '/foo/bar',
+            'query_string': b'baz=1',
+        }
+        environ = await async_asgi.translate_request(scope, receive, send)
+        assert environ.headers is None
+        assert environ.get('HTTP_UPGRADE') is None
+        assert environ['HTTP_C_C'] == 'd,e'
+        assert 'HTTP_C_C' in dict.keys(environ)
+        assert 'HTTP_HOST' not in dict.keys(environ)
+        assert environ['wsgi.url_scheme'] == 'https'
+        assert 'HTTP_CONTENT_LENGTH' not in environ
+        environ['engineio.foo'] = 'bar'
+        assert isinstance(environ, dict)
+        assert not environ.complete
+
+        assert dict(environ) == {
+            'wsgi.input': environ['wsgi.input'],
+            'wsgi.errors': sys.stderr,
+            'wsgi.version': (1, 0),
+            'wsgi.async': True,
+            'wsgi.multithread': False,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+            'wsgi.url_scheme': 'https',
+            'SERVER_SOFTWARE': 'asgi',
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': '/foo/bar',
+            'QUERY_STRING': 'baz=1',
+            'RAW_URI': '/foo/bar?baz=1',
+            'SCRIPT_NAME': '',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'REMOTE_PORT': '0',
+            'SERVER_NAME': 'asgi',
+            'SERVER_PORT': '0',
+            'CONTENT_LENGTH': '0',
+            'HTTP_HOST': 'foo',
+            'HTTP_C_C': 'd,e',
+            'HTTP_X_FORWARDED_PROTO': 'https',
+            'asgi.receive': receive,
+            'asgi.send': send,
+            'asgi.scope': scope,
+            'engineio.foo': 'bar',
+        }
+        assert environ.complete
+        del environ['HTTP_HOST']
+        assert 'HTTP_HOST' not in environ
+        assert len(environ) == 26
+
+    async def test_translate_request_environ_copy(self):
+        receive = mock.AsyncMock(return_value={'type': 'http.request'})
+        scope = {'type': 'http', 'method': 'GET', 'path': '/foo',
+                 'headers': [(b'host', b'foo'), (b'cookie', b'a=b')]}
+        environ = await async_asgi.translate_request(scope, receive, None)
+        assert environ['HTTP_HOST'] == 'foo'
+        copy = environ.copy()
+        assert type(copy) is dict
+        assert copy['HTTP_COOKIE'] == 'a=b'
+        assert copy['SERVER_SOFTWARE'] == 'asgi'
+        assert copy == environ
+        assert environ == copy
+        assert not environ != copy
+        assert {**environ} == copy
+        assert environ.setdefault('HTTP_COOKIE', 'c=d') == 'a=b'
+        assert environ.setdefault('engineio.foo', 'bar') == 'bar'
+        assert environ.pop('engineio.foo') == 'bar'
+        assert 'HTTP_HOST' in repr(environ)
+        environ.clear()
+        assert environ == {}
+        assert 'HTTP_HOST' not in environ
+
     async def test_make_response(self):
         environ = {'asgi.send': mock.AsyncMock(),
                    'asgi.scope': {'type': 'http'}}
@@ -513,6 +598,20 @@ class TestAsgi:
             {'type': 'http.response.body', 'body': b'payload'}
         )
 
+    async def test_make_response_streamed(self):
+        environ = {'asgi.send': mock.AsyncMock(),
+                   'asgi.scope': {'type': 'http'}}
+        await async_asgi.make_response(
+            '200 OK', [], iter([b'foo', b'bar']), environ
+        )
+        assert environ['asgi.send'].await_args_list[1:] == [
+            mock.call({'type': 'http.response.body', 'body': b'foo',
+                       'more_body': True}),
+            mock.call({'type': 'http.response.body', 'body': b'bar',
+                       'more_body': True}),
+            mock.call({'type': 'http.response.body', 'body': b''}),
+        ]
+
     async def test_make_response_websocket_accept(self):
         environ = {
             'asgi.send': mock.AsyncMock(),
@@ -0,0 +1,28 @@
+from engineio import bench
+
+
+class TestAsyncBench:
+    def test_run(self):
+        results = bench.run(clients=5, rounds=3, use_asyncio=True)
+        assert results['clients'] == 5
+        assert results['messages'] == 5 * 3 * 4
+        assert results['requests'] == 5 + 5 * 3 * 2 + 5 * 2 + 5
+        assert results['memory_per_socket'] > 0
+        assert set(results['phases']) == {'connect', 'message', 'poll',
+                                          'ping', 'pong', 'websocket'}
+
+    def test_run_no_upgrade(self):
+        results = bench.run(clients=5, rounds=2, upgrade=False,
+                            use_asyncio=True)
+        assert results['messages'] == 5 * 2 * 2
+        assert 'disconnect' in results['phases']
+
+    async def test_echo(self):
+        generator = bench.AsyncLoadGenerator(clients=1)
+        eio = generator.create_server()
+        sid = await generator.connect(eio)
+        await generator.request(eio, 'message', 'POST', sid, '4ping')
+        assert await generator.request(eio, 'poll', 'GET', sid) == b'4ping'
+        await generator.request(eio, 'disconnect', 'POST', sid, '1')
+        assert eio.sockets[sid].closed
+        await eio.shutdown()
@@ -0,0 +1,13 @@
+from engineio import metrics
+
+
+class TestAsyncMetrics:
+    async def test_timed_async(self):
+        m = metrics.Metrics()
+
+        async def handler(x):
+            return x * 2
+
+        f = m.timed_async(handler, 'handler_duration_seconds', 'message')
+        assert await f(21) == 42
+        assert m.histograms['handler_duration_seconds', 'message'].count == 1
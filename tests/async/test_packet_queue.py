@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from engineio import packet_queue
+
+
+class TestAsyncPacketQueue:
+    async def test_drain(self):
+        q = packet_queue.AsyncPacketQueue()
+        await q.put('a')
+        q.put_nowait('b')
+        assert q.qsize() == 2
+        assert await q.drain() == ['a', 'b']
+        assert q.qsize() == 0
+
+    async def test_drain_timeout(self):
+        q = packet_queue.AsyncPacketQueue()
+        assert await q.drain(timeout=0.01) == []
+
+    async def test_drain_wait(self):
+        q = packet_queue.AsyncPacketQueue()
+
+        async def producer():
+            await asyncio.sleep(0.01)
+            await q.put('a')
+
+        task = asyncio.ensure_future(producer())
+        assert await q.drain(timeout=5) == ['a']
+        await task
+
+    async def test_lazy_event(self):
+        q = packet_queue.AsyncPacketQueue()
+        assert q.ready is None
+        q.put_nowait('a')
+        assert await q.drain() == ['a']
+        assert q.ready is None
+        assert await q.drain(timeout=0.01) == []
+        assert isinstance(q.ready, asyncio.Event)
+        q.put_nowait('b')
+        assert q.ready.is_set()
+
+    async def test_get(self):
+        q = packet_queue.AsyncPacketQueue()
+        await q.put('a')
+        await q.put('b')
+        assert await q.get() == 'a'
+        q.task_done()
+        assert q.get_nowait() == 'b'
+        with pytest.raises(asyncio.QueueEmpty):
+            q.get_nowait()
+
+    async def test_join(self):
+        q = packet_queue.AsyncPacketQueue()
+        await q.join()
+        await q.put('a')
+        await q.put(None)
+
+        async def consumer():
+            await asyncio.sleep(0.01)
+            await q.drain()
+
+        task = asyncio.ensure_future(consumer())
+        await q.join()
+        assert q.qsize() == 0
+        await task
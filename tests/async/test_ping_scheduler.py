@@ -0,0 +1,44 @@
+import asyncio
+from unittest import mock
+
+from engineio import ping_scheduler
+
+
+class TestAsyncPingScheduler:
+    def _get_mock_server(self):
+        mock_server = mock.MagicMock()
+        mock_server.ping_interval = 0.02
+        mock_server.create_event = asyncio.Event
+
+        def bg_task(target, *args, **kwargs):
+            return asyncio.ensure_future(target(*args, **kwargs))
+
+        mock_server.start_background_task = bg_task
+        return mock_server
+
+    async def test_schedule(self):
+        mock_server = self._get_mock_server()
+        scheduler = ping_scheduler.AsyncPingScheduler(mock_server)
+        sockets = [mock.MagicMock() for _ in range(3)]
+        for s in sockets:
+            s._send_ping = mock.AsyncMock()
+            scheduler.schedule(s)
+        await asyncio.sleep(0)
+        for s in sockets:
+            s._send_ping.assert_not_awaited()
+        await asyncio.sleep(0.05)
+        for s in sockets:
+            s._send_ping.assert_awaited_once_with()
+
+        # the task is idle now, so it must be woken up
+        scheduler.schedule(sockets[0])
+        await asyncio.sleep(0.05)
+        assert sockets[0]._send_ping.await_count == 2
+        await scheduler.stop()
+        assert scheduler.task is None
+
+    async def test_stop_not_started(self):
+        mock_server = self._get_mock_server()
+        scheduler = ping_scheduler.AsyncPingScheduler(mock_server)
+        await scheduler.stop()
+        assert scheduler.task is None
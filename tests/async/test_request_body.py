@@ -0,0 +1,42 @@
+from engineio import request_body
+
+
+class ChunkedRequestBody(request_body.AsyncRequestBody):
+    def __init__(self, chunks):
+        super().__init__()
+        self.chunks = iter(chunks)
+        self.receive_count = 0
+
+    async def _receive(self):
+        self.receive_count += 1
+        return next(self.chunks, None)
+
+
+class TestAsyncRequestBody:
+    async def test_read_chunks(self):
+        chunk = b'hello '
+        body = ChunkedRequestBody([chunk, b'', b'world'])
+        assert await body.read(10) is chunk
+        assert await body.read(3) == b'wor'
+        assert await body.read(3) == b'ld'
+        assert await body.read(3) == b''
+        assert await body.read() == b''
+        assert body.receive_count == 4
+
+    async def test_read_all(self):
+        body = ChunkedRequestBody([b'hello ', b'world'])
+        assert await body.read(2) == b'he'
+        assert await body.read() == b'llo world'
+        assert await body.read() == b''
+
+    async def test_read_single_chunk(self):
+        chunk = b'hello world'
+        body = ChunkedRequestBody([chunk])
+        assert await body.read() is chunk
+
+    async def test_buffered(self):
+        body = request_body.BufferedRequestBody(b'hello world')
+        assert await body.read(5) == b'hello'
+        assert await body.read() == b' world'
+        assert await body.read(5) == b''
+        assert await request_body.BufferedRequestBody(None).read() == b''
@@ -639,6 +639,16 @@ class TestAsyncServer:
         assert a._async['make_response'].call_args[0][0] == '401 UNAUTHORIZED'
         assert a._async['make_response'].call_args[0][2] == b'"Unauthorized"'
 
+    @mock.patch('importlib.import_module')
+    async def test_connect_event_rejects_flight_recorder(self, import_module):
+        a = self.get_async_mock()
+        import_module.side_effect = [a]
+        s = async_server.AsyncServer(packet_logging={'flight_recorder': 10})
+        s.on('connect')(mock.AsyncMock(return_value=False))
+        await s.handle_request('request')
+        assert len(s.sockets) == 0
+        assert s.packet_log.recordings == {}
+
     @mock.patch('importlib.import_module')
     async def test_connect_event_rejects_with_message(self, import_module):
         a = self.get_async_mock()
@@ -716,6 +726,23 @@ class TestAsyncServer:
         assert len(s.sockets) == 0
         assert a._async['make_response'].call_args[0][0] == '400 BAD REQUEST'
 
+    @mock.patch('importlib.import_module')
+    async def test_request_with_closed_sid(self, import_module):
+        for method in ['GET', 'POST']:
+            a = self.get_async_mock(
+                {'REQUEST_METHOD': method, 'QUERY_STRING': 'sid=foo'}
+            )
+            import_module.side_effect = [a]
+            s = async_server.AsyncServer()
+            s.sockets['foo'] = mock_socket = self._get_mock_socket()
+            mock_socket.closed = True
+            await s.handle_request('request')
+            assert len(s.sockets) == 0
+            assert a._async['make_response'].call_args[0][0] == \
+                '400 BAD REQUEST'
+            mock_socket.handle_get_request.assert_not_called()
+            mock_socket.handle_post_request.assert_not_called()
+
     @mock.patch('importlib.import_module')
     async def test_send(self, import_module):
         a = self.get_async_mock()
@@ -737,6 +764,37 @@ class TestAsyncServer:
         # just ensure no exceptions are raised
         await s.send('foo', 'hello')
 
+    @mock.patch('importlib.import_module')
+    async def test_send_many(self, import_module):
+        a = self.get_async_mock()
+        import_module.side_effect = [a]
+        s = async_server.AsyncServer()
+        s.sockets['foo'] = mock_socket1 = self._get_mock_socket()
+        s.sockets['bar'] = mock_socket2 = self._get_mock_socket()
+        await s.send_many(['foo', 'bar', 'baz'], b'hello')
+        pkt = mock_socket1.send.await_args[0][0]
+        assert pkt.packet_type == packet.MESSAGE
+        assert pkt.data == b'hello'
+        assert mock_socket2.send.await_args[0][0] is pkt
+
+    @mock.patch('importlib.import_module')
+    async def test_broadcast(self, import_module):
+        a = self.get_async_mock()
+        import_module.side_effect = [a]
+        s = async_server.AsyncServer()
+        s.sockets['foo'] = mock_socket1 = self._get_mock_socket()
+        s.sockets['bar'] = mock_socket2 = self._get_mock_socket()
+        s.sockets['baz'] = mock_socket3 = self._get_mock_socket()
+        await s.broadcast('hello', skip_sid='bar')
+        assert mock_socket1.send.await_count == 1
+        assert mock_socket2.send.await_count == 0
+        assert mock_socket3.send.await_args[0][0] is \
+            mock_socket1.send.await_args[0][0]
+        await s.broadcast('hello', skip_sid=['foo', 'baz'])
+        assert mock_socket1.send.await_count == 1
+        assert mock_socket2.send.await_count == 1
+        assert mock_socket3.send.await_count == 1
+
     @mock.patch('importlib.import_module')
     async def test_get_request(self, import_module):
         a = self.get_async_mock(
@@ -857,6 +915,51 @@ class TestAsyncServer:
         assert ('Content-Encoding', 'gzip') in headers
         self._gzip_decompress(a._async['make_response'].call_args[0][2])
 
+    @mock.patch('importlib.import_module')
+    async def test_streamed_response(self, import_module):
+        a = self.get_async_mock(
+            {
+                'REQUEST_METHOD': 'GET',
+                'QUERY_STRING': 'sid=foo',
+                'HTTP_ACCEPT_ENCODING': 'gzip',
+            }
+        )
+        import_module.side_effect = [a]
+        s = async_server.AsyncServer(compression_threshold=15)
+        s.sockets['foo'] = mock_socket = self._get_mock_socket()
+        mock_socket.handle_get_request.return_value = [
+            packet.Packet(packet.MESSAGE, data='hello')] * 3
+        with mock.patch.object(payload.Payload, 'chunk_size', 10):
+            await s.handle_request('request')
+            headers = a._async['make_response'].call_args[0][1]
+            assert ('Content-Encoding', 'gzip') in headers
+            response = a._async['make_response'].call_args[0][2]
+            assert not isinstance(response, bytes)
+            assert self._gzip_decompress(b''.join(response)) == \
+                b'4hello\x1e4hello\x1e4hello'
+
+    @mock.patch('importlib.import_module')
+    async def test_streamed_response_below_threshold(self, import_module):
+        a = self.get_async_mock(
+            {
+                'REQUEST_METHOD': 'GET',
+                'QUERY_STRING': 'sid=foo',
+                'HTTP_ACCEPT_ENCODING': 'gzip',
+            }
+        )
+        import_module.side_effect = [a]
+        s = async_server.AsyncServer(compression_threshold=1000)
+        s.sockets['foo'] = mock_socket = self._get_mock_socket()
+        mock_socket.handle_get_request.return_value = [
+            packet.Packet(packet.MESSAGE, data='hello')] * 3
+        with mock.patch.object(payload.Payload, 'chunk_size', 10):
+            await s.handle_request('request')
+            headers = a._async['make_response'].call_args[0][1]
+            for header, _ in headers:
+                assert header != 'Content-Encoding'
+            assert a._async['make_response'].call_args[0][2] == \
+                b'4hello\x1e4hello\x1e4hello'
+
     @mock.patch('importlib.import_module')
     async def test_deflate_compression(self, import_module):
         a = self.get_async_mock(
@@ -1023,6 +1126,28 @@ class TestAsyncServer:
         s = async_server.AsyncServer(logger=my_logger)
         assert s.logger == my_logger
 
+    async def test_websocket_compression_ignored_options(self):
+        logger = mock.MagicMock()
+        async_server.AsyncServer(async_mode='tornado', logger=logger,
+                                 websocket_compression={'level': 1})
+        logger.warning.assert_not_called()
+        async_server.AsyncServer(async_mode='tornado', logger=logger,
+                                 websocket_compression={'level': 1,
+                                                        'threshold': 100})
+        logger.warning.assert_called_once_with(
+            'The WebSocket driver of the %s async mode ignores the '
+            'WebSocket compression options: %s', 'tornado', 'threshold')
+        logger.warning.reset_mock()
+        async_server.AsyncServer(async_mode='aiohttp', logger=logger,
+                                 websocket_compression={'level': 1})
+        logger.warning.assert_called_once_with(
+            'The WebSocket driver of the %s async mode ignores the '
+            'WebSocket compression options: %s', 'aiohttp', 'level')
+        logger.warning.reset_mock()
+        async_server.AsyncServer(async_mode='aiohttp', logger=logger,
+                                 websocket_compression=False)
+        logger.warning.assert_not_called()
+
     async def test_custom_json(self):
         # Warning: this test cannot run in parallel with other tests, as it
         # changes the JSON encoding/decoding functions
@@ -1209,6 +1334,50 @@ class TestAsyncServer:
         await asyncio.sleep(0)
         s._service_task.assert_awaited_once_with()
 
+    async def test_metrics(self):
+        s = async_server.AsyncServer(async_mode='asgi', async_handlers=False,
+                                     monitor_clients=False, metrics=True)
+
+        @s.on('message')
+        async def message(sid, data):
+            await s.send(sid, data)
+
+        async def request(method, query_string, body=b''):
+            responses = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': body}
+
+            async def send(message):
+                responses.append(message)
+
+            await s.handle_request({
+                'type': 'http', 'method': method, 'path': '/engine.io/',
+                'query_string': query_string.encode(),
+                'headers': [(b'content-length', str(len(body)).encode())],
+            }, receive, send)
+            return responses[-1]['body']
+
+        r = await request('GET', 'EIO=4')
+        sid = packet.Packet(encoded_packet=r.decode()).data['sid']
+        await request('POST', 'EIO=4&sid=' + sid, b'4foo')
+        assert await request('GET', 'EIO=4&sid=' + sid) == b'4foo'
+        await request('POST', 'EIO=4&sid=' + sid, b'1')
+
+        counters = s.metrics.counters
+        assert counters['connections', 'polling'] == 1
+        assert counters['packets_received', 'polling'] == 2
+        assert counters['packets_sent', 'polling'] == 2
+        assert counters['bytes_received', 'polling'] == 5
+        assert counters['bytes_sent', 'polling'] == len(r) + 4 + 2 * 2
+        assert counters['disconnects', 'client disconnect'] == 1
+        histograms = s.metrics.histograms
+        assert histograms['request_duration_seconds', 'GET'].count == 2
+        assert histograms['request_duration_seconds', 'POST'].count == 2
+        assert histograms['poll_wait_seconds', None].count == 1
+        assert histograms['handler_duration_seconds', 'message'].count == 1
+        await s.shutdown()
+
     @mock.patch('importlib.import_module')
     async def test_shutdown(self, import_module):
         a = self.get_async_mock()
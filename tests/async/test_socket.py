@@ -6,8 +6,10 @@ import pytest
 
 from engineio import async_socket
 from engineio import exceptions
+from engineio import metrics
 from engineio import packet
 from engineio import payload
+from engineio import request_body
 
 
 class TestSocket:
@@ -24,6 +26,7 @@ class TestSocket:
         mock_server.ping_interval_grace_period = 0.001
         mock_server.async_handlers = False
         mock_server.max_http_buffer_size = 128
+        mock_server.metrics = None
         mock_server._async = {
             'asyncio': True,
             'create_route': mock.MagicMock(),
@@ -58,6 +61,17 @@ class TestSocket:
         assert hasattr(s.queue, 'put')
         assert hasattr(s.queue, 'task_done')
         assert hasattr(s.queue, 'join')
+        assert s.__dict__ == {}
+        s.foo = 'bar'
+        assert s.foo == 'bar'
+
+    async def test_lazy_session(self):
+        mock_server = self._get_mock_server()
+        s = async_socket.AsyncSocket(mock_server, 'sid')
+        assert s._session is None
+        assert s.session == {}
+        s.session = {'foo': 'bar'}
+        assert s.session == {'foo': 'bar'}
 
     async def test_empty_poll(self):
         mock_server = self._get_mock_server()
@@ -91,46 +105,35 @@ class TestSocket:
 
     async def test_schedule_ping(self):
         mock_server = self._get_mock_server()
-        mock_server.ping_interval = 0.01
         s = async_socket.AsyncSocket(mock_server, 'sid')
-        s.send = mock.AsyncMock()
-
-        async def schedule_ping_and_sleep():
-            s.schedule_ping()
-            await asyncio.sleep(0.05)
-
-        await schedule_ping_and_sleep()
-        assert s.last_ping is not None
-        assert s.send.await_args_list[0][0][0].encode() == '2'
+        s.schedule_ping()
+        assert s.last_ping is None
+        mock_server.ping_scheduler.schedule.assert_called_once_with(s)
 
     async def test_schedule_ping_twice(self):
         mock_server = self._get_mock_server()
-        mock_server.ping_interval = 0.1
         s = async_socket.AsyncSocket(mock_server, 'sid')
-        s.send = mock.AsyncMock()
-
-        async def schedule_ping_and_sleep():
-            s.schedule_ping()
-            await asyncio.sleep(0.2)
+        s.schedule_ping()
+        s.schedule_ping()
+        assert mock_server.ping_scheduler.schedule.call_count == 1
 
+    async def test_send_ping(self):
+        mock_server = self._get_mock_server()
+        s = async_socket.AsyncSocket(mock_server, 'sid')
+        s.send = mock.AsyncMock()
         s.schedule_ping()
-        assert s.last_ping is None
-        await schedule_ping_and_sleep()
+        await s._send_ping()
         assert s.last_ping is not None
-        assert s.send.await_count == 1
+        assert s.send.await_args_list[0][0][0].encode() == '2'
+        mock_server._schedule_client_check.assert_called_once_with(s)
 
-    async def test_schedule_ping_closed_socket(self):
+    async def test_send_ping_closed_socket(self):
         mock_server = self._get_mock_server()
-        mock_server.ping_interval = 0.01
         s = async_socket.AsyncSocket(mock_server, 'sid')
         s.send = mock.AsyncMock()
+        s.schedule_ping()
         s.closed = True
-
-        async def schedule_ping():
-            s.schedule_ping()
-            await asyncio.sleep(0.05)
-
-        await schedule_ping()
+        await s._send_ping()
         assert s.last_ping is None
         s.send.assert_not_awaited()
 
@@ -227,6 +230,68 @@ class TestSocket:
         with pytest.raises(exceptions.ContentTooLongError):
             await s.handle_post_request(environ)
 
+    async def test_polling_write_streamed(self):
+        mock_server = self._get_mock_server()
+        mock_server.max_http_buffer_size = 1000
+        mock_server.metrics = mock.MagicMock()
+        pkt1 = packet.Packet(packet.MESSAGE, data='hello')
+        pkt2 = packet.Packet(packet.MESSAGE, data='bye')
+        p = payload.Payload(packets=[pkt1, pkt2]).encode().encode('utf-8')
+        s = async_socket.AsyncSocket(mock_server, 'foo')
+        s.receive = mock.AsyncMock()
+        environ = {
+            'REQUEST_METHOD': 'POST',
+            'QUERY_STRING': 'sid=foo',
+            'wsgi.input': request_body.BufferedRequestBody(p),
+        }
+        await s.handle_post_request(environ)
+        assert s.receive.await_count == 2
+        mock_server.metrics.inc.assert_called_once_with(
+            'bytes_received', 'polling', len(p))
+
+    async def test_polling_write_streamed_too_large(self):
+        mock_server = self._get_mock_server()
+        pkt1 = packet.Packet(packet.MESSAGE, data='hello')
+        pkt2 = packet.Packet(packet.MESSAGE, data='bye')
+        p = payload.Payload(packets=[pkt1, pkt2]).encode().encode('utf-8')
+        mock_server.max_http_buffer_size = len(p) - 1
+        s = async_socket.AsyncSocket(mock_server, 'foo')
+        s.receive = mock.AsyncMock()
+        environ = {
+            'REQUEST_METHOD': 'POST',
+            'QUERY_STRING': 'sid=foo',
+            'wsgi.input': request_body.BufferedRequestBody(p),
+        }
+        with pytest.raises(exceptions.ContentTooLongError):
+            await s.handle_post_request(environ)
+        s.receive.assert_not_awaited()
+
+    async def test_polling_write_streamed_chunks(self):
+        mock_server = self._get_mock_server()
+        mock_server.max_http_buffer_size = 12
+        s = async_socket.AsyncSocket(mock_server, 'foo')
+        s.receive = mock.AsyncMock()
+        received = []
+
+        class Body(request_body.AsyncRequestBody):
+            chunks = [b'4hel', b'lo\x1e4by', b'e\x1e4too long']
+
+            async def _receive(self):
+                # packets are received as soon as they are complete
+                received.append(s.receive.await_count)
+                return self.chunks.pop(0) if self.chunks else None
+
+        environ = {
+            'REQUEST_METHOD': 'POST',
+            'QUERY_STRING': 'sid=foo',
+            'wsgi.input': Body(),
+        }
+        with pytest.raises(exceptions.ContentTooLongError):
+            await s.handle_post_request(environ)
+        assert received == [0, 0, 1]
+        assert [c[0][0].data for c in s.receive.await_args_list] == [
+            'hello']
+
     async def test_upgrade_handshake(self):
         mock_server = self._get_mock_server()
         s = async_socket.AsyncSocket(mock_server, 'foo')
@@ -391,6 +456,33 @@ class TestSocket:
         ws.send.assert_awaited_with('4bar')
         ws.close.assert_awaited()
 
+    async def test_websocket_upgrade_metrics(self):
+        mock_server = self._get_mock_server()
+        mock_server.metrics = metrics.Metrics()
+        s = async_socket.AsyncSocket(mock_server, 'sid')
+        s.connected = True
+        s.queue.join = mock.AsyncMock(return_value=None)
+        s.poll = mock.AsyncMock(
+            side_effect=[
+                [packet.Packet(packet.MESSAGE, data='bar')],
+                exceptions.QueueEmpty,
+            ]
+        )
+        ws = mock.MagicMock()
+        ws.send = mock.AsyncMock()
+        ws.wait = mock.AsyncMock()
+        ws.wait.side_effect = ['2probe', '5', '4foo', None]
+        ws.close = mock.AsyncMock()
+        await s._websocket_handler(ws)
+        assert mock_server.metrics.counters == {
+            ('bytes_received', 'websocket'): 11,
+            ('upgrades', None): 1,
+            ('packets_received', 'websocket'): 1,
+            ('packets_sent', 'websocket'): 1,
+            ('bytes_sent', 'websocket'): 4,
+            ('disconnects', mock_server.reason.TRANSPORT_CLOSE): 1,
+        }
+
     async def test_websocket_upgrade_with_payload(self):
         mock_server = self._get_mock_server()
         s = async_socket.AsyncSocket(mock_server, 'sid')
@@ -530,6 +622,7 @@ class TestSocket:
         s = async_socket.AsyncSocket(mock_server, 'sid')
         await s.close(wait=False)
         assert s.closed
+        mock_server._schedule_client_check.assert_called_once_with(s)
         assert mock_server._trigger_event.await_count == 1
         mock_server._trigger_event.assert_awaited_once_with(
             'disconnect', 'sid', mock_server.reason.SERVER_DISCONNECT,
@@ -538,6 +631,19 @@ class TestSocket:
         await s.close()
         assert mock_server._trigger_event.await_count == 1
 
+    async def test_close_packet_log(self):
+        mock_server = self._get_mock_server()
+        s = async_socket.AsyncSocket(mock_server, 'sid')
+        pkt = packet.Packet(packet.MESSAGE, data='foo')
+        await s.send(pkt)
+        await s.receive(packet.Packet(packet.PONG))
+        await s.close(wait=False, reason=mock_server.reason.PING_TIMEOUT)
+        mock_server.packet_log.sent.assert_any_call('sid', pkt)
+        mock_server.packet_log.received.assert_called_once_with(
+            'sid', mock.ANY)
+        mock_server.packet_log.closed.assert_called_once_with(
+            'sid', mock_server.reason.PING_TIMEOUT)
+
     async def test_close_and_wait(self):
         mock_server = self._get_mock_server()
         s = async_socket.AsyncSocket(mock_server, 'sid')
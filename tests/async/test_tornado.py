@@ -1,6 +1,7 @@
 from unittest import mock
 
 try:
+    import tornado.httputil
     import tornado.web
 except ImportError:
     pass
@@ -14,6 +15,18 @@ class TestTornado:
         handler = async_tornado.get_tornado_handler(mock_server)
         assert issubclass(handler, tornado.websocket.WebSocketHandler)
 
+    async def test_compression_options(self):
+        mock_server = mock.MagicMock()
+        handler = async_tornado.get_tornado_handler(mock_server)
+        mock_server.websocket_compression = True
+        assert handler.get_compression_options(None) == {}
+        mock_server.websocket_compression = False
+        assert handler.get_compression_options(None) is None
+        mock_server.websocket_compression = {'level': 3, 'mem_level': 5,
+                                             'threshold': 100}
+        assert handler.get_compression_options(None) == {
+            'compression_level': 3, 'mem_level': 5}
+
     async def test_translate_request(self):
         mock_handler = mock.MagicMock()
         mock_handler.request.method = 'PUT'
@@ -43,17 +56,47 @@ class TestTornado:
         }
         for k, v in expected_environ.items():
             assert v == environ[k]
+        assert isinstance(environ, dict)
+        copy = environ.copy()
+        assert type(copy) is dict
+        assert copy['HTTP_C'] == 'd'
+        assert copy['SERVER_SOFTWARE'] == 'tornado'
+        assert copy['SERVER_NAME'] == 'tornado'
         payload = await environ['wsgi.input'].read(1)
         payload += await environ['wsgi.input'].read()
         assert payload == b'hello world'
 
+    async def test_translate_request_repeated_headers(self):
+        mock_handler = mock.MagicMock()
+        mock_handler.request.path = '/foo'
+        mock_handler.request.query = ''
+        mock_handler.request.headers = tornado.httputil.HTTPHeaders()
+        mock_handler.request.headers.add('X-Foo', 'a')
+        mock_handler.request.headers.add('X-Foo', 'b')
+        mock_handler.request.headers.add('Content-Type', 'text/plain')
+        environ = async_tornado.translate_request(mock_handler)
+        assert environ['HTTP_X_FOO'] == 'a,b'
+        assert environ['CONTENT_TYPE'] == 'text/plain'
+
     async def test_make_response(self):
         mock_handler = mock.MagicMock()
         mock_environ = {'tornado.handler': mock_handler}
-        async_tornado.make_response(
+        await async_tornado.make_response(
             '202 ACCEPTED', [('foo', 'bar')], b'payload', mock_environ
         )
         mock_handler.set_status.assert_called_once_with(202)
         mock_handler.set_header.assert_called_once_with('foo', 'bar')
         mock_handler.write.assert_called_once_with(b'payload')
         mock_handler.finish.assert_called_once_with()
+
+    async def test_make_response_streamed(self):
+        mock_handler = mock.MagicMock()
+        mock_handler.flush = mock.AsyncMock()
+        mock_environ = {'tornado.handler': mock_handler}
+        await async_tornado.make_response(
+            '200 OK', [], iter([b'foo', b'bar']), mock_environ
+        )
+        assert mock_handler.write.call_args_list == [
+            mock.call(b'foo'), mock.call(b'bar')]
+        assert mock_handler.flush.await_count == 2
+        mock_handler.finish.assert_called_once_with()
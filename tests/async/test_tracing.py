@@ -0,0 +1,64 @@
+from unittest import mock
+
+from engineio import async_server
+from engineio import packet
+from engineio import tracing
+
+
+class TestAsyncTracing:
+    def setup_method(self):
+        self.hook = mock.MagicMock()
+        tracing.add_hook(self.hook)
+
+    def teardown_method(self):
+        tracing.remove_hook(self.hook)
+
+    def started(self):
+        return [c[0] for c in self.hook.start.call_args_list]
+
+    async def test_traced_async(self):
+        async def f(x):
+            return x * 2
+
+        assert await tracing.traced_async(f, 'foo', a=1)(21) == 42
+        assert self.started() == [('foo', {'a': 1})]
+        self.hook.stop.assert_called_once_with(
+            'foo', {'a': 1}, self.hook.start.return_value, None)
+
+    async def test_server(self):
+        s = async_server.AsyncServer(async_mode='asgi', async_handlers=False,
+                                     monitor_clients=False)
+
+        @s.on('message')
+        async def message(sid, data):
+            await s.send(sid, data)
+
+        async def request(method, query_string, body=b''):
+            responses = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': body}
+
+            async def send(message):
+                responses.append(message)
+
+            await s.handle_request({
+                'type': 'http', 'method': method, 'path': '/engine.io/',
+                'query_string': query_string.encode(),
+                'headers': [(b'content-length', str(len(body)).encode())],
+            }, receive, send)
+            return responses[-1]['body']
+
+        r = await request('GET', 'EIO=4')
+        sid = packet.Packet(encoded_packet=r.decode()).data['sid']
+        await request('POST', 'EIO=4&sid=' + sid, b'4foo')
+        assert await request('GET', 'EIO=4&sid=' + sid) == b'4foo'
+        started = self.started()
+        assert ('server.handle_request', {'method': 'GET', 'sid': None,
+                                          'transport': 'polling'}) in started
+        assert ('server.handle_request', {'method': 'POST', 'sid': sid,
+                                          'transport': 'polling'}) in started
+        assert ('server.trigger_event', {'event': 'message',
+                                         'sid': sid}) in started
+        assert ('socket.poll', {'sid': sid, 'transport': 'polling'}) in started
+        await s.shutdown()
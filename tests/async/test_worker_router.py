@@ -0,0 +1,109 @@
+import socket
+from unittest import mock
+
+from engineio import async_server
+from engineio import bench
+from engineio import tracing
+
+
+class TestAsyncWorkerRouter:
+    def _get_server(self, socket_dir, **kwargs):
+        eio = async_server.AsyncServer(
+            async_mode='asgi', monitor_clients=False,
+            worker_socket_dir=str(socket_dir), **kwargs)
+        eio.messages = []
+
+        @eio.on('message')
+        async def message(sid, data):
+            eio.messages.append(data)
+            await eio.send(sid, data)
+
+        return eio
+
+    async def test_forward(self, tmp_path):
+        a = self._get_server(tmp_path)
+        b = self._get_server(tmp_path)
+        assert b.worker_router.start() == 0
+        generator = bench.AsyncLoadGenerator()
+        sid = await generator.connect(a)
+        assert a.worker_router.worker_id == 1
+        await generator.request(b, None, 'POST', sid, '4hello')
+        assert a.messages == ['hello']
+        assert b.messages == []
+        assert await generator.request(b, None, 'GET', sid) == b'4hello'
+        await generator.request(b, None, 'POST', sid, '1')
+        assert a.sockets[sid].closed
+        await a.shutdown()
+        await b.shutdown()
+        assert a.worker_router.worker_id is None
+        assert b.worker_router.worker_id is None
+
+    async def test_forward_chunked_body(self, tmp_path):
+        a = self._get_server(tmp_path)
+        b = self._get_server(tmp_path)
+        sid = await bench.AsyncLoadGenerator().connect(a)
+        scope = {'type': 'http', 'method': 'POST', 'path': '/engine.io/',
+                 'query_string': b'EIO=4&transport=polling&sid='
+                 + sid.encode('utf-8'),
+                 'headers': [(b'content-length', b'13')]}
+        events = iter([
+            {'type': 'http.request', 'body': b'4hello\x1e',
+             'more_body': True},
+            {'type': 'http.request', 'body': b'4world'},
+        ])
+        response = []
+
+        async def receive():
+            return next(events)
+
+        async def send(message):
+            response.append(message)
+
+        await b.handle_request(scope, receive, send)
+        assert response[0]['status'] == 200
+        assert a.messages == ['hello', 'world']
+        await a.shutdown()
+        await b.shutdown()
+
+    async def test_forward_traced(self, tmp_path):
+        a = self._get_server(tmp_path)
+        b = self._get_server(tmp_path)
+        sid = await bench.AsyncLoadGenerator().connect(a)
+        hook = mock.MagicMock()
+        tracing.add_hook(hook)
+        try:
+            await bench.AsyncLoadGenerator().request(
+                b, None, 'POST', sid, '4hello')
+        finally:
+            tracing.remove_hook(hook)
+        # the request is traced by the worker that receives it and by the
+        # owner of the session
+        assert [c[0][0] for c in hook.start.call_args_list].count(
+            'server.handle_request') == 2
+        await a.shutdown()
+        await b.shutdown()
+
+    async def test_forward_timeout(self, tmp_path):
+        a = self._get_server(tmp_path)
+        b = self._get_server(tmp_path, ping_interval=0.1, ping_timeout=0.1)
+        b.worker_router.timeout_margin = 0
+        sid = a.generate_id()
+        await a.shutdown()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stalled:
+            # the owner accepts the connection, but it never responds
+            stalled.bind(a.worker_router.socket_path(0))
+            stalled.listen(1)
+            response = await bench.AsyncLoadGenerator().request(
+                b, None, 'GET', sid)
+        assert response == f'"Invalid session {sid}"'.encode('utf-8')
+        await b.shutdown()
+
+    async def test_forward_to_missing_worker(self, tmp_path):
+        a = self._get_server(tmp_path)
+        b = self._get_server(tmp_path)
+        generator = bench.AsyncLoadGenerator()
+        sid = await generator.connect(a)
+        await a.shutdown()
+        assert await generator.request(b, None, 'GET', sid) == \
+            f'"Invalid session {sid}"'.encode('utf-8')
+        await b.shutdown()
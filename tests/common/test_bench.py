@@ -0,0 +1,101 @@
+import json
+from unittest import mock
+
+import pytest
+
+from engineio import bench
+
+
+class TestBench:
+    def test_percentile(self):
+        assert bench.percentile([], 50) is None
+        assert bench.percentile([3, 1, 2], 0) == 1
+        assert bench.percentile([3, 1, 2], 50) == 2
+        assert bench.percentile(list(range(1, 101)), 99) == 99
+        assert bench.percentile(list(range(1, 101)), 100) == 100
+
+    def test_run(self):
+        results = bench.run(clients=5, rounds=3)
+        assert results['clients'] == 5
+        assert results['rounds'] == 3
+        assert results['messages'] == 5 * 3 * 4
+        assert results['requests'] == 5 + 5 * 3 * 2 + 5 * 2 + 5
+        assert results['memory_per_socket'] > 0
+        assert results['requests_per_second'] > 0
+        assert set(results['phases']) == {'connect', 'message', 'poll',
+                                          'ping', 'pong', 'websocket'}
+        assert results['phases']['poll']['requests'] == 15
+        for stats in results['phases'].values():
+            assert 0 < stats['p50'] <= stats['p99'] <= stats['max']
+
+    def test_run_no_upgrade(self):
+        results = bench.run(clients=5, rounds=2, upgrade=False)
+        assert results['messages'] == 5 * 2 * 2
+        assert set(results['phases']) == {'connect', 'message', 'poll',
+                                          'ping', 'pong', 'disconnect'}
+
+    def test_run_threads(self):
+        results = bench.run(clients=5, rounds=3, threads=2)
+        assert results['threads'] == 2
+        assert results['messages'] == 5 * 3 * 4
+        assert results['requests'] == 5 + 5 * 3 * 2 + 5 * 2 + 5
+        assert results['phases']['poll']['requests'] == 15
+
+    def test_run_threads_asyncio(self):
+        with pytest.raises(ValueError):
+            bench.run(clients=5, use_asyncio=True, threads=2)
+
+    def test_split_clients(self):
+        generator = bench.LoadGenerator(clients=10, threads=4)
+        assert generator.split_clients() == [3, 3, 2, 2]
+
+    def test_echo(self):
+        generator = bench.LoadGenerator(clients=1, message_size=4)
+        eio = generator.create_server()
+        sid = generator.connect(eio)
+        generator.request(eio, 'message', 'POST', sid, '4ping')
+        assert generator.request(eio, 'poll', 'GET', sid) == b'4ping'
+        generator.request(eio, 'disconnect', 'POST', sid, '1')
+        assert eio.sockets[sid].closed
+        eio.shutdown()
+
+    def test_server_options(self):
+        generator = bench.LoadGenerator(
+            server_options={'ping_interval': 10, 'max_http_buffer_size': 10})
+        eio = generator.create_server()
+        assert eio.ping_interval == 10
+        assert eio.max_http_buffer_size == 10
+        assert eio.async_handlers is False
+        eio.shutdown()
+
+    def test_main(self, capsys):
+        bench.main(['--clients', '2', '--rounds', '1'])
+        out = capsys.readouterr().out
+        assert out.startswith('2 clients, ')
+        assert 'websocket' in out
+
+    @mock.patch('engineio.bench.run')
+    def test_main_json(self, run, capsys):
+        run.return_value = {'clients': 2}
+        bench.main(['--clients', '2', '--rounds', '1', '--message-size', '8',
+                    '--no-upgrade', '--asyncio', '--json'])
+        run.assert_called_once_with(clients=2, rounds=1, message_size=8,
+                                    upgrade=False, use_asyncio=True,
+                                    threads=1)
+        assert json.loads(capsys.readouterr().out) == {'clients': 2}
+
+    @mock.patch('engineio.bench.run')
+    def test_main_scaling(self, run, capsys):
+        run.side_effect = [
+            {'clients': 4, 'threads': 1, 'gil_enabled': False,
+             'messages_per_second': 1000},
+            {'clients': 4, 'threads': 2, 'gil_enabled': False,
+             'messages_per_second': 1900},
+        ]
+        bench.main(['--clients', '4', '--threads', '1', '2'])
+        assert run.call_count == 2
+        assert run.call_args.kwargs['threads'] == 2
+        out = capsys.readouterr().out.splitlines()
+        assert out[0] == '4 clients, GIL disabled'
+        assert out[2].split() == ['1', '1000', '1.00']
+        assert out[3].split() == ['2', '1900', '1.90']
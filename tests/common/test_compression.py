@@ -0,0 +1,114 @@
+import gzip
+from unittest import mock
+import zlib
+
+import pytest
+
+from engineio import compression
+
+
+class TestCompression:
+    def test_gzip(self):
+        c = compression.GzipCompressor(level=1, strategy=zlib.Z_FILTERED)
+        assert gzip.decompress(c.compress(b'hello' * 100)) == b'hello' * 100
+
+    def test_deflate(self):
+        c = compression.DeflateCompressor()
+        assert zlib.decompress(c.compress(b'hello' * 100)) == b'hello' * 100
+
+    def test_brotli(self):
+        brotli = pytest.importorskip('brotli')
+        c = compression.BrotliCompressor(quality=1)
+        assert brotli.decompress(c.compress(b'hello' * 100)) == b'hello' * 100
+
+    def test_zstd(self):
+        zstandard = pytest.importorskip('zstandard')
+        c = compression.ZstdCompressor()
+        assert zstandard.ZstdDecompressor().decompress(
+            c.compress(b'hello' * 100)) == b'hello' * 100
+
+    def test_gzip_stream(self):
+        c = compression.GzipCompressor()
+        chunks = list(c.compress_stream([b'hello' * 100, b'world' * 100]))
+        assert len(chunks) == 3
+        # each chunk is flushed, so its data can be decompressed right away
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        assert decompressor.decompress(chunks[0]) == b'hello' * 100
+        assert gzip.decompress(b''.join(chunks)) == \
+            b'hello' * 100 + b'world' * 100
+
+    def test_deflate_stream(self):
+        c = compression.DeflateCompressor()
+        assert zlib.decompress(b''.join(c.compress_stream(
+            [b'hello' * 100, b'world']))) == b'hello' * 100 + b'world'
+
+    def test_brotli_stream(self):
+        brotli = pytest.importorskip('brotli')
+        c = compression.BrotliCompressor(quality=1)
+        assert brotli.decompress(b''.join(c.compress_stream(
+            [b'hello' * 100, b'world']))) == b'hello' * 100 + b'world'
+
+    def test_zstd_stream(self):
+        zstandard = pytest.importorskip('zstandard')
+        c = compression.ZstdCompressor()
+        assert zstandard.ZstdDecompressor().decompressobj().decompress(
+            b''.join(c.compress_stream([b'hello' * 100, b'world']))) == \
+            b'hello' * 100 + b'world'
+
+    def test_compress_stream(self):
+        c = compression.HTTPCompression(['gzip'])
+        chunks = iter([b'hello', b'world'])
+        assert c.compress_stream('br', chunks) == (None, chunks)
+        encoding, compressed = c.compress_stream('gzip', chunks)
+        assert encoding == 'gzip'
+        assert gzip.decompress(b''.join(compressed)) == b'helloworld'
+
+    def test_invalid_method(self):
+        with pytest.raises(ValueError):
+            compression.HTTPCompression(['gzip', 'foo'])
+
+    def test_missing_package(self):
+        with mock.patch.dict('sys.modules', {'zstandard': None}):
+            with pytest.raises(ValueError):
+                compression.HTTPCompression(['zstd'])
+
+    def test_options(self):
+        c = compression.HTTPCompression({'gzip': {'level': 1},
+                                         'deflate': {}})
+        assert c.compressors['gzip'].level == 1
+        assert c.compressors['deflate'].level == zlib.Z_DEFAULT_COMPRESSION
+
+    def test_select(self):
+        c = compression.HTTPCompression(['gzip', 'deflate'])
+        assert c.select('br;q=1.0, deflate;q=0.5, gzip') is \
+            c.compressors['deflate']
+        assert c.select('gzip') is c.compressors['gzip']
+        assert c.select('br') is None
+        assert c.select('') is None
+        assert c.accept_encoding_cache == {
+            'br;q=1.0, deflate;q=0.5, gzip': c.compressors['deflate'],
+            'gzip': c.compressors['gzip'],
+            'br': None,
+            '': None,
+        }
+
+    def test_select_cache_size(self):
+        c = compression.HTTPCompression(['gzip'])
+        c.accept_encoding_cache_size = 2
+        c.select('gzip')
+        c.select('gzip, br')
+        assert len(c.accept_encoding_cache) == 2
+        c.select('gzip')
+        c.select('br, gzip')
+        assert list(c.accept_encoding_cache) == ['gzip', 'br, gzip']
+
+    def test_compress(self):
+        c = compression.HTTPCompression(['gzip', 'deflate'])
+        response = b'hello' * 100
+        encoding, compressed = c.compress('deflate', response)
+        assert encoding == 'deflate'
+        assert zlib.decompress(compressed) == response
+        encoding, compressed = c.compress('gzip', response)
+        assert encoding == 'gzip'
+        assert gzip.decompress(compressed) == response
+        assert c.compress('br', response) == (None, response)
@@ -0,0 +1,77 @@
+from unittest import mock
+
+from engineio import cors
+
+
+class TestOriginPolicy:
+    def test_same_origin(self):
+        policy = cors.OriginPolicy(None)
+        assert policy.same_origin and not policy.disabled
+        environ = {'wsgi.url_scheme': 'http', 'HTTP_HOST': 'foo'}
+        assert policy.is_allowed('http://foo', environ)
+        assert not policy.is_allowed('https://foo', environ)
+        assert not policy.is_allowed('http://bar', environ)
+        assert not policy.is_allowed('foo', environ)
+        assert not policy.is_allowed('http://foo', {})
+
+    def test_same_origin_proxy_server(self):
+        policy = cors.OriginPolicy(None)
+        environ = {'wsgi.url_scheme': 'http', 'HTTP_HOST': 'foo',
+                   'HTTP_X_FORWARDED_PROTO': 'https, http',
+                   'HTTP_X_FORWARDED_HOST': 'bar , baz'}
+        assert policy.is_allowed('http://foo', environ)
+        assert policy.is_allowed('https://bar', environ)
+        assert not policy.is_allowed('https://baz', environ)
+        del environ['HTTP_X_FORWARDED_HOST']
+        assert policy.is_allowed('https://foo', environ)
+        assert not policy.is_allowed('https://bar', environ)
+
+    def test_origins(self):
+        policy = cors.OriginPolicy(['a', 'b'])
+        assert policy.origins == {'a', 'b'}
+        assert policy.is_allowed('a', {})
+        assert not policy.is_allowed('c', {})
+        policy = cors.OriginPolicy('a')
+        assert policy.origins == {'a'}
+        assert not policy.is_allowed('b', {})
+
+    def test_all_origins(self):
+        for allowed_origins in ['*', ['a', '*']]:
+            policy = cors.OriginPolicy(allowed_origins)
+            assert policy.allow_all
+            assert policy.is_allowed('c', {})
+
+    def test_disabled(self):
+        policy = cors.OriginPolicy([])
+        assert policy.disabled
+        assert not policy.is_allowed('a', {})
+
+    def test_callable(self):
+        callback = mock.MagicMock(side_effect=lambda origin, environ:
+                                  origin == environ['allowed'])
+        policy = cors.OriginPolicy(callback)
+        assert policy.is_allowed('a', {'allowed': 'a'})
+        assert not policy.is_allowed('a', {'allowed': 'b'})
+        assert callback.call_count == 2
+        assert policy.cache == {}
+
+    def test_callable_origin_only(self):
+        def callback(origin):
+            return origin == 'a'
+
+        policy = cors.OriginPolicy(callback)
+        assert policy.is_allowed('a', {})
+        assert not policy.is_allowed('b', {})
+
+    def test_callable_cache(self):
+        callback = mock.MagicMock(side_effect=lambda origin, environ:
+                                  origin != 'c')
+        policy = cors.OriginPolicy(callback, cache_size=2)
+        assert policy.is_allowed('a', {})
+        assert policy.is_allowed('b', {})
+        assert policy.is_allowed('a', {})
+        assert callback.call_count == 2
+        assert not policy.is_allowed('c', {})
+        assert list(policy.cache) == ['a', 'c']
+        assert policy.is_allowed('b', {})
+        assert callback.call_count == 4
@@ -0,0 +1,49 @@
+import pytest
+
+from engineio import json
+from engineio import json_codecs
+from engineio import packet
+
+
+class TestJSONCodecs:
+    def teardown_method(self):
+        packet.Packet.json = json
+
+    def test_get_codec_custom(self):
+        assert json_codecs.get_codec(json) == json
+        assert json_codecs.get_codec('foo') == 'foo'
+
+    @pytest.mark.parametrize('name', ['orjson', 'msgspec'])
+    def test_codec(self, name):
+        pytest.importorskip(name)
+        codec = json_codecs.get_codec(name)
+        assert codec.dumps({'a': [1, 'b']}, separators=(',', ':')) == \
+            '{"a":[1,"b"]}'
+        assert codec.dumpb({'a': [1, 'b']}) == b'{"a":[1,"b"]}'
+        assert codec.loads('{"a":[1,"b"]}') == {'a': [1, 'b']}
+        assert codec.loads('{"a":"' + '1' * 200 + '"}') == {'a': '1' * 200}
+        with pytest.raises(ValueError):
+            codec.loads('{"a":' + '1' * 5000 + '}')
+        with pytest.raises(ValueError):
+            codec.loads('{"a":')
+
+    @pytest.mark.parametrize('name', ['orjson', 'msgspec'])
+    def test_codec_stdlib_options(self, name):
+        pytest.importorskip(name)
+        codec = json_codecs.get_codec(name)
+        assert codec.dumps({'a': 1}, indent=1) == '{\n "a": 1\n}'
+        assert codec.dumps({'a': 1}, separators=(',', '=')) == '{"a"=1}'
+        assert codec.dumps({'a': {1}}, default=list) == '{"a": [1]}'
+        assert codec.loads('{"a":1.5}', parse_float=str) == {'a': '1.5'}
+
+    @pytest.mark.parametrize('name', ['orjson', 'msgspec'])
+    def test_codec_packets(self, name):
+        pytest.importorskip(name)
+        packet.Packet.json = json_codecs.get_codec(name)
+        pkt = packet.Packet(packet.MESSAGE, data={'a': 123})
+        assert pkt.encode_bytes() == b'4{"a":123}'
+        assert pkt.encode() == '4{"a":123}'
+        pkt = packet.Packet(encoded_packet='4{"a":123}')
+        assert pkt.data == {'a': 123}
+        pkt = packet.Packet(encoded_packet='4{"a":' + '1' * 5000 + '}')
+        assert pkt.data == '{"a":' + '1' * 5000 + '}'
@@ -0,0 +1,168 @@
+import math
+from unittest import mock
+
+from engineio import metrics
+
+
+class TestHistogram:
+    def test_observe(self):
+        h = metrics.Histogram(buckets=[0.1, 1])
+        h.observe(0.05)
+        h.observe(0.1)
+        h.observe(0.5)
+        h.observe(5)
+        assert h.counts == [2, 1, 1]
+        assert h.count == 4
+        assert h.sum == 5.65
+        assert h.cumulative_counts() == [(0.1, 2), (1, 3), (math.inf, 4)]
+
+    def test_merge(self):
+        h = metrics.Histogram(buckets=[0.1, 1])
+        h.observe(0.05)
+        h2 = metrics.Histogram(buckets=[0.1, 1])
+        h2.observe(0.5)
+        h2.observe(5)
+        h.merge(h2)
+        assert h.counts == [1, 1, 1]
+        assert h.count == 3
+        assert h.sum == 5.55
+
+
+class TestMetrics:
+    def test_inc(self):
+        m = metrics.Metrics()
+        m.inc('connections', 'polling')
+        m.inc('connections', 'polling')
+        m.inc('bytes_sent', 'websocket', 10)
+        m.inc('upgrades')
+        assert m.counters == {('connections', 'polling'): 2,
+                              ('bytes_sent', 'websocket'): 10,
+                              ('upgrades', None): 1}
+
+    def test_inc_from_multiple_threads(self):
+        import threading
+
+        m = metrics.Metrics()
+
+        def inc():
+            for _ in range(1000):
+                m.inc('packets_sent', 'polling')
+                m.observe('poll_wait_seconds', 0.1)
+
+        threads = [threading.Thread(target=inc) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert m.counters[('packets_sent', 'polling')] == 8000
+        assert m.histograms[('poll_wait_seconds', None)].count == 8000
+
+    def test_shards(self):
+        import threading
+
+        m = metrics.Metrics(buckets=[1])
+        m.inc('packets_sent', 'polling')
+        m.observe('poll_wait_seconds', 0.5)
+
+        def inc():
+            m.inc('packets_sent', 'polling', 2)
+            m.observe('poll_wait_seconds', 2)
+
+        t = threading.Thread(target=inc)
+        t.start()
+        t.join()
+        assert m.shards[0].counters == {('packets_sent', 'polling'): 1}
+        assert m.shards[1].counters == {('packets_sent', 'polling'): 2}
+        assert m.counters == {('packets_sent', 'polling'): 3}
+        assert m.histograms['poll_wait_seconds', None].counts == [1, 1]
+        assert m.collect()['counters'] == {('packets_sent', 'polling'): 3}
+
+    def test_observe(self):
+        m = metrics.Metrics(buckets=[1])
+        m.observe('poll_wait_seconds', 0.5)
+        m.observe('poll_wait_seconds', 2)
+        m.observe('handler_duration_seconds', 0.5, 'message')
+        assert m.histograms['poll_wait_seconds', None].counts == [1, 1]
+        assert m.histograms['handler_duration_seconds', 'message'].count == 1
+
+    def test_gauge(self):
+        m = metrics.Metrics()
+        values = [3, 5]
+        m.gauge('clients', lambda: values.pop(0), 'Connected clients.')
+        assert m.collect()['gauges'] == {'clients': 3}
+        assert m.collect()['gauges'] == {'clients': 5}
+
+    def test_timed(self):
+        m = metrics.Metrics()
+        f = m.timed(lambda x: x * 2, 'handler_duration_seconds', 'message')
+        assert f(21) == 42
+        assert m.histograms['handler_duration_seconds', 'message'].count == 1
+
+    def test_export(self):
+        exporter = mock.MagicMock()
+        m = metrics.Metrics(exporters=[exporter])
+        m.export()
+        exporter.assert_called_once_with(m)
+
+    def test_prometheus(self):
+        m = metrics.Metrics(prefix='foo', buckets=[0.5])
+        m.inc('disconnects', 'ping timeout', 0)
+        m.inc('disconnects', 'client "x"\n', 2)
+        m.inc('upgrades')
+        m.gauge('clients', lambda: 7, 'Connected clients.')
+        m.observe('request_duration_seconds', 0.25, 'GET')
+        m.observe('request_duration_seconds', 1, 'GET')
+        text = m.prometheus()
+        assert text.endswith('\n')
+        lines = text.splitlines()
+        assert '# TYPE foo_disconnects_total counter' in lines
+        assert 'foo_disconnects_total{reason="client \\"x\\"\\n"} 2' in lines
+        assert 'foo_disconnects_total{reason="ping timeout"} 0' in lines
+        assert 'foo_upgrades_total 1' in lines
+        assert '# HELP foo_clients Connected clients.' in lines
+        assert '# TYPE foo_clients gauge' in lines
+        assert 'foo_clients 7' in lines
+        assert '# TYPE foo_request_duration_seconds histogram' in lines
+        assert ('foo_request_duration_seconds_bucket{method="GET",le="0.5"} 1'
+                in lines)
+        assert ('foo_request_duration_seconds_bucket{method="GET",le="+Inf"} '
+                '2' in lines)
+        assert 'foo_request_duration_seconds_sum{method="GET"} 1.25' in lines
+        assert 'foo_request_duration_seconds_count{method="GET"} 2' in lines
+
+
+class TestStatsDExporter:
+    @mock.patch('engineio.metrics.socket.socket')
+    def test_export(self, sock):
+        exporter = metrics.StatsDExporter(host='foo', port=1234, prefix='eio')
+        m = metrics.Metrics(exporters=[exporter])
+        m.inc('disconnects', 'ping timeout', 2)
+        m.inc('upgrades', value=0)
+        m.gauge('clients', lambda: 3)
+        m.observe('poll_wait_seconds', 0.5)
+        m.export()
+        sock.return_value.sendto.assert_called_once_with(
+            b'eio.disconnects.ping_timeout:2|c\neio.clients:3|g\n'
+            b'eio.poll_wait_seconds.count:1|g\n'
+            b'eio.poll_wait_seconds.sum:0.5|g', ('foo', 1234))
+
+        # counters are sent as increments
+        sock.return_value.sendto.reset_mock()
+        m.inc('disconnects', 'ping timeout')
+        m.export()
+        assert sock.return_value.sendto.call_args[0][0].startswith(
+            b'eio.disconnects.ping_timeout:1|c\n')
+
+    @mock.patch('engineio.metrics.socket.socket')
+    def test_export_large(self, sock):
+        exporter = metrics.StatsDExporter()
+        exporter.max_packet_size = 20
+        m = metrics.Metrics(exporters=[exporter])
+        m.inc('upgrades', value=1)
+        m.inc('connections', 'polling', 1)
+        m.export()
+        assert sock.return_value.sendto.call_args_list == [
+            mock.call(b'engineio.upgrades:1|c', ('localhost', 8125)),
+            mock.call(b'engineio.connections.polling:1|c',
+                      ('localhost', 8125)),
+        ]
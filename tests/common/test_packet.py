@@ -74,6 +74,40 @@ class TestPacket:
     def test_decode_binary_bytearray_packet(self):
         pkt = packet.Packet(encoded_packet=bytearray(b'\x04\x01\x02\x03'))
         assert pkt.encode() == b'\x04\x01\x02\x03'
+        assert isinstance(pkt.data, bytes)
+
+    def test_encode_binary_memoryview_packet(self):
+        data = memoryview(b'\x01\x02\x03')
+        pkt = packet.Packet(packet.MESSAGE, data=data)
+        assert pkt.binary
+        assert pkt.encode() is data
+        assert pkt.encode(b64=True) == 'bAQID'
+
+    def test_encode_binary_memoryview_packet_with_format(self):
+        data = memoryview(bytearray(8)).cast('I')
+        pkt = packet.Packet(packet.MESSAGE, data=data)
+        assert pkt.binary
+        assert pkt.data.format == 'B'
+        assert pkt.data.obj is data.obj
+        assert len(pkt.encode()) == 8
+
+    def test_encode_binary_non_contiguous_memoryview_packet(self):
+        data = memoryview(b'abcdef')[::2]
+        pkt = packet.Packet(packet.MESSAGE, data=data)
+        assert pkt.binary
+        assert pkt.data == b'ace'
+        assert isinstance(pkt.data, bytes)
+        assert pkt.encode() == b'ace'
+        assert pkt.encode(b64=True) == 'bYWNl'
+        assert pkt.encode_bytes() == b'bYWNl'
+
+    def test_decode_binary_memoryview_packet(self):
+        data = memoryview(b'\x04\x01\x02\x03')
+        pkt = packet.Packet(encoded_packet=data)
+        assert pkt.packet_type == packet.MESSAGE
+        assert pkt.binary
+        assert pkt.data == b'\x04\x01\x02\x03'
+        assert isinstance(pkt.data, bytes)
 
     def test_decode_binary_b64_packet(self):
         pkt = packet.Packet(encoded_packet='bBAECAw==')
@@ -140,3 +174,20 @@ class TestPacket:
         assert pkt.encode() == '4123'
         pkt.encode_cache = None
         assert pkt.encode() == '4456'
+
+    def test_encode_cache_binary(self):
+        pkt = packet.Packet(packet.MESSAGE, data=b'\x01\x02\x03')
+        assert pkt.encode() == b'\x01\x02\x03'
+        assert pkt.encode(b64=True) == 'bAQID'
+        assert pkt.encode() == b'\x01\x02\x03'
+        assert pkt.encode(b64=True) == 'bAQID'
+
+    def test_encode_bytes(self):
+        pkt = packet.Packet(packet.MESSAGE, data={'a': 'b'})
+        assert pkt.encode_bytes() == b'4{"a":"b"}'
+        pkt = packet.Packet(packet.MESSAGE, data='ñ')
+        assert pkt.encode_bytes() == '4ñ'.encode('utf-8')
+        pkt = packet.Packet(packet.MESSAGE, data=b'\x01\x02\x03')
+        assert pkt.encode_bytes() == b'bAQID'
+        pkt = packet.Packet(packet.PING)
+        assert pkt.encode_bytes() == b'2'
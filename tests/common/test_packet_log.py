@@ -0,0 +1,117 @@
+import logging
+from unittest import mock
+
+from engineio import packet
+from engineio import packet_log
+
+
+class TestPacketLog:
+    def _get_logger(self, enabled=True):
+        logger = mock.MagicMock()
+        logger.isEnabledFor.return_value = enabled
+        return logger
+
+    def test_sent_received(self):
+        logger = self._get_logger()
+        log = packet_log.PacketLog(logger)
+        log.sent('sid', packet.Packet(packet.MESSAGE, data='foo'))
+        log.received('sid', packet.Packet(packet.PONG))
+        log.received('sid', packet.Packet(packet.MESSAGE, data=b'\x00\x01'))
+        log.received('sid', packet.Packet(packet.MESSAGE, data={'a': 1}))
+        logger.isEnabledFor.assert_called_with(logging.INFO)
+        assert logger.info.call_args_list == [
+            mock.call('%s: %s packet %s data %s', 'sid', 'Sending',
+                      'MESSAGE', 'foo'),
+            mock.call('%s: %s packet %s data %s', 'sid', 'Received', 'PONG',
+                      'None'),
+            mock.call('%s: %s packet %s data %s', 'sid', 'Received',
+                      'MESSAGE', '<binary 2 bytes>'),
+            mock.call('%s: %s packet %s data %s', 'sid', 'Received',
+                      'MESSAGE', "{'a': 1}"),
+        ]
+
+    def test_disabled(self):
+        logger = self._get_logger(enabled=False)
+        log = packet_log.PacketLog(logger)
+        pkt = mock.MagicMock()
+        log.sent('sid', pkt)
+        logger.info.assert_not_called()
+        pkt.encode.assert_not_called()
+        assert log.recordings == {}
+
+    def test_unknown_packet_type(self):
+        log = packet_log.PacketLog(self._get_logger())
+        assert log.packet_name(packet.Packet(packet.NOOP)) == 'NOOP'
+        assert log.packet_name(mock.MagicMock(packet_type=9)) == 'UNKNOWN'
+
+    def test_truncate(self):
+        log = packet_log.PacketLog(self._get_logger(), max_data_length=3)
+        assert log.format_data(packet.Packet(packet.MESSAGE, 'foo')) == 'foo'
+        assert log.format_data(packet.Packet(packet.MESSAGE, 'foobar')) == \
+            'foo...<6 characters>'
+        assert log.format_data(packet.Packet(packet.MESSAGE, [1, 2])) == \
+            '[1,...<6 characters>'
+
+    @mock.patch('engineio.packet_log.random.random')
+    def test_sample_rate(self, random):
+        random.side_effect = [0.3, 0.1]
+        logger = self._get_logger()
+        log = packet_log.PacketLog(logger, sample_rate=0.2)
+        log.sent('sid', packet.Packet(packet.MESSAGE, data='foo'))
+        log.sent('sid', packet.Packet(packet.MESSAGE, data='bar'))
+        logger.info.assert_called_once_with(
+            '%s: %s packet %s data %s', 'sid', 'Sending', 'MESSAGE', 'bar')
+
+    def test_flight_recorder(self):
+        logger = self._get_logger(enabled=False)
+        log = packet_log.PacketLog(logger, flight_recorder=2,
+                                   dump_reasons=['ping timeout'])
+        log.opened('sid')
+        log.opened('sid2')
+        log.sent('sid', packet.Packet(packet.MESSAGE, data='foo'))
+        log.sent('sid', packet.Packet(packet.PING))
+        log.received('sid', packet.Packet(packet.MESSAGE, data='bar'))
+        log.sent('sid2', packet.Packet(packet.MESSAGE, data='baz'))
+        logger.info.assert_not_called()
+        log.closed('sid', 'ping timeout')
+        assert list(log.recordings) == ['sid2']
+        assert logger.warning.call_count == 3
+        assert logger.warning.call_args_list[0] == mock.call(
+            '%s: Connection closed (%s), last %d packets:', 'sid',
+            'ping timeout', 2)
+        args = logger.warning.call_args_list[1][0]
+        assert args[0] == '%s: [%s] %s packet %s data %s'
+        assert args[3:] == ('Sending', 'PING', 'None')
+        args = logger.warning.call_args_list[2][0]
+        assert args[3:] == ('Received', 'MESSAGE', 'bar')
+
+    def test_flight_recorder_normal_close(self):
+        logger = self._get_logger()
+        log = packet_log.PacketLog(logger, flight_recorder=2,
+                                   dump_reasons=['ping timeout'])
+        log.opened('sid')
+        log.sent('sid', packet.Packet(packet.MESSAGE, data='foo'))
+        log.closed('sid', 'client disconnect')
+        log.closed('unknown', 'ping timeout')
+        logger.warning.assert_not_called()
+        assert log.recordings == {}
+
+    def test_flight_recorder_after_close(self):
+        log = packet_log.PacketLog(self._get_logger(), flight_recorder=2)
+        log.opened('sid')
+        log.closed('sid', 'client disconnect')
+        log.sent('sid', packet.Packet(packet.CLOSE))
+        log.received('unknown', packet.Packet(packet.MESSAGE, data='foo'))
+        assert log.recordings == {}
+
+    def test_flight_recorder_discard(self):
+        logger = self._get_logger()
+        log = packet_log.PacketLog(logger, flight_recorder=2,
+                                   dump_reasons=['ping timeout'])
+        log.opened('sid')
+        log.sent('sid', packet.Packet(packet.OPEN))
+        log.discard('sid')
+        log.discard('unknown')
+        assert log.recordings == {}
+        log.closed('sid', 'ping timeout')
+        logger.warning.assert_not_called()
@@ -0,0 +1,72 @@
+import threading
+import time
+
+import pytest
+
+from engineio import exceptions
+from engineio import packet_queue
+
+
+class TestPacketQueue:
+    def test_drain(self):
+        q = packet_queue.PacketQueue(threading.Event)
+        q.put('a')
+        q.put('b')
+        assert q.qsize() == 2
+        assert q.drain() == ['a', 'b']
+        assert q.qsize() == 0
+
+    def test_drain_timeout(self):
+        q = packet_queue.PacketQueue(threading.Event)
+        t = time.time()
+        assert q.drain(timeout=0.05) == []
+        assert time.time() - t >= 0.05
+
+    def test_drain_wait(self):
+        q = packet_queue.PacketQueue(threading.Event)
+
+        def producer():
+            time.sleep(0.05)
+            q.put('a')
+
+        th = threading.Thread(target=producer)
+        th.start()
+        assert q.drain(timeout=5) == ['a']
+        th.join()
+
+    def test_lazy_event(self):
+        q = packet_queue.PacketQueue(threading.Event)
+        assert q.ready is None
+        q.put('a')
+        assert q.drain() == ['a']
+        assert q.ready is None
+        assert q.drain(timeout=0.01) == []
+        assert isinstance(q.ready, threading.Event)
+        q.put('b')
+        assert q.ready.is_set()
+
+    def test_get(self):
+        q = packet_queue.PacketQueue(threading.Event)
+        q.put('a')
+        q.put('b')
+        assert q.get() == 'a'
+        q.task_done()
+        assert q.get() == 'b'
+        with pytest.raises(exceptions.QueueEmpty):
+            q.get(timeout=0.01)
+
+    def test_join(self):
+        q = packet_queue.PacketQueue(threading.Event)
+        q.join()
+        q.put('a')
+        q.put(None)
+
+        def consumer():
+            time.sleep(0.05)
+            q.drain()
+
+        th = threading.Thread(target=consumer)
+        th.start()
+        q.join()
+        assert q.qsize() == 0
+        th.join()
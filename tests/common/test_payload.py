@@ -53,6 +53,31 @@ class TestPayload:
         assert p.packets == [pkt]
         assert p.encode(jsonp_index=233) == '___eio[233]("4abc");'
 
+    def test_encode_payload_as_bytes(self):
+        pkt = packet.Packet(packet.MESSAGE, data='abc')
+        pkt2 = packet.Packet(packet.MESSAGE, data=b'\x03\x04\x05\x06')
+        p = payload.Payload([pkt, pkt2])
+        assert p.encode(as_bytes=True) == b'4abc\x1ebAwQFBg=='
+        assert p.encode(jsonp_index=233, as_bytes=True) == \
+            b'___eio[233]("4abc\x1ebAwQFBg==");'
+
+    def test_encode_payload_chunks(self, monkeypatch):
+        monkeypatch.setattr(payload.Payload, 'chunk_size', 8)
+        pkt = packet.Packet(packet.MESSAGE, data='abc')
+        pkt2 = packet.Packet(packet.MESSAGE, data=b'\x03\x04\x05\x06')
+        p = payload.Payload([pkt, pkt, pkt2, pkt])
+        assert list(p.encode_chunks()) == [
+            b'4abc\x1e4abc', b'\x1ebAwQFBg==', b'\x1e4abc']
+        assert b''.join(p.encode_chunks()) == p.encode(as_bytes=True)
+        assert list(p.encode_chunks(jsonp_index=233)) == [
+            b'___eio[233]("4abc\x1e4abc', b'\x1ebAwQFBg==', b'\x1e4abc");']
+        p = payload.Payload([packet.Packet(packet.MESSAGE, data='"a"')])
+        assert list(p.encode_chunks(jsonp_index=1)) == [
+            b'___eio[1]("4\\"a\\"");']
+        assert list(payload.Payload().encode_chunks()) == []
+        assert list(payload.Payload().encode_chunks(jsonp_index=1)) == [
+            b'___eio[1]("");']
+
     def test_decode_jsonp_payload(self):
         p = payload.Payload(encoded_payload='d=4abc')
         assert p.encode() == '4abc'
@@ -64,3 +89,32 @@ class TestPayload:
     def test_decode_multi_payload_with_too_many_packets(self):
         with pytest.raises(ValueError):
             payload.Payload(encoded_payload='4abc\x1e4def\x1e' * 9 + '6')
+
+    def test_decoder(self):
+        decoder = payload.PayloadDecoder()
+        assert decoder.feed(b'4ab') == []
+        pkts = decoder.feed(b'c\x1ebAwQ=\x1e4\xc3')
+        assert [pkt.data for pkt in pkts] == ['abc', b'\x03\x04']
+        pkts = decoder.feed(b'\xa9')
+        assert pkts == []
+        pkts = decoder.close()
+        assert [pkt.data for pkt in pkts] == ['\xe9']
+
+    def test_decoder_empty_payload(self):
+        decoder = payload.PayloadDecoder()
+        assert decoder.feed(b'') == []
+        assert decoder.close() == []
+
+    def test_decoder_jsonp_payload(self):
+        decoder = payload.PayloadDecoder()
+        assert decoder.feed(b'd') == []
+        assert decoder.feed(b'=4a') == []
+        assert decoder.feed(b'bc') == []
+        pkts = decoder.close()
+        assert [pkt.data for pkt in pkts] == ['abc']
+
+    def test_decoder_with_too_many_packets(self):
+        decoder = payload.PayloadDecoder(max_decode_packets=2)
+        assert len(decoder.feed(b'4abc\x1e4def\x1e')) == 2
+        with pytest.raises(ValueError):
+            decoder.close()
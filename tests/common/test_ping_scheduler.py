@@ -0,0 +1,54 @@
+import threading
+import time
+from unittest import mock
+
+from engineio import ping_scheduler
+
+
+class TestPingScheduler:
+    def _get_mock_server(self):
+        mock_server = mock.MagicMock()
+        mock_server.ping_interval = 0.05
+        mock_server.create_event = threading.Event
+
+        def bg_task(target, *args, **kwargs):
+            th = threading.Thread(target=target, args=args, kwargs=kwargs)
+            th.start()
+            return th
+
+        mock_server.start_background_task = bg_task
+        return mock_server
+
+    def test_schedule(self):
+        mock_server = self._get_mock_server()
+        scheduler = ping_scheduler.PingScheduler(mock_server)
+        sockets = [mock.MagicMock() for _ in range(3)]
+        for s in sockets:
+            scheduler.schedule(s)
+        assert scheduler.task is not None
+        time.sleep(0.01)
+        for s in sockets:
+            s._send_ping.assert_not_called()
+        for _ in range(20):
+            time.sleep(0.02)
+            if sockets[-1]._send_ping.call_count:
+                break
+        for s in sockets:
+            s._send_ping.assert_called_once_with()
+        assert len(scheduler.schedule_queue) == 0
+
+        # the task is idle now, so it must be woken up
+        scheduler.schedule(sockets[0])
+        for _ in range(20):
+            time.sleep(0.02)
+            if sockets[0]._send_ping.call_count == 2:
+                break
+        assert sockets[0]._send_ping.call_count == 2
+        scheduler.stop()
+        assert scheduler.task is None
+
+    def test_stop_not_started(self):
+        mock_server = self._get_mock_server()
+        scheduler = ping_scheduler.PingScheduler(mock_server)
+        scheduler.stop()
+        assert scheduler.task is None
@@ -0,0 +1,13 @@
+from engineio import response_headers
+
+
+class TestResponseHeaders:
+    def test_encode(self):
+        headers = response_headers.encode(
+            [response_headers.TEXT, ('Set-Cookie', 'io=foo'),
+             response_headers.CONTENT_ENCODING['gzip']])
+        assert headers == [(b'Content-Type', b'text/plain'),
+                           (b'Set-Cookie', b'io=foo'),
+                           (b'Content-Encoding', b'gzip')]
+        assert headers[0] is response_headers.encode(
+            [response_headers.TEXT])[0]
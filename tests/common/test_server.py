@@ -1,3 +1,4 @@
+import base64
 import gzip
 import importlib
 import io
@@ -11,6 +12,7 @@ import pytest
 
 from engineio import exceptions
 from engineio import json
+from engineio import metrics
 from engineio import packet
 from engineio import payload
 from engineio import server
@@ -92,6 +94,22 @@ class TestServer:
         assert s.ping_interval == 1
         assert s.ping_interval_grace_period == 2
 
+    def test_packet_logging(self):
+        s = server.Server(packet_logging={'sample_rate': 0.5,
+                                          'max_data_length': 10,
+                                          'flight_recorder': 20})
+        assert s.packet_log.logger == s.logger
+        assert s.packet_log.sample_rate == 0.5
+        assert s.packet_log.max_data_length == 10
+        assert s.packet_log.flight_recorder == 20
+        assert s.packet_log.dump_reasons == {
+            s.reason.PING_TIMEOUT, s.reason.TRANSPORT_ERROR,
+            s.reason.TRANSPORT_CLOSE}
+
+    def test_packet_logging_invalid(self):
+        with pytest.raises(ValueError):
+            server.Server(packet_logging={'foo': 'bar'})
+
     def test_create_ignores_kwargs(self):
         server.Server(foo='bar')  # this should not raise
 
@@ -275,6 +293,27 @@ class TestServer:
         s = server.Server()
         assert s.generate_id() != s.generate_id()
 
+    def test_generate_id_sequence_from_multiple_threads(self):
+        import threading
+
+        s = server.Server()
+        ids = []
+
+        def generate():
+            for _ in range(1000):
+                ids.append(s.generate_id())
+
+        threads = [threading.Thread(target=generate) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert s.sequence_number == 8000
+        sequence_numbers = {
+            base64.b64decode(id.replace('_', '/').replace('-', '+'))[12:]
+            for id in ids}
+        assert len(sequence_numbers) == 8000
+
     def test_on_event(self):
         s = server.Server()
 
@@ -408,6 +447,15 @@ class TestServer:
         with pytest.raises(KeyError):
             s._get_socket('foo')
 
+    def test_parse_query(self):
+        s = server.Server()
+        assert s._parse_query('') == {}
+        assert s._parse_query('EIO=4&transport=polling&t=123&sid=') == {
+            'EIO': '4', 'transport': 'polling'}
+        assert s._parse_query('sid=a%2Bb&sid=c&j=1&foo') == {
+            'sid': 'a+b', 'j': '1'}
+        assert s._parse_query('%73id=a+b') == {'sid': 'a b'}
+
     def test_jsonp_with_bad_index(self):
         s = server.Server()
         environ = {'REQUEST_METHOD': 'GET', 'QUERY_STRING': 'EIO=4&j=abc'}
@@ -581,6 +629,23 @@ class TestServer:
         headers = start_response.call_args[0][1]
         assert ('Access-Control-Allow-Origin', 'b') in headers
 
+    def test_change_cors_allowed_origins(self):
+        s = server.Server(cors_allowed_origins=['a', 'b'])
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'QUERY_STRING': 'EIO=4',
+            'HTTP_ORIGIN': 'c',
+        }
+        start_response = mock.MagicMock()
+        s.handle_request(environ, start_response)
+        assert start_response.call_args[0][0] == '400 BAD REQUEST'
+        s.cors_allowed_origins = ['c']
+        assert s.origin_policy.origins == {'c'}
+        s.handle_request(environ, start_response)
+        assert start_response.call_args[0][0] == '200 OK'
+        headers = start_response.call_args[0][1]
+        assert ('Access-Control-Allow-Origin', 'c') in headers
+
     def test_connect_cors_allowed_origin_with_callable(self):
         def cors(origin):
             return origin == 'a'
@@ -826,6 +891,14 @@ class TestServer:
         assert start_response.call_args[0][0] == '401 UNAUTHORIZED'
         assert ret == [b'"Unauthorized"']
 
+    def test_connect_event_rejects_flight_recorder(self):
+        s = server.Server(packet_logging={'flight_recorder': 10})
+        s.on('connect')(mock.MagicMock(return_value=False))
+        environ = {'REQUEST_METHOD': 'GET', 'QUERY_STRING': 'EIO=4'}
+        s.handle_request(environ, mock.MagicMock())
+        assert len(s.sockets) == 0
+        assert s.packet_log.recordings == {}
+
     def test_connect_event_rejects_with_message(self):
         s = server.Server()
         s.generate_id = mock.MagicMock(return_value='123')
@@ -859,6 +932,22 @@ class TestServer:
         s.handle_request(environ, start_response)
         assert start_response.call_args[0][0] == '400 BAD REQUEST'
 
+    def test_request_with_closed_sid(self):
+        s = server.Server()
+        for method in ['GET', 'POST']:
+            mock_socket = self._get_mock_socket()
+            mock_socket.closed = True
+            s.sockets['foo'] = mock_socket
+            environ = {'REQUEST_METHOD': method,
+                       'QUERY_STRING': 'EIO=4&sid=foo'}
+            start_response = mock.MagicMock()
+            r = s.handle_request(environ, start_response)
+            assert start_response.call_args[0][0] == '400 BAD REQUEST'
+            assert r == [b'"Invalid session foo"']
+            assert 'foo' not in s.sockets
+            mock_socket.handle_get_request.assert_not_called()
+            mock_socket.handle_post_request.assert_not_called()
+
     def test_send(self):
         s = server.Server()
         mock_socket = self._get_mock_socket()
@@ -873,6 +962,34 @@ class TestServer:
         # just ensure no exceptions are raised
         s.send('foo', 'hello')
 
+    def test_send_many(self):
+        s = server.Server()
+        mock_socket1 = self._get_mock_socket()
+        mock_socket2 = self._get_mock_socket()
+        s.sockets['foo'] = mock_socket1
+        s.sockets['bar'] = mock_socket2
+        s.send_many(['foo', 'bar', 'baz'], b'hello')
+        pkt = mock_socket1.send.call_args[0][0]
+        assert pkt.packet_type == packet.MESSAGE
+        assert pkt.data == b'hello'
+        assert mock_socket2.send.call_args[0][0] is pkt
+
+    def test_broadcast(self):
+        s = server.Server()
+        mock_sockets = {}
+        for sid in ['foo', 'bar', 'baz']:
+            mock_sockets[sid] = self._get_mock_socket()
+            s.sockets[sid] = mock_sockets[sid]
+        s.broadcast('hello', skip_sid='bar')
+        assert mock_sockets['foo'].send.call_count == 1
+        assert mock_sockets['bar'].send.call_count == 0
+        assert mock_sockets['baz'].send.call_args[0][0] is \
+            mock_sockets['foo'].send.call_args[0][0]
+        s.broadcast('hello', skip_sid=['foo', 'baz'])
+        assert mock_sockets['foo'].send.call_count == 1
+        assert mock_sockets['bar'].send.call_count == 1
+        assert mock_sockets['baz'].send.call_count == 1
+
     def test_get_request(self):
         s = server.Server()
         mock_socket = self._get_mock_socket()
@@ -994,6 +1111,67 @@ class TestServer:
         assert ('Content-Encoding', 'gzip') in start_response.call_args[0][1]
         self._gzip_decompress(r[0])
 
+    def test_streamed_response(self, monkeypatch):
+        monkeypatch.setattr(payload.Payload, 'chunk_size', 10)
+        s = server.Server(http_compression=False, metrics=True)
+        mock_socket = self._get_mock_socket()
+        mock_socket.handle_get_request = mock.MagicMock(
+            return_value=[packet.Packet(packet.MESSAGE, data='hello' * 3)] * 3
+        )
+        s.sockets['foo'] = mock_socket
+        environ = {'REQUEST_METHOD': 'GET', 'QUERY_STRING': 'EIO=4&sid=foo'}
+        start_response = mock.MagicMock()
+        r = s.handle_request(environ, start_response)
+        assert not isinstance(r, list)
+        assert start_response.call_args[0][0] == '200 OK'
+        assert s.metrics.counters[('bytes_sent', 'polling')] == 0
+        chunks = list(r)
+        assert len(chunks) == 3
+        assert b''.join(chunks) == b'\x1e'.join([b'4' + b'hello' * 3] * 3)
+        assert s.metrics.counters[('bytes_sent', 'polling')] == 50
+
+    def test_streamed_response_gzip(self, monkeypatch):
+        monkeypatch.setattr(payload.Payload, 'chunk_size', 10)
+        s = server.Server(compression_threshold=15, metrics=True)
+        mock_socket = self._get_mock_socket()
+        mock_socket.handle_get_request = mock.MagicMock(
+            return_value=[packet.Packet(packet.MESSAGE, data='hello')] * 3
+        )
+        s.sockets['foo'] = mock_socket
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'QUERY_STRING': 'EIO=4&sid=foo',
+            'HTTP_ACCEPT_ENCODING': 'gzip',
+        }
+        start_response = mock.MagicMock()
+        r = s.handle_request(environ, start_response)
+        assert not isinstance(r, list)
+        assert ('Content-Encoding', 'gzip') in start_response.call_args[0][1]
+        assert self._gzip_decompress(b''.join(r)) == \
+            b'4hello\x1e4hello\x1e4hello'
+
+    def test_streamed_response_below_threshold(self, monkeypatch):
+        monkeypatch.setattr(payload.Payload, 'chunk_size', 10)
+        s = server.Server(compression_threshold=1000, metrics=True)
+        mock_socket = self._get_mock_socket()
+        mock_socket.handle_get_request = mock.MagicMock(
+            return_value=[packet.Packet(packet.MESSAGE, data='hello')] * 3
+        )
+        s.sockets['foo'] = mock_socket
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'QUERY_STRING': 'EIO=4&sid=foo',
+            'HTTP_ACCEPT_ENCODING': 'gzip',
+        }
+        start_response = mock.MagicMock()
+        r = s.handle_request(environ, start_response)
+        # streamed responses are compressed only when they are at least as
+        # long as the threshold, like responses that are not streamed
+        for header, _ in start_response.call_args[0][1]:
+            assert header != 'Content-Encoding'
+        assert r == [b'4hello\x1e4hello\x1e4hello']
+        assert s.metrics.counters[('bytes_sent', 'polling')] == 20
+
     def test_deflate_compression(self):
         s = server.Server(compression_threshold=0)
         mock_socket = self._get_mock_socket()
@@ -1089,6 +1267,49 @@ class TestServer:
         with pytest.raises(IOError):
             self._gzip_decompress(r[0])
 
+    def test_compression_methods(self):
+        s = server.Server(compression_threshold=0,
+                          http_compression={'deflate': {'level': 1}})
+        mock_socket = self._get_mock_socket()
+        mock_socket.handle_get_request = mock.MagicMock(
+            return_value=[packet.Packet(packet.MESSAGE, data='hello')]
+        )
+        s.sockets['foo'] = mock_socket
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'QUERY_STRING': 'EIO=4&sid=foo',
+            'HTTP_ACCEPT_ENCODING': 'gzip,deflate',
+        }
+        start_response = mock.MagicMock()
+        r = s.handle_request(environ, start_response)
+        assert ('Content-Encoding', 'deflate') in start_response.call_args[0][
+            1
+        ]
+        assert zlib.decompress(r[0]) == b'4hello'
+
+    def test_websocket_compression_options(self):
+        s = server.Server(websocket_compression={'threshold': 100})
+        assert s.websocket_compression == {'threshold': 100}
+        with pytest.raises(ValueError):
+            server.Server(websocket_compression={'foo': 1})
+
+    def test_websocket_compression_ignored_options(self):
+        logger = mock.MagicMock()
+        server.Server(async_mode='threading', logger=logger,
+                      websocket_compression={'threshold': 100})
+        logger.warning.assert_not_called()
+        server.Server(async_mode='threading', logger=logger,
+                      websocket_compression={'level': 1, 'threshold': 100,
+                                             'mem_level': 2})
+        logger.warning.assert_called_once_with(
+            'The WebSocket driver of the %s async mode ignores the '
+            'WebSocket compression options: %s', 'threading',
+            'level, mem_level')
+
+    def test_compression_invalid_method(self):
+        with pytest.raises(ValueError):
+            server.Server(http_compression=['gzip', 'foo'])
+
     def test_cookie(self):
         s = server.Server(cookie='sid')
         s.generate_id = mock.MagicMock(return_value='123')
@@ -1214,6 +1435,86 @@ class TestServer:
             time.sleep(0.05)
         s._service_task.assert_called_once_with()
 
+    def test_claim_service_task(self):
+        s = server.Server(monitor_clients=True)
+        assert s._claim_service_task()
+        assert not s._claim_service_task()
+        s = server.Server(monitor_clients=False)
+        assert not s._claim_service_task()
+
+    def test_client_checks(self):
+        s = server.Server(monitor_clients=True, ping_timeout=0.05)
+        alive = mock.MagicMock(sid='alive', closed=False, closing=False,
+                               last_ping=1)
+        gone = mock.MagicMock(sid='gone', closed=False, closing=False,
+                              last_ping=2)
+        closed = mock.MagicMock(sid='closed', closed=True)
+        s.sockets.update({'alive': alive, 'gone': gone, 'closed': closed})
+        for c in [alive, gone, closed]:
+            s._schedule_client_check(c)
+        assert s._due_client_checks()[0] == []
+        alive.last_ping = None
+        time.sleep(0.06)
+        timed_out, timeout = s._due_client_checks()
+        assert timed_out == [gone]
+        assert timeout == 0.05
+        assert s.sockets == {'alive': alive, 'gone': gone}
+        assert len(s.client_checks) == 0
+
+    def test_client_checks_disabled(self):
+        s = server.Server(monitor_clients=False)
+        s._schedule_client_check(mock.MagicMock())
+        assert s.client_checks is None
+
+    def test_metrics_disabled(self):
+        s = server.Server()
+        assert s.metrics is None
+
+    def test_metrics_instance(self):
+        m = metrics.Metrics(prefix='foo')
+        s = server.Server(metrics=m)
+        assert s.metrics is m
+        assert m.counters['disconnects', 'ping timeout'] == 0
+
+    def test_metrics(self):
+        s = server.Server(async_mode='threading', async_handlers=False,
+                          monitor_clients=False, metrics=True)
+        s.on('message', lambda sid, data: s.send(sid, data))
+        start_response = mock.MagicMock()
+        r = s.handle_request({'REQUEST_METHOD': 'GET',
+                              'QUERY_STRING': 'EIO=4'}, start_response)
+        open_size = len(r[0])
+        sid = packet.Packet(encoded_packet=r[0].decode()).data['sid']
+        s.handle_request({'REQUEST_METHOD': 'POST',
+                          'QUERY_STRING': 'EIO=4&sid=' + sid,
+                          'CONTENT_LENGTH': '4',
+                          'wsgi.input': io.BytesIO(b'4foo')}, start_response)
+        assert s.metrics.collect()['gauges'] == {'clients': 1,
+                                                 'queued_packets': 1}
+        r = s.handle_request({'REQUEST_METHOD': 'GET',
+                              'QUERY_STRING': 'EIO=4&sid=' + sid},
+                             start_response)
+        assert r == [b'4foo']
+        s.handle_request({'REQUEST_METHOD': 'POST',
+                          'QUERY_STRING': 'EIO=4&sid=' + sid,
+                          'CONTENT_LENGTH': '1',
+                          'wsgi.input': io.BytesIO(b'1')}, start_response)
+
+        counters = s.metrics.counters
+        assert counters['connections', 'polling'] == 1
+        assert counters['packets_received', 'polling'] == 2
+        assert counters['packets_sent', 'polling'] == 2
+        assert counters['bytes_received', 'polling'] == 5
+        assert counters['bytes_sent', 'polling'] == open_size + 4 + 2 * 2
+        assert counters['disconnects', 'client disconnect'] == 1
+        assert counters['disconnects', 'ping timeout'] == 0
+        histograms = s.metrics.histograms
+        assert histograms['request_duration_seconds', 'GET'].count == 2
+        assert histograms['request_duration_seconds', 'POST'].count == 2
+        assert histograms['poll_wait_seconds', None].count == 1
+        assert histograms['handler_duration_seconds', 'message'].count == 1
+        assert ('handler_duration_seconds', 'connect') not in histograms
+
     def test_shutdown(self):
         s = server.Server(async_mode='threading', monitor_clients=True)
         environ = {'REQUEST_METHOD': 'GET', 'QUERY_STRING': 'EIO=4'}
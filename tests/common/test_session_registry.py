@@ -0,0 +1,116 @@
+import threading
+
+import pytest
+
+from engineio import session_registry
+
+
+class TestSessionRegistry:
+    def test_invalid_shards(self):
+        for shards in [0, 3, 12]:
+            with pytest.raises(ValueError):
+                session_registry.SessionRegistry(shards=shards)
+
+    def test_mapping(self):
+        r = session_registry.SessionRegistry(shards=4)
+        assert len(r) == 0
+        assert r == {}
+        for i in range(20):
+            r[f'sid{i}'] = i
+        assert len(r) == 20
+        assert 'sid5' in r
+        assert 'foo' not in r
+        assert r['sid5'] == 5
+        assert r.get('sid6') == 6
+        assert r.get('foo') is None
+        assert r.get('foo', 'bar') == 'bar'
+        with pytest.raises(KeyError):
+            r['foo']
+        assert sorted(r) == sorted(f'sid{i}' for i in range(20))
+        assert sorted(r.values()) == list(range(20))
+        assert dict(r.items()) == {f'sid{i}': i for i in range(20)}
+        assert r == {f'sid{i}': i for i in range(20)}
+        assert sum(len(shard) for shard in r.shards) == 20
+        assert len([shard for shard in r.shards if shard]) > 1
+        r['sid5'] = 'five'
+        assert len(r) == 20
+
+    def test_dict_api(self):
+        r = session_registry.SessionRegistry()
+        assert r.setdefault('a', 1) == 1
+        assert r.setdefault('a', 2) == 1
+        r.update(b=2)
+        assert len(r.keys()) == len(r.values()) == len(r.items()) == 2
+        assert 'a' in r.keys()
+        assert 2 in r.values()
+        assert ('b', 2) in r.items()
+        assert sorted(r.keys()) == ['a', 'b']
+        copy = r.copy()
+        assert copy == {'a': 1, 'b': 2}
+        assert type(copy) is dict
+        assert r.popitem() in [('a', 1), ('b', 2)]
+        assert len(r) == 1
+        r.clear()
+        assert len(r) == 0
+
+    def test_delete(self):
+        r = session_registry.SessionRegistry()
+        r.update({'a': 1, 'b': 2, 'c': 3})
+        del r['a']
+        assert r.pop('b') == 2
+        assert r.pop('b', None) is None
+        with pytest.raises(KeyError):
+            del r['a']
+        with pytest.raises(KeyError):
+            r.pop('b')
+        assert r == {'c': 3}
+        r.clear()
+        assert r == {}
+
+    def test_remove(self):
+        r = session_registry.SessionRegistry()
+        s1 = object()
+        s2 = object()
+        r['a'] = s1
+        assert not r.remove('a', s2)
+        assert r['a'] is s1
+        assert r.remove('a', s1)
+        assert 'a' not in r
+        assert not r.remove('a', s1)
+
+    def test_modify_during_iteration(self):
+        r = session_registry.SessionRegistry()
+        r.update({f'sid{i}': i for i in range(10)})
+        for sid in r:
+            del r[sid]
+        assert r == {}
+        r.update({f'sid{i}': i for i in range(10)})
+        for sid, _ in r.items():
+            r.pop(sid)
+        assert r == {}
+        assert len(r) == 0
+
+    def test_concurrent_access(self):
+        r = session_registry.SessionRegistry()
+        sockets = [object() for _ in range(8)]
+        removed = []
+
+        def worker(n):
+            socket = sockets[n]
+            for i in range(1000):
+                sid = f'{n}-{i}'
+                r[sid] = socket
+                assert r[sid] is socket
+                if i % 2:
+                    removed.append(r.remove(sid, socket))
+                    removed.append(r.remove(sid, socket))
+
+        threads = [threading.Thread(target=worker, args=(n,))
+                   for n in range(len(sockets))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(r) == 500 * len(sockets)
+        assert removed.count(True) == 500 * len(sockets)
+        assert removed.count(False) == 500 * len(sockets)
@@ -5,6 +5,7 @@ from unittest import mock
 import pytest
 
 from engineio import exceptions
+from engineio import metrics
 from engineio import packet
 from engineio import payload
 from engineio import socket
@@ -21,6 +22,8 @@ class TestSocket:
         mock_server.ping_interval_grace_period = 0.001
         mock_server.async_handlers = True
         mock_server.max_http_buffer_size = 128
+        mock_server.websocket_max_batch_bytes = None
+        mock_server.metrics = None
         mock_server.sleep = time.sleep
 
         try:
@@ -46,6 +49,8 @@ class TestSocket:
 
         mock_server.start_background_task = bg_task
         mock_server.create_queue = create_queue
+        mock_server.create_event = threading.Event
+        mock_server._lock = threading.Lock()
         mock_server.get_queue_empty_exception.return_value = queue.Empty
         return mock_server
 
@@ -64,6 +69,19 @@ class TestSocket:
         assert hasattr(s.queue, 'put')
         assert hasattr(s.queue, 'task_done')
         assert hasattr(s.queue, 'join')
+        assert s.__dict__ == {}
+        s.foo = 'bar'
+        assert s.foo == 'bar'
+
+    def test_lazy_session(self):
+        mock_server = self._get_mock_server()
+        s = socket.Socket(mock_server, 'sid')
+        assert s._session is None
+        assert s.session == {}
+        s.session['foo'] = 'bar'
+        assert s.session == {'foo': 'bar'}
+        s.session = {'bar': 'baz'}
+        assert s._session == {'bar': 'baz'}
 
     def test_empty_poll(self):
         mock_server = self._get_mock_server()
@@ -97,38 +115,35 @@ class TestSocket:
 
     def test_schedule_ping(self):
         mock_server = self._get_mock_server()
-        mock_server.ping_interval = 0.01
         s = socket.Socket(mock_server, 'sid')
-        s.send = mock.MagicMock()
         s.schedule_ping()
-        for _ in range(10):
-            time.sleep(0.05)
-            if s.last_ping is not None:
-                break
-        assert s.last_ping is not None
-        assert s.send.call_args_list[0][0][0].encode() == '2'
+        assert s.last_ping is None
+        mock_server.ping_scheduler.schedule.assert_called_once_with(s)
 
     def test_schedule_ping_twice(self):
         mock_server = self._get_mock_server()
-        mock_server.ping_interval = 0.1
         s = socket.Socket(mock_server, 'sid')
-        s.send = mock.MagicMock()
         s.schedule_ping()
-        assert s.last_ping is None
-        time.sleep(0.01)
         s.schedule_ping()
-        time.sleep(0.2)
+        assert mock_server.ping_scheduler.schedule.call_count == 1
+
+    def test_send_ping(self):
+        mock_server = self._get_mock_server()
+        s = socket.Socket(mock_server, 'sid')
+        s.send = mock.MagicMock()
+        s.schedule_ping()
+        s._send_ping()
         assert s.last_ping is not None
-        assert s.send.call_count == 1
+        assert s.send.call_args_list[0][0][0].encode() == '2'
+        mock_server._schedule_client_check.assert_called_once_with(s)
 
-    def test_schedule_ping_closed_socket(self):
+    def test_send_ping_closed_socket(self):
         mock_server = self._get_mock_server()
-        mock_server.ping_interval = 0.01
         s = socket.Socket(mock_server, 'sid')
         s.send = mock.MagicMock()
-        s.closed = True
         s.schedule_ping()
-        time.sleep(0.05)
+        s.closed = True
+        s._send_ping()
         assert s.last_ping is None
         s.send.assert_not_called()
 
@@ -156,6 +171,15 @@ class TestSocket:
             'message', 'sid', 'foo', run_async=False
         )
 
+    def test_binary_message_is_bytes(self):
+        mock_server = self._get_mock_server()
+        s = socket.Socket(mock_server, 'sid')
+        data = memoryview(bytearray(b'\x01\x02\x03'))
+        s.receive(packet.Packet(encoded_packet=data))
+        assert mock_server._trigger_event.call_args[0][2] == \
+            b'\x01\x02\x03'
+        assert isinstance(mock_server._trigger_event.call_args[0][2], bytes)
+
     def test_invalid_packet(self):
         mock_server = self._get_mock_server()
         s = socket.Socket(mock_server, 'sid')
@@ -210,6 +234,28 @@ class TestSocket:
         s.handle_post_request(environ)
         assert s.receive.call_count == 2
 
+    def test_polling_write_chunks(self):
+        mock_server = self._get_mock_server()
+        mock_server.max_http_buffer_size = 1000
+        p = payload.Payload(packets=[
+            packet.Packet(packet.MESSAGE, data='x' * 10) for _ in range(10)
+        ]).encode().encode('utf-8')
+        s = socket.Socket(mock_server, 'foo')
+        s.receive = mock.MagicMock()
+        mock_input = mock.MagicMock()
+        mock_input.read.side_effect = [p[:15], p[15:50], p[50:]]
+        environ = {
+            'REQUEST_METHOD': 'POST',
+            'QUERY_STRING': 'sid=foo',
+            'CONTENT_LENGTH': len(p),
+            'wsgi.input': mock_input,
+        }
+        with mock.patch.object(payload.PayloadDecoder, 'chunk_size', 40):
+            s.handle_post_request(environ)
+        assert mock_input.read.call_args_list == [mock.call(40)] * 3
+        assert s.receive.call_count == 10
+        assert s.receive.call_args_list[0][0][0].data == 'x' * 10
+
     def test_polling_write_too_large(self):
         mock_server = self._get_mock_server()
         pkt1 = packet.Packet(packet.MESSAGE, data='hello')
@@ -363,6 +409,30 @@ class TestSocket:
         )
         ws.send.assert_called_with('4bar')
 
+    def test_websocket_write_batches(self):
+        mock_server = self._get_mock_server()
+        mock_server.websocket_max_batch_bytes = 8
+        s = socket.Socket(mock_server, 'sid')
+        s.connected = False
+        s.queue.join = mock.MagicMock(return_value=None)
+        s.poll = mock.MagicMock(
+            side_effect=[
+                [packet.Packet(packet.MESSAGE, data=data)
+                 for data in ['foo', 'bar', 'baz', 'a-longer-message']],
+                exceptions.QueueEmpty,
+            ]
+        )
+        ws = mock.MagicMock()
+        ws.wait.side_effect = [None]
+        s._websocket_handler(ws)
+        self._join_bg_tasks()
+        ws.send.assert_not_called()
+        assert ws.send_many.call_args_list == [
+            mock.call(['4foo', '4bar']),
+            mock.call(['4baz']),
+            mock.call(['4a-longer-message']),
+        ]
+
     def test_websocket_upgrade_read_write(self):
         mock_server = self._get_mock_server()
         s = socket.Socket(mock_server, 'sid')
@@ -398,6 +468,31 @@ class TestSocket:
         )
         ws.send.assert_called_with('4bar')
 
+    def test_websocket_upgrade_metrics(self):
+        mock_server = self._get_mock_server()
+        mock_server.metrics = metrics.Metrics()
+        s = socket.Socket(mock_server, 'sid')
+        s.connected = True
+        s.queue.join = mock.MagicMock(return_value=None)
+        s.poll = mock.MagicMock(
+            side_effect=[
+                [packet.Packet(packet.MESSAGE, data='bar')],
+                exceptions.QueueEmpty,
+            ]
+        )
+        ws = mock.MagicMock()
+        ws.wait.side_effect = ['2probe', '5', '4foo', None]
+        s._websocket_handler(ws)
+        self._join_bg_tasks()
+        assert mock_server.metrics.counters == {
+            ('bytes_received', 'websocket'): 11,
+            ('upgrades', None): 1,
+            ('packets_received', 'websocket'): 1,
+            ('packets_sent', 'websocket'): 1,
+            ('bytes_sent', 'websocket'): 4,
+            ('disconnects', mock_server.reason.TRANSPORT_CLOSE): 1,
+        }
+
     def test_websocket_upgrade_with_payload(self):
         mock_server = self._get_mock_server()
         s = socket.Socket(mock_server, 'sid')
@@ -529,6 +624,7 @@ class TestSocket:
         s = socket.Socket(mock_server, 'sid')
         s.close(wait=False)
         assert s.closed
+        mock_server._schedule_client_check.assert_called_once_with(s)
         assert mock_server._trigger_event.call_count == 1
         mock_server._trigger_event.assert_called_once_with(
             'disconnect', 'sid', mock_server.reason.SERVER_DISCONNECT,
@@ -537,6 +633,20 @@ class TestSocket:
         s.close()
         assert mock_server._trigger_event.call_count == 1
 
+    def test_close_from_multiple_threads(self):
+        import threading
+
+        mock_server = self._get_mock_server()
+        s = socket.Socket(mock_server, 'sid')
+        threads = [threading.Thread(target=s.close, kwargs={'wait': False})
+                   for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert s.closed
+        assert mock_server._trigger_event.call_count == 1
+
     def test_close_and_wait(self):
         mock_server = self._get_mock_server()
         s = socket.Socket(mock_server, 'sid')
@@ -544,6 +654,19 @@ class TestSocket:
         s.close(wait=True)
         s.queue.join.assert_called_once_with()
 
+    def test_close_packet_log(self):
+        mock_server = self._get_mock_server()
+        s = socket.Socket(mock_server, 'sid')
+        pkt = packet.Packet(packet.MESSAGE, data='foo')
+        s.send(pkt)
+        s.receive(packet.Packet(packet.PONG))
+        s.close(wait=False, reason=mock_server.reason.PING_TIMEOUT)
+        mock_server.packet_log.sent.assert_any_call('sid', pkt)
+        mock_server.packet_log.received.assert_called_once_with(
+            'sid', mock.ANY)
+        mock_server.packet_log.closed.assert_called_once_with(
+            'sid', mock_server.reason.PING_TIMEOUT)
+
     def test_close_without_wait(self):
         mock_server = self._get_mock_server()
         s = socket.Socket(mock_server, 'sid')
@@ -0,0 +1,159 @@
+import io
+from unittest import mock
+
+import pytest
+
+from engineio import packet
+from engineio import payload
+from engineio import server
+from engineio import socket
+from engineio import tracing
+
+
+class RecordingHook(tracing.Hook):
+    def __init__(self):
+        self.events = []
+
+    def start(self, name, attributes):
+        self.events.append(('start', name, dict(attributes)))
+        return name + '-context'
+
+    def stop(self, name, attributes, context, error=None):
+        assert context == name + '-context'
+        self.events.append(('stop', name, dict(attributes), error))
+
+    def names(self):
+        return [event[1] for event in self.events if event[0] == 'start']
+
+
+class TestTracing:
+    def setup_method(self):
+        self.hook = RecordingHook()
+        tracing.add_hook(self.hook)
+
+    def teardown_method(self):
+        tracing.remove_hook(self.hook)
+        assert tracing.hooks == []
+
+    def test_base_hook(self):
+        hook = tracing.Hook()
+        assert hook.start('foo', {}) is None
+        assert hook.stop('foo', {}, None) is None
+
+    def test_span(self):
+        with tracing.span('foo', a=1):
+            with tracing.span('bar'):
+                pass
+        assert self.hook.events == [
+            ('start', 'foo', {'a': 1}),
+            ('start', 'bar', {}),
+            ('stop', 'bar', {}, None),
+            ('stop', 'foo', {'a': 1}, None),
+        ]
+
+    def test_span_error(self):
+        e = RuntimeError('foo')
+        with pytest.raises(RuntimeError):
+            with tracing.span('foo'):
+                raise e
+        assert self.hook.events[-1] == ('stop', 'foo', {}, e)
+
+    def test_span_hooks_snapshot(self):
+        hook2 = mock.MagicMock()
+        with tracing.span('foo'):
+            tracing.add_hook(hook2)
+        tracing.remove_hook(hook2)
+        hook2.start.assert_not_called()
+        hook2.stop.assert_not_called()
+        assert len(self.hook.events) == 2
+
+    def test_multiple_hooks(self):
+        hook2 = mock.MagicMock()
+        hook2.start.return_value = 'ctx'
+        tracing.add_hook(hook2)
+        try:
+            with tracing.span('foo', a=1):
+                pass
+        finally:
+            tracing.remove_hook(hook2)
+        hook2.start.assert_called_once_with('foo', {'a': 1})
+        hook2.stop.assert_called_once_with('foo', {'a': 1}, 'ctx', None)
+
+    def test_traced(self):
+        f = tracing.traced(lambda x: x * 2, 'foo', a=1)
+        assert f(21) == 42
+        assert self.hook.names() == ['foo']
+
+    def test_packet(self):
+        pkt = packet.Packet(packet.MESSAGE, data='foo')
+        pkt.encode()
+        pkt.encode_bytes()
+        packet.Packet(encoded_packet='4bar')
+        assert self.hook.events[0] == ('start', 'packet.encode',
+                                       {'packet_type': packet.MESSAGE})
+        assert self.hook.names() == ['packet.encode', 'packet.encode_bytes',
+                                     'packet.encode', 'packet.decode']
+        assert self.hook.events[-1] == ('stop', 'packet.decode',
+                                        {'packet_type': packet.MESSAGE}, None)
+
+    def test_payload(self):
+        p = payload.Payload(packets=[packet.Packet(packet.MESSAGE, 'foo')])
+        p.encode()
+        payload.Payload(encoded_payload='4foo')
+        decoder = payload.PayloadDecoder()
+        decoder.feed(b'4foo\x1e4bar')
+        decoder.close()
+        assert self.hook.names() == [
+            'payload.encode', 'packet.encode',
+            'payload.decode', 'packet.decode',
+            'payload.decode', 'packet.decode', 'packet.decode',
+        ]
+        assert self.hook.events[0] == ('start', 'payload.encode',
+                                       {'packets': 1})
+        assert ('start', 'payload.decode', {'size': 9}) in self.hook.events
+
+    def test_server(self):
+        s = server.Server(async_mode='threading', async_handlers=False,
+                          monitor_clients=False)
+        s.on('message', lambda sid, data: s.send(sid, data))
+        r = s.handle_request({'REQUEST_METHOD': 'GET',
+                              'QUERY_STRING': 'EIO=4'}, mock.MagicMock())
+        sid = packet.Packet(encoded_packet=r[0].decode()).data['sid']
+        assert self.hook.events[0] == (
+            'start', 'server.handle_request',
+            {'method': 'GET', 'sid': None, 'transport': 'polling'})
+        self.hook.events = []
+        s.handle_request({'REQUEST_METHOD': 'POST',
+                          'QUERY_STRING': 'EIO=4&sid=' + sid,
+                          'CONTENT_LENGTH': '4',
+                          'wsgi.input': io.BytesIO(b'4foo')},
+                         mock.MagicMock())
+        s.handle_request({'REQUEST_METHOD': 'GET',
+                          'QUERY_STRING': 'EIO=4&sid=' + sid},
+                         mock.MagicMock())
+        assert ('start', 'server.handle_request',
+                {'method': 'POST', 'sid': sid, 'transport': 'polling'}) \
+            in self.hook.events
+        assert ('start', 'server.trigger_event',
+                {'event': 'message', 'sid': sid}) in self.hook.events
+        assert ('start', 'socket.poll',
+                {'sid': sid, 'transport': 'polling'}) in self.hook.events
+        s.shutdown()
+
+    def test_websocket_write(self):
+        mock_server = mock.MagicMock()
+        mock_server.websocket_max_batch_bytes = None
+        mock_server.metrics = None
+        mock_server.start_background_task = lambda target: mock.MagicMock(
+            join=target)
+        s = socket.Socket(mock_server, 'sid')
+        s.connected = False
+        s.poll = mock.MagicMock(side_effect=[
+            [packet.Packet(packet.MESSAGE, 'foo'),
+             packet.Packet(packet.MESSAGE, 'bar')], []])
+        ws = mock.MagicMock()
+        ws.wait.return_value = None
+        s._websocket_handler(ws)
+        assert ('start', 'socket.websocket_write',
+                {'sid': 'sid', 'packets': 2}) in self.hook.events
+        assert ws.send.call_count == 2
@@ -0,0 +1,157 @@
+from unittest import mock
+
+import pytest
+import simple_websocket
+from wsproto.connection import Connection, ConnectionType
+from wsproto.events import AcceptConnection, CloseConnection
+from wsproto.frame_protocol import Opcode, RsvBits
+
+from engineio.async_drivers import _websocket_wsgi
+
+
+class TestCompression:
+    def test_get_extensions(self):
+        assert _websocket_wsgi.get_extensions(True) is None
+        assert _websocket_wsgi.get_extensions(False) == []
+        extensions = _websocket_wsgi.get_extensions(
+            {'server_max_window_bits': 12, 'threshold': 100, 'level': 1})
+        assert len(extensions) == 1
+        assert isinstance(extensions[0],
+                          _websocket_wsgi.ThresholdPerMessageDeflate)
+        assert extensions[0].server_max_window_bits == 12
+        assert extensions[0].threshold == 100
+
+    def test_threshold(self):
+        extension = _websocket_wsgi.ThresholdPerMessageDeflate(threshold=10)
+        proto = mock.MagicMock(client=False)
+        rsv = RsvBits(False, False, False)
+        assert extension.frame_outbound(proto, Opcode.TEXT, rsv, b'small',
+                                        True) == (rsv, b'small')
+        rsv, data = extension.frame_outbound(proto, Opcode.TEXT, rsv,
+                                             b'large' * 10, True)
+        assert rsv.rsv1
+        assert len(data) < 50
+
+    def test_threshold_fragmented_message(self):
+        extension = _websocket_wsgi.ThresholdPerMessageDeflate(threshold=10)
+        proto = mock.MagicMock(client=False)
+        rsv = RsvBits(False, False, False)
+        rsv, data = extension.frame_outbound(proto, Opcode.TEXT, rsv, b'a',
+                                             False)
+        assert rsv.rsv1
+
+    def test_extensions_connection(self):
+        connection = mock.MagicMock()
+        wrapper = _websocket_wsgi._ExtensionsConnection(connection, ['ext'])
+        wrapper.send(AcceptConnection(extensions=['default']))
+        assert connection.send.call_args[0][0].extensions == ['ext']
+        event = CloseConnection(code=1000)
+        assert wrapper.send(event) == connection.send.return_value
+        connection.send.assert_called_with(event)
+        assert wrapper.state == connection.state
+
+    @mock.patch.object(_websocket_wsgi.simple_websocket.Server, 'handshake',
+                       autospec=True)
+    @mock.patch.object(_websocket_wsgi.simple_websocket.Server, '__init__',
+                       return_value=None)
+    def test_websocket_server(self, init, handshake):
+        ws = _websocket_wsgi.WebSocketServer('environ', extensions=['ext'],
+                                             max_message_size=10)
+        init.assert_called_once_with('environ', max_message_size=10)
+        connection = ws.ws = mock.MagicMock()
+        wrappers = []
+        handshake.side_effect = lambda self: wrappers.append(self.ws)
+        ws.handshake()
+        assert isinstance(wrappers[0], _websocket_wsgi._ExtensionsConnection)
+        assert wrappers[0].connection is connection
+        assert wrappers[0].extensions == ['ext']
+        assert ws.ws is connection
+
+    @mock.patch.object(_websocket_wsgi.simple_websocket.Server, 'handshake',
+                       autospec=True)
+    @mock.patch.object(_websocket_wsgi.simple_websocket.Server, '__init__',
+                       return_value=None)
+    def test_websocket_server_default_extensions(self, init, handshake):
+        ws = _websocket_wsgi.WebSocketServer('environ')
+        connection = ws.ws = mock.MagicMock()
+        ws.handshake()
+        handshake.assert_called_once_with(ws)
+        assert ws.ws is connection
+
+
+class TestSimpleWebSocketWSGI:
+    def _get_websocket(self, websocket_compression=True):
+        handler = mock.MagicMock()
+        server = mock.MagicMock(websocket_compression=websocket_compression)
+        return _websocket_wsgi.SimpleWebSocketWSGI(handler, server,
+                                                   max_message_size=10)
+
+    @mock.patch('engineio.async_drivers._websocket_wsgi.WebSocketServer')
+    def test_call(self, WebSocketServer):
+        ws = self._get_websocket(websocket_compression=False)
+        WebSocketServer.return_value.mode = 'werkzeug'
+        assert ws('environ', 'start_response') == ws.app.return_value
+        WebSocketServer.assert_called_once_with(
+            'environ', extensions=[], max_message_size=10)
+        ws.app.assert_called_once_with(ws)
+
+    @mock.patch('engineio.async_drivers._websocket_wsgi.WebSocketServer')
+    def test_call_gunicorn(self, WebSocketServer):
+        ws = self._get_websocket()
+        WebSocketServer.return_value.mode = 'gunicorn'
+        with pytest.raises(StopIteration):
+            ws('environ', 'start_response')
+        WebSocketServer.assert_called_once_with(
+            'environ', extensions=None, max_message_size=10)
+
+    def test_close(self):
+        ws = self._get_websocket()
+        ws.ws = mock.MagicMock(connected=True)
+        ws.close()
+        ws.ws.close.assert_called_once_with()
+        ws.ws = mock.MagicMock(connected=False)
+        ws.close()
+        ws.ws.close.assert_not_called()
+
+    def test_send(self):
+        ws = self._get_websocket()
+        ws.ws = mock.MagicMock()
+        ws.send('foo')
+        ws.send(bytearray(b'bar'))
+        assert ws.ws.send.call_args_list == [mock.call('foo'),
+                                             mock.call(b'bar')]
+        ws.ws.send.side_effect = simple_websocket.ConnectionClosed()
+        with pytest.raises(OSError):
+            ws.send('foo')
+
+    def test_send_many(self):
+        ws = self._get_websocket()
+        ws.ws = mock.MagicMock(connected=True,
+                               ws=Connection(ConnectionType.SERVER))
+        ws.send_many(['foo', b'\x01', bytearray(b'\x02')])
+        ws.ws.sock.sendall.assert_called_once_with(
+            b'\x81\x03foo\x82\x01\x01\x82\x01\x02')
+
+    def test_send_many_closed(self):
+        ws = self._get_websocket()
+        ws.ws = mock.MagicMock(connected=False)
+        with pytest.raises(OSError):
+            ws.send_many(['foo'])
+        ws.ws.sock.sendall.assert_not_called()
+
+    def test_send_many_closing(self):
+        ws = self._get_websocket()
+        connection = Connection(ConnectionType.SERVER)
+        connection.send(CloseConnection(code=1000))
+        ws.ws = mock.MagicMock(connected=True, ws=connection)
+        with pytest.raises(OSError):
+            ws.send_many(['foo'])
+        ws.ws.sock.sendall.assert_not_called()
+
+    def test_wait(self):
+        ws = self._get_websocket()
+        ws.ws = mock.MagicMock()
+        ws.ws.receive.side_effect = [
+            'foo', simple_websocket.ConnectionClosed()]
+        assert ws.wait() == 'foo'
+        assert ws.wait() is None
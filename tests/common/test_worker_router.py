@@ -0,0 +1,192 @@
+import os
+import socket
+from unittest import mock
+
+import pytest
+
+from engineio import bench
+from engineio import server
+from engineio import tracing
+from engineio import worker_router
+
+
+class TestWorkerRouter:
+    def _get_server(self, socket_dir, **kwargs):
+        eio = server.Server(async_mode='threading', monitor_clients=False,
+                            worker_socket_dir=str(socket_dir), **kwargs)
+        eio.messages = []
+
+        @eio.on('message')
+        def message(sid, data):
+            eio.messages.append(data)
+            eio.send(sid, data)
+
+        return eio
+
+    def test_invalid_worker_id(self, tmp_path):
+        with pytest.raises(ValueError):
+            self._get_server(tmp_path, worker_id=256)
+
+    def test_worker_ids(self, tmp_path):
+        a = self._get_server(tmp_path)
+        b = self._get_server(tmp_path)
+        c = self._get_server(tmp_path, worker_id=1)
+        assert a.worker_router.start() == 0
+        assert b.worker_router.start() == 1
+        with pytest.raises(RuntimeError):
+            c.worker_router.start()
+        assert os.path.exists(a.worker_router.socket_path(0))
+        a.shutdown()
+        assert not os.path.exists(a.worker_router.socket_path(0))
+        assert a.worker_router.worker_id is None
+        b.shutdown()
+        assert c.worker_router.start() == 1
+        c.shutdown()
+
+    def test_permissions(self, tmp_path):
+        socket_dir = tmp_path / 'sockets'
+        a = self._get_server(socket_dir)
+        assert a.worker_router.start() == 0
+        assert os.stat(socket_dir).st_mode & 0o777 == 0o700
+        assert os.stat(a.worker_router.socket_path(0)).st_mode & 0o777 == \
+            0o600
+        a.shutdown()
+
+    def test_socket_dir_not_owned(self, tmp_path):
+        a = self._get_server(tmp_path)
+        with mock.patch('engineio.worker_router.os.getuid',
+                        return_value=os.getuid() + 1):
+            with pytest.raises(RuntimeError):
+                a.worker_router.start()
+        assert a.worker_router.worker_id is None
+
+    def test_remote_owner(self, tmp_path):
+        a = self._get_server(tmp_path)
+        b = self._get_server(tmp_path)
+        a_sid = a.generate_id()
+        b_sid = b.generate_id()
+        assert len(a_sid) == len(b_sid) == 20
+        assert a.worker_router.remote_owner(a_sid) is None
+        assert a.worker_router.remote_owner(b_sid) == 1
+        assert b.worker_router.remote_owner(a_sid) == 0
+        assert b.worker_router.remote_owner(b_sid) is None
+        assert a.worker_router.remote_owner('') is None
+        assert a.worker_router.remote_owner('foo') is None
+        b.shutdown()
+        # sessions of workers that are not running are not forwarded
+        assert a.worker_router.remote_owner(b_sid) is None
+        assert a.worker_router.remote_owner('BQ' + a_sid[2:]) is None
+        a.shutdown()
+
+    def test_forward(self, tmp_path):
+        a = self._get_server(tmp_path)
+        b = self._get_server(tmp_path)
+        b.worker_router.start()
+        generator = bench.LoadGenerator()
+        sid = generator.connect(a)
+        generator.request(b, None, 'POST', sid, '4hello')
+        assert a.messages == ['hello']
+        assert b.messages == []
+        assert generator.request(b, None, 'GET', sid) == b'4hello'
+        generator.request(b, None, 'POST', sid, '1')
+        assert a.sockets[sid].closed
+        a.shutdown()
+        b.shutdown()
+
+    def test_forward_headers(self, tmp_path):
+        a = self._get_server(tmp_path, cors_allowed_origins='*')
+        b = self._get_server(tmp_path, cors_allowed_origins='*')
+        sid = bench.LoadGenerator().connect(a)
+        start_response = mock.MagicMock()
+        environ = {'REQUEST_METHOD': 'GET',
+                   'QUERY_STRING': 'EIO=4&transport=polling&sid=' + sid,
+                   'HTTP_ORIGIN': 'https://example.com',
+                   'engineio.extra': object()}
+        a.send(sid, 'hello')
+        assert b.handle_request(environ, start_response) == [b'4hello']
+        status, headers = start_response.call_args[0]
+        assert status == '200 OK'
+        assert ('Access-Control-Allow-Origin',
+                'https://example.com') in headers
+        a.shutdown()
+        b.shutdown()
+
+    def test_forward_traced(self, tmp_path):
+        a = self._get_server(tmp_path)
+        b = self._get_server(tmp_path)
+        sid = bench.LoadGenerator().connect(a)
+        hook = mock.MagicMock()
+        tracing.add_hook(hook)
+        try:
+            bench.LoadGenerator().request(b, None, 'POST', sid, '4hello')
+        finally:
+            tracing.remove_hook(hook)
+        # the request is traced by the worker that receives it and by the
+        # owner of the session
+        assert [c[0][0] for c in hook.start.call_args_list].count(
+            'server.handle_request') == 2
+        a.shutdown()
+        b.shutdown()
+
+    def test_forward_to_missing_worker(self, tmp_path):
+        a = self._get_server(tmp_path)
+        b = self._get_server(tmp_path)
+        sid = bench.LoadGenerator().connect(a)
+        a.shutdown()
+        start_response = mock.MagicMock()
+        environ = {'REQUEST_METHOD': 'GET',
+                   'QUERY_STRING': 'EIO=4&transport=polling&sid=' + sid}
+        b.handle_request(environ, start_response)
+        assert start_response.call_args[0][0] == '400 BAD REQUEST'
+        b.shutdown()
+
+    def test_forward_timeout(self, tmp_path):
+        a = self._get_server(tmp_path)
+        b = self._get_server(tmp_path, ping_interval=0.1, ping_timeout=0.1)
+        b.worker_router.timeout_margin = 0
+        sid = a.generate_id()
+        a.shutdown()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stalled:
+            # the owner accepts the connection, but it never responds
+            stalled.bind(a.worker_router.socket_path(0))
+            stalled.listen(1)
+            start_response = mock.MagicMock()
+            environ = {'REQUEST_METHOD': 'GET',
+                       'QUERY_STRING': 'EIO=4&transport=polling&sid=' + sid}
+            with mock.patch.object(b, '_log_error_once') as log_error_once:
+                b.handle_request(environ, start_response)
+        assert start_response.call_args[0][0] == '400 BAD REQUEST'
+        log_error_once.assert_any_call(
+            "Cannot forward request to worker 0: TimeoutError('timed out')",
+            'forward-failed')
+        b.shutdown()
+
+    def test_forward_partial_reads(self, tmp_path):
+        a = self._get_server(tmp_path)
+        b = self._get_server(tmp_path)
+        sid = bench.LoadGenerator().connect(a)
+        body = mock.MagicMock()
+        body.read.side_effect = [b'4hello\x1e', b'4wor', b'']
+        environ = {'REQUEST_METHOD': 'POST',
+                   'QUERY_STRING': 'EIO=4&transport=polling&sid=' + sid,
+                   'CONTENT_LENGTH': '15', 'wsgi.input': body}
+        start_response = mock.MagicMock()
+        b.handle_request(environ, start_response)
+        assert start_response.call_args[0][0] == '200 OK'
+        assert body.read.call_args_list == [
+            mock.call(15), mock.call(8), mock.call(4)]
+        assert a.messages == ['hello', 'wor']
+        a.shutdown()
+        b.shutdown()
+
+    def test_request_info(self, tmp_path):
+        router = worker_router.WorkerRouter(
+            mock.MagicMock(max_http_buffer_size=10), str(tmp_path))
+        environ = {'REQUEST_METHOD': 'POST', 'CONTENT_LENGTH': '5',
+                   'HTTP_COOKIE': 'foo=bar', 'wsgi.input': object(),
+                   'wsgi.url_scheme': 'http', 'SERVER_SOFTWARE': 'test'}
+        assert router._request_info(environ) == (
+            {'REQUEST_METHOD': 'POST', 'CONTENT_LENGTH': '5',
+             'HTTP_COOKIE': 'foo=bar', 'wsgi.url_scheme': 'http'}, 5)
+        environ['CONTENT_LENGTH'] = '11'
+        assert router._request_info(environ)[1] == 0
@@ -0,0 +1,44 @@
+import time
+
+from engineio import packet, payload
+
+from benchmark import benchmark
+
+
+def _packet_roundtrip(data, b64=False):
+    def run(loops):
+        p = packet.Packet(packet.MESSAGE, data)
+        start = time.perf_counter()
+        for _ in range(loops):
+            p = packet.Packet(encoded_packet=p.encode(b64=b64))
+        return time.perf_counter() - start
+    return run
+
+
+benchmark('packet.text')(_packet_roundtrip('hello world'))
+benchmark('packet.binary')(_packet_roundtrip(b'hello world'))
+benchmark('packet.binary_b64')(_packet_roundtrip(b'hello world', b64=True))
+benchmark('packet.json')(_packet_roundtrip({'hello': 'world'}))
+
+
+@benchmark('payload.encode_decode')
+def payload_encode_decode(loops):
+    p = payload.Payload(
+        packets=[packet.Packet(packet.MESSAGE, b'hello world')] * 10)
+    start = time.perf_counter()
+    for _ in range(loops):
+        p = payload.Payload(encoded_payload=p.encode())
+    return time.perf_counter() - start
+
+
+@benchmark('payload.decoder')
+def payload_decoder(loops):
+    encoded_payload = payload.Payload(
+        packets=[packet.Packet(packet.MESSAGE, 'hello world')] * 10
+    ).encode().encode('utf-8')
+    start = time.perf_counter()
+    for _ in range(loops):
+        decoder = payload.PayloadDecoder()
+        decoder.feed(encoded_payload)
+        decoder.close()
+    return time.perf_counter() - start
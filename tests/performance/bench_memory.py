@@ -0,0 +1,16 @@
+import asyncio
+
+from engineio import bench
+
+from benchmark import memory_benchmark
+
+
+@memory_benchmark('memory.server_connection')
+def server_connection(connections):
+    return bench.LoadGenerator(clients=connections).measure_memory()
+
+
+@memory_benchmark('memory.async_server_connection')
+def async_server_connection(connections):
+    return asyncio.run(
+        bench.AsyncLoadGenerator(clients=connections).measure_memory())
@@ -0,0 +1,106 @@
+import asyncio
+import io
+import time
+
+import engineio
+from engineio import packet
+
+from benchmark import benchmark
+
+
+def _start_response(status, headers):
+    pass
+
+
+def _connect(eio):
+    response = eio.handle_request({
+        'REQUEST_METHOD': 'GET',
+        'QUERY_STRING': 'EIO=4&transport=polling',
+    }, _start_response)
+    return packet.Packet(encoded_packet=response[0].decode()).data['sid']
+
+
+def _post(eio, sid, body):
+    eio.handle_request({
+        'REQUEST_METHOD': 'POST',
+        'QUERY_STRING': 'EIO=4&transport=polling&sid=' + sid,
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+    }, _start_response)
+
+
+@benchmark('server.polling_get')
+def polling_get(loops):
+    eio = engineio.Server(async_mode='threading', monitor_clients=False)
+    sid = _connect(eio)
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'QUERY_STRING': 'EIO=4&transport=polling&sid=' + sid,
+    }
+    start = time.perf_counter()
+    for _ in range(loops):
+        # queue a packet, so that the GET request returns immediately
+        eio.send(sid, 'hello')
+        eio.handle_request(environ, _start_response)
+    elapsed = time.perf_counter() - start
+    eio.shutdown()
+    return elapsed
+
+
+@benchmark('server.polling_post')
+def polling_post(loops):
+    eio = engineio.Server(async_mode='threading', monitor_clients=False)
+    sid = _connect(eio)
+    start = time.perf_counter()
+    for _ in range(loops):
+        _post(eio, sid, b'4hello\x1e4world')
+    elapsed = time.perf_counter() - start
+    eio.shutdown()
+    return elapsed
+
+
+@benchmark('server.connect_disconnect')
+def connect_disconnect(loops):
+    eio = engineio.Server(async_mode='threading', monitor_clients=False)
+    start = time.perf_counter()
+    for _ in range(loops):
+        # the client sends a CLOSE packet to disconnect
+        _post(eio, _connect(eio), b'1')
+    elapsed = time.perf_counter() - start
+    eio.shutdown()
+    return elapsed
+
+
+@benchmark('async_server.polling_post')
+def async_polling_post(loops):
+    async def run():
+        eio = engineio.AsyncServer(async_mode='asgi', monitor_clients=False)
+        body = b'4hello\x1e4world'
+        responses = []
+
+        async def send(message):
+            responses.append(message)
+
+        async def receive():
+            return {'type': 'http.request', 'body': body}
+
+        await eio.handle_request({
+            'type': 'http', 'method': 'GET', 'path': '/engine.io/',
+            'query_string': b'EIO=4&transport=polling', 'headers': [],
+        }, receive, send)
+        sid = packet.Packet(
+            encoded_packet=responses[-1]['body'].decode()).data['sid']
+        scope = {
+            'type': 'http', 'method': 'POST', 'path': '/engine.io/',
+            'query_string': f'EIO=4&transport=polling&sid={sid}'.encode(),
+            'headers': [(b'content-length', str(len(body)).encode())],
+        }
+        start = time.perf_counter()
+        for _ in range(loops):
+            await eio.handle_request(scope, receive, send)
+        elapsed = time.perf_counter() - start
+        responses.clear()
+        await eio.shutdown()
+        return elapsed
+
+    return asyncio.run(run())
@@ -0,0 +1,52 @@
+import time
+
+import engineio
+
+from benchmark import benchmark
+
+MESSAGES = 100
+
+
+class LoopbackWebSocket:
+    """Stand-in for a WebSocket connection, which delivers a fixed list of
+    messages to the server and collects the messages sent back."""
+    def __init__(self, handler, server):
+        self.handler = handler
+        self.incoming = iter(['4hello'] * MESSAGES)
+        self.sent = []
+
+    def __call__(self, environ, start_response):
+        return self.handler(self)
+
+    def wait(self):
+        return next(self.incoming, None)
+
+    def send(self, message):
+        self.sent.append(message)
+
+    def close(self):
+        pass
+
+
+@benchmark(f'websocket.echo_{MESSAGES}')
+def websocket_echo(loops):
+    eio = engineio.Server(async_mode='threading', async_handlers=False,
+                          monitor_clients=False)
+    eio._async = dict(eio._async, websocket=LoopbackWebSocket)
+
+    @eio.on('message')
+    def message(sid, data):
+        eio.send(sid, data)
+
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'QUERY_STRING': 'EIO=4&transport=websocket',
+        'HTTP_CONNECTION': 'Upgrade',
+        'HTTP_UPGRADE': 'websocket',
+    }
+    start = time.perf_counter()
+    for _ in range(loops):
+        eio.handle_request(environ, lambda status, headers: None)
+    elapsed = time.perf_counter() - start
+    eio.shutdown()
+    return elapsed
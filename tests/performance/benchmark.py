@@ -0,0 +1,154 @@
+"""Engine.IO benchmark suite.
+
+Usage: python benchmark.py [options]
+
+Each benchmark is a function that receives a number of loops and returns the
+time in seconds it took to run them. The runner calibrates the number of
+loops, performs warmup runs, and then collects timings for several runs.
+Memory benchmarks receive a number of connections and return the number of
+bytes allocated for each one. The results can be written to a JSON file, and
+compared against the results of a previous run, in which case the exit code
+is 1 if any of the benchmarks is slower, or uses more memory, than allowed.
+"""
+import argparse
+import importlib.metadata
+import json
+import platform
+import statistics
+import sys
+import time
+
+benchmarks = {}
+memory_benchmarks = {}
+
+
+def benchmark(name):
+    """Decorator that registers a benchmark function."""
+    def decorator(f):
+        benchmarks[name] = f
+        return f
+    return decorator
+
+
+def memory_benchmark(name):
+    """Decorator that registers a memory benchmark function."""
+    def decorator(f):
+        memory_benchmarks[name] = f
+        return f
+    return decorator
+
+
+def measure(func, runs=5, warmups=1, min_time=0.2):
+    """Measure a benchmark function.
+
+    The number of loops is doubled until a run takes at least ``min_time``
+    seconds. The return value is a dictionary with statistics of the time it
+    takes to run a single loop, in seconds.
+    """
+    loops = 1
+    while func(loops) < min_time:
+        loops *= 2
+    for _ in range(warmups):
+        func(loops)
+    timings = [func(loops) / loops for _ in range(runs)]
+    median = statistics.median(timings)
+    return {
+        'loops': loops,
+        'runs': runs,
+        'mean': statistics.mean(timings),
+        'median': median,
+        'min': min(timings),
+        'max': max(timings),
+        'stdev': statistics.stdev(timings) if runs > 1 else 0.0,
+        'ops_per_sec': 1 / median,
+    }
+
+
+def compare(results, baseline, max_regression):
+    """Compare results against a baseline.
+
+    Returns a list of ``(name, change)`` tuples for the benchmarks with a
+    median time, or memory usage, that increased by more than
+    ``max_regression`` percent.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        key = 'median' if 'median' in result else 'bytes'
+        change = (result[key] / baseline[name][key] - 1) * 100
+        if change > max_regression:
+            regressions.append((name, change))
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Engine.IO benchmarks.')
+    parser.add_argument('-k', '--filter', default='',
+                        help='only run benchmarks that contain this text')
+    parser.add_argument('-o', '--output',
+                        help='write the results to this JSON file')
+    parser.add_argument('-b', '--baseline',
+                        help='JSON file with results to compare against')
+    parser.add_argument('--max-regression', type=float, default=10.0,
+                        help='maximum allowed slowdown against the baseline, '
+                             'in percent (default: 10)')
+    parser.add_argument('--runs', type=int, default=5,
+                        help='number of measured runs (default: 5)')
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='minimum duration of a run, in seconds '
+                             '(default: 0.2)')
+    parser.add_argument('--connections', type=int, default=10000,
+                        help='number of connections in memory benchmarks '
+                             '(default: 10000)')
+    args = parser.parse_args(args)
+
+    # importing the benchmark modules registers their benchmarks
+    import bench_codecs  # noqa: F401
+    import bench_memory  # noqa: F401
+    import bench_server  # noqa: F401
+    import bench_websocket  # noqa: F401
+
+    results = {}
+    for name, func in benchmarks.items():
+        if args.filter not in name:
+            continue
+        results[name] = measure(func, runs=args.runs, min_time=args.min_time)
+        print(f'{name:<32} {results[name]["median"] * 1e6:12.2f} us '
+              f'+/- {results[name]["stdev"] * 1e6:.2f} '
+              f'({results[name]["ops_per_sec"]:.0f} ops/s)')
+    for name, func in memory_benchmarks.items():
+        if args.filter not in name:
+            continue
+        results[name] = {'connections': args.connections,
+                         'bytes': func(args.connections)}
+        print(f'{name:<32} {results[name]["bytes"]:12.0f} bytes/connection')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'engineio': importlib.metadata.version('python-engineio'),
+                'python': platform.python_version(),
+                'implementation': platform.python_implementation(),
+                'platform': platform.platform(),
+                'time': time.time(),
+                'benchmarks': results,
+            }, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['benchmarks']
+        regressions = compare(results, baseline, args.max_regression)
+        for name, change in regressions:
+            print(f'REGRESSION: {name} is {change:.1f}% worse than the '
+                  'baseline')
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    # the benchmark modules register their functions in the importable
+    # version of this module, so main() must run from there
+    import benchmark as benchmark_module
+    sys.exit(benchmark_module.main())